@@ -13,7 +13,8 @@ uv pip install \
    --target python \
    -r requirements.txt
 
-cp ./functions/utils.py python/utils.py
+# Shared modules (utils, activity_store, ...) are imported by every function
+cp ./functions/*.py python/
 
 # Create Lambda layer ZIP
 zip -r ./deployments/lambda_layer.zip python/
@@ -0,0 +1,236 @@
+import sys
+import json
+from array import array
+
+# Compact UTF-8 JSON, the encoder is reused for every record
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+
+def as_list(value) -> list:
+    """
+    Location-like fields are lists in the data pipeline output but plain strings in older dumps
+    """
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [value]
+    return list(value)
+
+
+# Icon id of activities without an icon key (older catalogs inline the SVG in thumbnail_url)
+NO_ICON = 0xFFFF
+
+
+def encode_long_descriptions(data: dict) -> dict[str, bytes]:
+    """
+    Long-description store (activities_long.json) as activity id -> encoded JSON string
+    """
+    return {
+        str(activity_id): _encoder.encode(text).encode("utf-8")
+        for activity_id, text in data.get("long_descriptions", {}).items()
+    }
+
+
+def _section_size(section) -> int:
+    # Sections read from a snapshot are views into its buffer
+    return section.nbytes if isinstance(section, memoryview) else sys.getsizeof(section)
+
+
+class ActivityStore:
+    """
+    Compact in-memory activity catalog
+
+    - hot section: activity ids and each activity's icon id (scoring reads
+      the search index bitmaps, not the store)
+    - icon table: icon key -> inline SVG, activities reference it by key
+    - cold section: each activity's display record pre-encoded as compact UTF-8
+      JSON, split into a slim fragment (everything but long_description) and the
+      encoded long_description, so responses are assembled by joining bytes and
+      only the returned activities (the final top-k) are ever decoded; catalogs
+      published with a separate long-description store have no long section
+    """
+
+    __slots__ = (
+        "metadata",
+        "ids",
+        "icons",
+        "icon_vocabulary",
+        "_icon_ids",
+        "_slim_data",
+        "_slim_offsets",
+        "_long_data",
+        "_long_offsets",
+    )
+
+    # Flat sections written to / read from a catalog snapshot, with their array type
+    SECTIONS = {
+        "icon_ids": "H",
+        "slim_data": "B",
+        "slim_offsets": "Q",
+        "long_data": "B",
+        "long_offsets": "Q",
+    }
+
+    def __init__(self, metadata: dict | None = None, icons: dict | None = None):
+        self.metadata = metadata or {}
+        self.icons: dict[str, str] = icons or {}
+        self.icon_vocabulary: list[str] = list(self.icons)
+        self.ids: list = []
+        self._icon_ids = array("H")
+        # Cold section: concatenated fragments, fragment i is data[offsets[i]:offsets[i + 1]]
+        self._slim_data = bytearray()
+        self._slim_offsets = array("Q", [0])
+        self._long_data = bytearray()
+        self._long_offsets = array("Q", [0])
+
+    @classmethod
+    def from_activities(cls, activities: list[dict], metadata: dict | None = None, icons: dict | None = None):
+        """
+        Build the store from parsed activity records and the catalog's icon table
+        """
+        store = cls(metadata, icons)
+        icon_lookup = {key: icon_id for icon_id, key in enumerate(store.icon_vocabulary)}
+
+        for activity in activities:
+            store.ids.append(activity.get("id"))
+            store._icon_ids.append(icon_lookup.get(activity.get("icon"), NO_ICON))
+
+            slim = {key: value for key, value in activity.items() if key != "long_description"}
+            store._slim_data += _encoder.encode(slim).encode("utf-8")
+            store._slim_offsets.append(len(store._slim_data))
+            if "long_description" in activity:
+                store._long_data += _encoder.encode(activity["long_description"]).encode("utf-8")
+            store._long_offsets.append(len(store._long_data))
+        return store
+
+    def to_sections(self) -> tuple[dict, dict[str, bytes]]:
+        """
+        Split the store into a JSON-serializable header and flat binary sections
+        """
+        header = {
+            "metadata": self.metadata,
+            "byteorder": sys.byteorder,
+            "ids": self.ids,
+            "icons": self.icons,
+        }
+        sections = {name: bytes(getattr(self, f"_{name}")) for name in self.SECTIONS}
+        return header, sections
+
+    @classmethod
+    def from_sections(cls, header: dict, sections: dict):
+        """
+        Rebuild a store from to_sections output; the sections are used in place
+        (memoryview casts), so a snapshot buffer or mmap is never copied
+        """
+        if header["byteorder"] != sys.byteorder:
+            raise ValueError(f"Snapshot byte order {header['byteorder']} is not {sys.byteorder}")
+        store = cls(header["metadata"], header["icons"])
+        store.ids = header["ids"]
+        for name, typecode in cls.SECTIONS.items():
+            setattr(store, f"_{name}", memoryview(sections[name]).cast(typecode))
+        return store
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def has_long_descriptions(self) -> bool:
+        """
+        False when the catalog was published without long descriptions (separate store)
+        """
+        return len(self._long_data) > 0
+
+    def icon_table(self, indices) -> dict[str, str]:
+        """
+        Icons referenced by the given activities, sent once per response
+        """
+        keys = [self.icon_vocabulary[icon_id] for icon_id in sorted({self._icon_ids[idx] for idx in indices} - {NO_ICON})]
+        return {key: self.icons[key] for key in keys}
+
+    def fragment(self, idx: int, slim: bool = False, long_description: bytes | None = None) -> bytes:
+        """
+        Pre-encoded JSON of an activity, without long_description when slim
+        long_description (encoded JSON string) is used when the store has none for the activity
+        """
+        slim_fragment = bytes(self._slim_data[self._slim_offsets[idx] : self._slim_offsets[idx + 1]])
+        start, end = self._long_offsets[idx], self._long_offsets[idx + 1]
+        long_fragment = bytes(self._long_data[start:end]) if start != end else long_description
+        if slim or not long_fragment:
+            return slim_fragment
+        separator = b"," if len(slim_fragment) > 2 else b""
+        return slim_fragment[:-1] + separator + b'"long_description":' + long_fragment + b"}"
+
+    def get(self, idx: int, slim: bool = False) -> dict:
+        """
+        Materialize the activity record, without long_description when slim
+        """
+        return json.loads(self.fragment(idx, slim=slim))
+
+    def memory_report(self, search_index: dict | None = None) -> dict:
+        """
+        Approximate resident size in bytes of each section of the store and,
+        when given, of the search index scoring runs on
+        """
+        hot = (
+            sys.getsizeof(self.ids)
+            + sum(sys.getsizeof(activity_id) for activity_id in self.ids)
+            + _section_size(self._icon_ids)
+        )
+        icons = deep_getsizeof(self.icons)
+        cold = sum(
+            _section_size(section)
+            for section in (self._slim_data, self._slim_offsets, self._long_data, self._long_offsets)
+        )
+        index = deep_getsizeof(search_index) if search_index is not None else 0
+        return {
+            "activities": len(self),
+            "hot_bytes": hot,
+            "icon_bytes": icons,
+            "cold_bytes": cold,
+            "index_bytes": index,
+            "total_bytes": hot + icons + cold + index,
+        }
+
+
+def deep_getsizeof(value, seen: set | None = None) -> int:
+    """
+    Recursive sys.getsizeof for parsed JSON (dicts, lists, strings, numbers)
+    and the index structures (sets, memoryview sections, __slots__ classes)
+    """
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, memoryview):
+        return value.nbytes
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(deep_getsizeof(k, seen) + deep_getsizeof(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(deep_getsizeof(item, seen) for item in value)
+    elif hasattr(type(value), "__slots__"):
+        size += sum(
+            deep_getsizeof(getattr(value, name), seen) for name in type(value).__slots__ if hasattr(value, name)
+        )
+    return size
+
+
+def main():
+    """
+    Compare the memory footprint of parsed JSON dicts and the store plus search index for a catalog file
+    """
+    from search_index import build_search_index
+
+    with open(sys.argv[1], encoding="utf-8") as f:
+        catalog = json.load(f)
+    activities = catalog["activities"]
+
+    store = ActivityStore.from_activities(activities, icons=catalog.get("icons"))
+    report = store.memory_report(build_search_index(activities))
+    report["parsed_json_bytes"] = deep_getsizeof(activities)
+    report["saving_ratio"] = round(report["parsed_json_bytes"] / max(report["total_bytes"], 1), 2)
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Binary catalog snapshot: the compact activity store and the prebuilt search index
+
+Layout (integers little-endian):
+
+    magic      8 bytes  b"ACTSNAP\\0"
+    version    uint32   FORMAT_VERSION
+    header     uint32   length of the JSON header
+    checksum   uint32   CRC-32 of everything after this field
+    header     JSON     store / index headers and the section table
+    sections   raw      8-byte aligned, offsets relative to the end of the header
+
+Sections are fixed-width bitmaps and flat arrays, so nothing is parsed per
+activity. A reader (bytes from S3 or an mmap of a local file) keeps the store
+and full-text arrays as memoryviews of the buffer; the index bitmaps are copied
+into Python ints once per load, since the search combines them with bitwise ops.
+"""
+import json
+import mmap
+import zlib
+import struct
+
+from activity_store import ActivityStore
+from search_index import build_search_index, index_to_sections, index_from_sections
+from text_index import TextIndex
+
+MAGIC = b"ACTSNAP\0"
+# 2: icon table and per-activity icon ids
+# 3: optional full-text index ("text" sections)
+# 4: store without per-activity tag / location sections
+FORMAT_VERSION = 4
+_PREAMBLE = struct.Struct("<8sIII")
+
+
+def is_snapshot(buffer) -> bool:
+    return bytes(buffer[: len(MAGIC)]) == MAGIC
+
+
+def build_snapshot(
+    activities: list[dict],
+    metadata: dict | None = None,
+    icons: dict | None = None,
+    long_descriptions: dict | None = None,
+) -> bytes:
+    """
+    Build the store, tag index and full-text index for the activities and serialize them
+    """
+    store = ActivityStore.from_activities(activities, metadata, icons)
+    search_index = build_search_index(activities)
+    search_index["text_index"] = TextIndex.from_activities(activities, long_descriptions)
+    return write_snapshot(store, search_index)
+
+
+def write_snapshot(store: ActivityStore, search_index: dict) -> bytes:
+    store_header, store_sections = store.to_sections()
+    index_header, index_sections = index_to_sections(search_index)
+    parts = [("store", store_sections), ("index", index_sections)]
+    headers = {"store": store_header, "index": index_header}
+    if search_index.get("text_index") is not None:
+        headers["text"], text_sections = search_index["text_index"].to_sections()
+        parts.append(("text", text_sections))
+
+    table = {}
+    data = bytearray()
+    for prefix, sections in parts:
+        for name, section in sections.items():
+            data += b"\0" * (-len(data) % 8)
+            table[f"{prefix}.{name}"] = [len(data), len(section)]
+            data += section
+
+    header = json.dumps(
+        {**headers, "sections": table},
+        ensure_ascii=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+    header += b" " * (-(len(header) + _PREAMBLE.size) % 8)
+
+    body = header + data
+    preamble = _PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header), zlib.crc32(body))
+    return preamble + body
+
+
+def read_snapshot(buffer) -> tuple[ActivityStore, dict]:
+    """
+    Load a snapshot from bytes or an mmap, raises ValueError when it is invalid
+    """
+    view = memoryview(buffer)
+    if len(view) < _PREAMBLE.size:
+        raise ValueError("Snapshot is truncated")
+    magic, version, header_length, checksum = _PREAMBLE.unpack_from(view)
+    if magic != MAGIC:
+        raise ValueError("Not a catalog snapshot")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot version {version}, expected {FORMAT_VERSION}")
+    if zlib.crc32(view[_PREAMBLE.size :]) != checksum:
+        raise ValueError("Snapshot checksum mismatch")
+
+    data_start = _PREAMBLE.size + header_length
+    header = json.loads(bytes(view[_PREAMBLE.size : data_start]).decode("utf-8"))
+    sections: dict[str, dict] = {"store": {}, "index": {}, "text": {}}
+    for name, (offset, length) in header["sections"].items():
+        prefix, section = name.split(".", 1)
+        sections[prefix][section] = view[data_start + offset : data_start + offset + length]
+
+    store = ActivityStore.from_sections(header["store"], sections["store"])
+    search_index = index_from_sections(header["index"], sections["index"])
+    if "text" in header:
+        search_index["text_index"] = TextIndex.from_sections(header["text"], sections["text"])
+    return store, search_index
+
+
+def load_snapshot_file(path: str) -> tuple[ActivityStore, dict]:
+    """
+    Memory-map a snapshot file and load it
+    """
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return read_snapshot(mapped)
@@ -0,0 +1,61 @@
+import json
+import time
+import logging
+
+# Start of module init, reported with the other init stages by instrument_handler
+IMPORT_STARTED = time.perf_counter()
+
+from utils import (  # noqa: E402
+    LOG_LEVEL,
+    build_api_response,
+    handle_options,
+    record_init,
+    instrument_handler,
+)
+from chat_pipeline import STAGES, load_stage, answer_chat  # noqa: E402
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(LOG_LEVEL)
+
+# Stage modules are imported during init; their catalogs and clients still load on first use
+for stage in STAGES:
+    load_stage(stage)
+search_engine = load_stage("search_engine")
+
+record_init("module_import", IMPORT_STARTED)
+
+
+@instrument_handler("chat")
+def lambda_handler(event, context):
+    """
+    Lambda handler for the fused chat flow (extract -> search -> enhance in one invocation),
+    always a JSON response (chat_pipeline_events is served by local dev, see the
+    result enhancer handler)
+    """
+    if event.get("httpMethod") == "OPTIONS" or event.get("routeKey", "").startswith("OPTIONS"):
+        return handle_options()
+    try:
+        # Parse the incoming request
+        try:
+            body = json.loads(event.get("body") or "{}")
+        except (TypeError, json.JSONDecodeError):
+            body = None
+        if not isinstance(body, dict):
+            return build_api_response(400, {"error": "Request body must be a JSON object"})
+        query = body.get("query", "")
+        max_results = body.get("max_results", 3)
+        mode = body.get("mode", "boolean")
+        filters = body.get("filters") or {}
+
+        if not isinstance(query, str) or not query.strip():
+            return build_api_response(400, {"error": "No query provided"})
+        # The same checks as a search request; the query stands in for the tags it will yield
+        error = search_engine.validate_search([], "all", mode, filters, query, max_results)
+        if error:
+            return build_api_response(400, {"error": error})
+
+        return build_api_response(200, answer_chat(query, max_results, mode, filters), event)
+    except Exception as e:
+        logger.error(f"Error processing chat: {str(e)}")
+        return build_api_response(500, {"error": "Internal server error"})
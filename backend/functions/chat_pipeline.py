@@ -0,0 +1,274 @@
+"""
+In-process chat flow: extract keywords -> search -> enhance
+
+The three stage modules are loaded once per process and keep their own
+catalogs, caches and clients, so a chat message costs one invocation instead
+of three API hops with JSON re-encoding in between. They are all named
+lambda_function.py, so each is registered under its own module name
+("<stage>_lambda").
+"""
+import os
+import sys
+import time
+import importlib
+import asyncio
+import importlib.util
+import threading
+
+from utils import log_query, sse_event
+
+FUNCTIONS_DIR = os.path.dirname(os.path.abspath(__file__))
+STAGES = ("query_processor", "search_engine", "result_enhancer")
+
+_load_lock = threading.Lock()
+
+
+def load_stage(name):
+    """
+    Stage module, loaded on first use: from backend/functions/<name>/ in the
+    source tree, or as <name>_lambda.py packaged next to the chat handler
+    """
+    module_name = f"{name}_lambda"
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    with _load_lock:
+        if module_name in sys.modules:
+            return sys.modules[module_name]
+        path = os.path.join(FUNCTIONS_DIR, name, "lambda_function.py")
+        if not os.path.exists(path):
+            return importlib.import_module(module_name)
+        spec = importlib.util.spec_from_file_location(module_name, path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        try:
+            spec.loader.exec_module(module)
+        except Exception:
+            del sys.modules[module_name]
+            raise
+        return module
+
+
+def _elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 2)
+
+
+def extract_and_search(query, max_results=3, mode="boolean", filters=None):
+    """
+    Run the extract and search stages
+    Returns (the chat answer without the response text, extraction details)
+    """
+    timings = {}
+
+    stage_started = time.perf_counter()
+    tags, details = load_stage("query_processor").extract_keywords(query)
+    timings["extract"] = _elapsed_ms(stage_started)
+
+    stage_started = time.perf_counter()
+    answer = search(query, tags, max_results, mode, filters)
+    timings["search"] = _elapsed_ms(stage_started)
+
+    answer.update(source=details["source"], timings_ms=timings)
+    return answer, details
+
+
+def search(query, tags, max_results=3, mode="boolean", filters=None):
+    """
+    Search stage: the chat answer fields describing the matching activities
+    """
+    search_engine = load_stage("search_engine")
+    activity_store, search_index = search_engine.catalog.get()
+    top, total, resolved_tags = [], 0, {}
+    if tags:
+        top, result_bitmap, resolved_tags = search_engine.find_activities(
+            search_index, tags, max_results, mode=mode, filters=filters
+        )
+        total = result_bitmap.bit_count()
+    # Slim documents, the frontend fetches long descriptions when a result is expanded
+    results = [activity_store.get(idx, slim=True) for idx in top]
+    return {
+        "query": query,
+        "extracted_tags": tags,
+        "resolved_tags": resolved_tags,
+        "catalog_version": search_engine.catalog.version,
+        "count": len(results),
+        "total": total,
+        "results": results,
+        "icons": activity_store.icon_table(top),
+    }
+
+
+def chat_pipeline(query, max_results=3, mode="boolean", filters=None):
+    """
+    Answer a chat message: extracted tags, matching activities and the
+    conversational response, with per-stage timings in timings_ms
+    """
+    started = time.perf_counter()
+    answer, details = extract_and_search(query, max_results, mode, filters)
+
+    stage_started = time.perf_counter()
+    answer["response"] = load_stage("result_enhancer").enhance_results(
+        query, answer["results"], answer["catalog_version"]
+    )
+    answer["timings_ms"]["enhance"] = _elapsed_ms(stage_started)
+    answer["timings_ms"]["total"] = _elapsed_ms(started)
+
+    log_query(query, answer["extracted_tags"], answer["count"], {**details, "timings_ms": answer["timings_ms"]})
+    return answer
+
+
+def chat_pipeline_events(query, max_results=3, mode="boolean", filters=None):
+    """
+    Server-sent events for a chat message: a "results" event with everything
+    but the response, "token" events while it is generated and a final "done"
+    event with the response and the complete timings
+    """
+    started = time.perf_counter()
+    answer, details = extract_and_search(query, max_results, mode, filters)
+    yield sse_event("results", answer)
+
+    stage_started = time.perf_counter()
+    chunks = []
+    for text in load_stage("result_enhancer").stream_enhanced_results(
+        query, answer["results"], answer["catalog_version"]
+    ):
+        chunks.append(text)
+        yield sse_event("token", {"text": text})
+    answer["timings_ms"]["enhance"] = _elapsed_ms(stage_started)
+    answer["timings_ms"]["total"] = _elapsed_ms(started)
+
+    log_query(query, answer["extracted_tags"], answer["count"], {**details, "timings_ms": answer["timings_ms"]})
+    yield sse_event("done", {"response": "".join(chunks).strip(), "timings_ms": answer["timings_ms"]})
+
+
+# Buffered chat answers use the speculative pipeline unless CHAT_SPECULATION=false
+SPECULATION_ENABLED = os.environ.get("CHAT_SPECULATION", "true").lower() != "false"
+
+# How often speculative work paid off, and the latency it saved
+SPECULATION_STATS = {"started": 0, "paid_off": 0, "cancelled": 0, "saved_ms": 0.0}
+# Pipelines run on several threads (one event loop each), counters are updated under the lock
+_stats_lock = threading.Lock()
+
+_thread_state = threading.local()
+
+
+def run_async(coroutine):
+    """
+    Run a coroutine on the calling thread's event loop, kept for the life of
+    the thread so async clients and their connection pools are reused
+    """
+    loop = getattr(_thread_state, "loop", None)
+    if loop is None or loop.is_closed():
+        loop = _thread_state.loop = asyncio.new_event_loop()
+    return loop.run_until_complete(coroutine)
+
+
+def _count_speculation(outcome, saved_ms=0.0):
+    """
+    Count a speculation outcome in SPECULATION_STATS
+    """
+    with _stats_lock:
+        SPECULATION_STATS[outcome] += 1
+        SPECULATION_STATS["saved_ms"] = round(SPECULATION_STATS["saved_ms"] + saved_ms, 2)
+
+
+def speculation_stats():
+    """
+    Consistent copy of SPECULATION_STATS
+    """
+    with _stats_lock:
+        return dict(SPECULATION_STATS)
+
+
+def _result_ids(answer):
+    return [activity.get("id") for activity in answer["results"]]
+
+
+async def chat_pipeline_async(query, max_results=3, mode="boolean", filters=None):
+    """
+    chat_pipeline with speculation while the extraction LLM call is in flight
+
+    The local extractor's tags are searched right away and the enhancement of
+    those results is started on AsyncOpenAI. When the LLM tags lead to the
+    same activities, the speculative enhancement (possibly already finished)
+    is the answer; otherwise it is cancelled and the real results are
+    enhanced. The answer's "speculation" reports the outcome and saved_ms,
+    the time the enhancement had been running before the sequential flow
+    would have started it.
+    """
+    started = time.perf_counter()
+    query_processor = load_stage("query_processor")
+    result_enhancer = load_stage("result_enhancer")
+    timings = {}
+
+    extraction = asyncio.ensure_future(query_processor.extract_keywords_async(query))
+    # Let the extraction run up to its first await: local and cached answers finish here
+    await asyncio.sleep(0)
+
+    speculation = {"status": "none"}
+    speculative_answer = speculative_enhance = None
+    if not extraction.done():
+        local_tags = query_processor.local_extraction(query)["tags"]
+        if local_tags:
+            speculative_answer = search(query, local_tags, max_results, mode, filters)
+        if speculative_answer and speculative_answer["results"]:
+            speculative_started = time.perf_counter()
+            speculative_enhance = asyncio.ensure_future(
+                result_enhancer.enhance_results_async(
+                    query, speculative_answer["results"], speculative_answer["catalog_version"]
+                )
+            )
+            speculative_finished = []
+            speculative_enhance.add_done_callback(lambda _: speculative_finished.append(time.perf_counter()))
+            _count_speculation("started")
+            speculation = {"status": "started", "tags": local_tags}
+
+    tags, details = await extraction
+    timings["extract"] = _elapsed_ms(started)
+
+    stage_started = time.perf_counter()
+    answer = search(query, tags, max_results, mode, filters)
+    timings["search"] = _elapsed_ms(stage_started)
+
+    stage_started = time.perf_counter()
+    if speculative_enhance is not None and _result_ids(answer) == _result_ids(speculative_answer):
+        # The sequential flow would start the enhancement now; whatever ran before this is saved
+        decided = time.perf_counter()
+        answer["response"] = await speculative_enhance
+        saved_ms = round((min(decided, speculative_finished[0]) - speculative_started) * 1000, 2)
+        _count_speculation("paid_off", saved_ms)
+        speculation.update(status="paid_off", saved_ms=saved_ms)
+    else:
+        if speculative_enhance is not None:
+            speculative_enhance.cancel()
+            _count_speculation("cancelled")
+            speculation["status"] = "cancelled"
+        answer["response"] = await result_enhancer.enhance_results_async(
+            query, answer["results"], answer["catalog_version"]
+        )
+    timings["enhance"] = _elapsed_ms(stage_started)
+    timings["total"] = _elapsed_ms(started)
+
+    answer.update(source=details["source"], timings_ms=timings, speculation=speculation)
+    log_query(
+        query,
+        answer["extracted_tags"],
+        answer["count"],
+        {**details, "timings_ms": timings, "speculation": speculation, "speculation_stats": speculation_stats()},
+    )
+    return answer
+
+
+def chat_pipeline_speculative(query, max_results=3, mode="boolean", filters=None):
+    """
+    Synchronous entry point of chat_pipeline_async for handlers
+    """
+    return run_async(chat_pipeline_async(query, max_results, mode, filters))
+
+
+def answer_chat(query, max_results=3, mode="boolean", filters=None):
+    """
+    Buffered chat answer from the speculative or the sequential pipeline
+    """
+    if SPECULATION_ENABLED:
+        return chat_pipeline_speculative(query, max_results, mode, filters)
+    return chat_pipeline(query, max_results, mode, filters)
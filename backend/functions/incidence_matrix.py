@@ -0,0 +1,133 @@
+"""
+Batch scoring on a sparse activity x tag incidence matrix
+
+The matrix is kept column-wise (per tag, the sorted positions of the activities
+having it). A batch of B queries is a sparse tag x B query matrix, and the
+matched-tag counts of every activity for every query are the product of the two,
+evaluated as one bincount over the postings of the query tags. Candidate masks,
+exclusions, filters and location boosts are then applied to the whole B x N
+count matrix at once.
+
+Built from the bitmap index on the first batch, so NumPy is only imported when
+the batch API is used. Large batches are scored in chunks of queries, so the
+dense matrices never exceed MAX_SCORED_CELLS cells whatever the catalog size.
+"""
+import os
+
+import numpy as np
+
+# Cells (queries x activities) of the dense matrices of one scoring chunk, about 20 bytes each
+MAX_SCORED_CELLS = int(os.environ.get("BATCH_MAX_SCORED_CELLS", 2_000_000))
+
+
+def bitmap_positions(bitmap: int, size: int) -> np.ndarray:
+    """
+    Sorted positions of the set bits of an index bitmap
+    """
+    buffer = np.frombuffer(bitmap.to_bytes((size + 7) // 8, "little"), dtype=np.uint8)
+    return np.flatnonzero(np.unpackbits(buffer, bitorder="little")[:size])
+
+
+def bitmap_mask(bitmap: int, size: int) -> np.ndarray:
+    """
+    Boolean array of an index bitmap
+    """
+    buffer = np.frombuffer(bitmap.to_bytes((size + 7) // 8, "little"), dtype=np.uint8)
+    return np.unpackbits(buffer, bitorder="little")[:size].astype(bool)
+
+
+class IncidenceMatrix:
+    def __init__(self, size: int, tag_offsets: np.ndarray, activities: np.ndarray, location_postings: dict):
+        self.size = size
+        # Column t of the matrix is activities[tag_offsets[t] : tag_offsets[t + 1]]
+        self.tag_offsets = tag_offsets
+        self.activities = activities
+        # Folded location value -> positions of the activities located there
+        self.location_postings = location_postings
+
+    @classmethod
+    def from_search_index(cls, search_index: dict):
+        size = search_index["size"]
+        # tag_index is ordered by tag id
+        postings = [bitmap_positions(bitmap, size) for bitmap in search_index["tag_index"].values()]
+        tag_offsets = np.zeros(len(postings) + 1, dtype=np.int64)
+        np.cumsum([len(positions) for positions in postings], out=tag_offsets[1:])
+        activities = np.concatenate(postings) if postings else np.zeros(0, dtype=np.int64)
+        location_postings = {
+            value: bitmap_positions(bitmap, size)
+            for value, bitmap in search_index["facet_index"]["location"].items()
+        }
+        return cls(size, tag_offsets, activities, location_postings)
+
+    def _flat_positions(self, rows: list[list]) -> np.ndarray:
+        """
+        Positions in a row-major B x N matrix of the activities listed for each row;
+        rows[q] holds position arrays
+        """
+        parts = [
+            positions + q * self.size
+            for q, row in enumerate(rows)
+            for positions in row
+            if len(positions)
+        ]
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+
+    def _tag_postings(self, tag_ids: list[int]) -> list[np.ndarray]:
+        return [self.activities[self.tag_offsets[t] : self.tag_offsets[t + 1]] for t in tag_ids]
+
+    def score(self, queries: list[dict], location_boost: float) -> list[tuple[list[int], int]]:
+        """
+        Top activities and candidate count of each query, see _score_chunk
+        """
+        chunk = max(1, MAX_SCORED_CELLS // max(self.size, 1))
+        results = []
+        for start in range(0, len(queries), chunk):
+            results += self._score_chunk(queries[start : start + chunk], location_boost)
+        return results
+
+    def _score_chunk(self, queries: list[dict], location_boost: float) -> list[tuple[list[int], int]]:
+        """
+        Top activities and candidate count of each query
+
+        A query is a dict of tag_ids (known, distinct query tags), size (number of
+        distinct query tags), match ("all" / "any"), exclude_ids (excluded tag ids),
+        allowed (bitmap passing the filters, None for no filters), locations (folded
+        location values earning the boost) and max_results. Scores are matched tags /
+        size plus the boost; ties keep catalog order.
+        """
+        batch, size = len(queries), self.size
+        if not batch:
+            return []
+
+        # Matched-tag counts: incidence matrix x query matrix
+        flat = self._flat_positions([self._tag_postings(query["tag_ids"]) for query in queries])
+        counts = np.bincount(flat, minlength=batch * size).reshape(batch, size)
+
+        known = np.array([len(query["tag_ids"]) for query in queries])
+        match_all = np.array([query["match"] != "any" for query in queries])
+        candidates = np.where(match_all[:, None], counts == known[:, None], counts > 0)
+        candidates &= (known > 0)[:, None]
+
+        excluded = self._flat_positions([self._tag_postings(query["exclude_ids"]) for query in queries])
+        candidates.reshape(-1)[excluded] = False
+        for q, query in enumerate(queries):
+            if query["allowed"] is not None:
+                candidates[q] &= bitmap_mask(query["allowed"], size)
+
+        boosted = np.zeros((batch, size), dtype=bool)
+        located = self._flat_positions(
+            [[self.location_postings[value] for value in query["locations"]] for query in queries]
+        )
+        boosted.reshape(-1)[located] = True
+        query_sizes = np.array([max(query["size"], 1) for query in queries], dtype=np.float64)
+        # Rounded like the single-query ranking, so equal scores reached through
+        # different tags and the boost tie (and keep catalog order)
+        scores = np.round(counts / query_sizes[:, None] + np.where(boosted, location_boost, 0.0), 9)
+
+        results = []
+        for q, query in enumerate(queries):
+            positions = np.flatnonzero(candidates[q])
+            # Stable sort of candidates in catalog order keeps ties in catalog order
+            order = np.argsort(-scores[q, positions], kind="stable")[: max(query["max_results"], 0)]
+            results.append((positions[order].tolist(), len(positions)))
+        return results
@@ -1,83 +1,229 @@
-import json
 import os
+import json
+import time
 import logging
-import sys
 
-import openai
+# Start of module init, reported with the other init stages by instrument_handler
+IMPORT_STARTED = time.perf_counter()
 
-from utils import load_tags_from_s3, build_api_response, log_query, handle_options
+# openai and boto3 are imported on the first request that needs them
+from utils import (  # noqa: E402
+    LOG_LEVEL,
+    create_tags_catalog,
+    build_api_response,
+    log_query,
+    handle_options,
+    get_openai_client,
+    get_async_openai_client,
+    record_init,
+    instrument_handler,
+    span,
+    record_usage,
+    fold_text,
+    ResultCache,
+)
+from tag_extractor import TagExtractor  # noqa: E402
+from tag_shortlist import TagShortlist, estimate_tokens  # noqa: E402
 
 # Configure logging
 logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
+logger.setLevel(LOG_LEVEL)
+
+# Queries whose local extraction confidence reaches this are answered without the LLM
+LOCAL_EXTRACTION_THRESHOLD = float(os.environ.get("LOCAL_EXTRACTION_THRESHOLD", 0.8))
+
+# Number of tags most similar to the query offered to the LLM
+KEYWORD_SHORTLIST_SIZE = int(os.environ.get("KEYWORD_SHORTLIST_SIZE", 40))
+# unique_tags.json groups always offered in full (regions, education levels)
+KEYWORD_PROMPT_GROUPS = [
+    group.strip()
+    for group in os.environ.get("KEYWORD_PROMPT_GROUPS", "locations,education_levels").split(",")
+    if group.strip()
+]
+
+
+def build_tags_cache(tags_data):
+    """
+    Keep the tags document together with the local extractor and the shortlist built for it
+    """
+    return tags_data, TagExtractor.from_tags_data(tags_data), TagShortlist(tags_data.get("tags", []))
+
+
+def prompt_vocabulary(query, tags_cache, shortlist, local_tags):
+    """
+    Keywords offered to the LLM: tags the local extractor found, the tags most
+    similar to the query and the always-on groups
+    Returns (vocabulary, prompt token estimates for the full tag list and the shortlist)
+    """
+    candidates = shortlist.rank(query, KEYWORD_SHORTLIST_SIZE)
+    groups = [value.lower() for group in KEYWORD_PROMPT_GROUPS for value in tags_cache.get(group) or []]
+    vocabulary = list(dict.fromkeys(local_tags + candidates + groups))
+    tokens = {
+        "full": estimate_tokens(tags_cache.get("tags", [])),
+        "shortlist": estimate_tokens(vocabulary),
+    }
+    return vocabulary, tokens
+
+
+# Loaded on first use and reloaded whenever a new unique_tags.json is published
+tags_catalog = create_tags_catalog(build=build_tags_cache)
 
-client = openai.OpenAI(
-    base_url=os.environ.get("OPENAI_API_URL"),
-    api_key=os.environ.get("OPENAI_API_KEY"),
+# Extracted keywords per normalized query and tags version; KEYWORD_CACHE_LOCATION
+# ("s3://bucket/prefix" or a directory) enables the tier shared between containers
+keyword_cache = ResultCache(
+    "keywords",
+    max_entries=int(os.environ.get("KEYWORD_CACHE_MAX_ENTRIES", 2048)),
+    ttl_seconds=float(os.environ.get("KEYWORD_CACHE_TTL_SECONDS", 7 * 86400)),
+    location=os.environ.get("KEYWORD_CACHE_LOCATION"),
 )
 
-tags_cache = load_tags_from_s3()
+
+def local_extraction(query):
+    """
+    Local extractor result for a query (tags, matches, coverage, confidence)
+    """
+    return tags_catalog.get()[1].extract(query)
+
+
+def plan_extraction(query):
+    """
+    Everything extract_keywords does before calling the LLM: the local
+    extractor when it is confident, then keyword_cache
+    Returns (extracted tags or None when the LLM must be asked, details,
+    prompt vocabulary, cache key)
+    """
+    tags_cache, extractor, shortlist = tags_catalog.get()
+    with span("local_extraction"):
+        local = extractor.extract(query)
+    details = {"local_confidence": local["confidence"], "local_tags": local["tags"]}
+
+    if local["tags"] and local["confidence"] >= LOCAL_EXTRACTION_THRESHOLD:
+        details["source"] = "local"
+        return local["tags"], details, None, None
+
+    key = None
+    # Without a loaded vocabulary the model output is not worth keeping
+    if tags_catalog.version is None:
+        details["keyword_cache"] = "bypass"
+    else:
+        key = (tags_catalog.version, fold_text(query))
+        cached, details["keyword_cache"] = keyword_cache.get(key)
+        if cached is not None:
+            details["source"] = "cache"
+            return cached, details, None, None
+
+    vocabulary, details["prompt_tokens"] = prompt_vocabulary(query, tags_cache, shortlist, local["tags"])
+    details["source"] = "llm"
+    return None, details, vocabulary, key
+
+
+def finish_extraction(extracted_tags, key):
+    # An empty list is also what a failed call returns, only real answers are cached
+    if key is not None and extracted_tags:
+        keyword_cache.put(key, extracted_tags)
 
 
 def extract_keywords(query):
     """
-    Extract relevant keywords and tags from a user query using OpenAI
+    Extract keywords for a query: the local extractor when it is confident,
+    then keyword_cache, then the LLM
+    Returns (extracted tags, details with "source": "local", "cache" or "llm")
+    """
+    started = time.perf_counter()
+    extracted_tags, details, vocabulary, key = plan_extraction(query)
+    if extracted_tags is None:
+        extracted_tags = request_keywords(query, vocabulary)
+        finish_extraction(extracted_tags, key)
+    details["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return extracted_tags, details
+
+
+async def extract_keywords_async(query):
+    """
+    extract_keywords with the LLM call awaited on AsyncOpenAI
+    """
+    started = time.perf_counter()
+    extracted_tags, details, vocabulary, key = plan_extraction(query)
+    if extracted_tags is None:
+        extracted_tags = await request_keywords_async(query, vocabulary)
+        finish_extraction(extracted_tags, key)
+    details["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return extracted_tags, details
+
+
+def keyword_messages(query, vocabulary):
+    """
+    Few-shot chat messages asking for the keywords of a query, restricted to the vocabulary
+    """
+    return [
+        {
+            "role": "system",
+            "content": f"Jsi systém pro extrakci klíčových slov. Extrahuj relevantní vyhledávací tagy z uživatelského dotazu. Vrať pouze pole klíčových slov (v prvním pádě jednotného čísla) jako JSON pole. Použij výhradně tyto klíčová slova '''{vocabulary}'''",
+        },
+        {
+            "role": "user",
+            "content": "Extrahujte klíčová slova jako JSON pole (JSON array) pro vyhledávání z tohoto dotazu: 'Chci soutěž v Praze pro studenta střední školy se zájmem o finance.'",
+        },
+        {
+            "role": "assistant",
+            "content": '["finance", "praha", "student sš", "soutěž"]',
+        },
+        {
+            "role": "user",
+            "content": "Extrahujte klíčová slova jako JSON pole (JSON array) pro vyhledávání z tohoto dotazu: 'Jsem architekt a hledám kurzy na zlepšení svých dovedností v oblasti designu. Jsem z Brna.'",
+        },
+        {
+            "role": "assistant",
+            "content": '["kultura", "kurz", "architektura", "jihomoravský kraj"]',
+        },
+        {
+            "role": "user",
+            "content": f"Extrahujte klíčová slova jako JSON pole (JSON array) pro vyhledávání z tohoto dotazu: '{query}'",
+        },
+    ]
+
+
+def parse_keywords(content):
     """
+    Keywords from the model answer, lowercased
+    """
+    content = content.strip()
+    # Handle various response formats from GPT
     try:
-        response = client.chat.completions.create(
-            model="gpt-5-nano",
-            messages=[
-                {
-                    "role": "system",
-                    "content": f"Jsi systém pro extrakci klíčových slov. Extrahuj relevantní vyhledávací tagy z uživatelského dotazu. Vrať pouze pole klíčových slov (v prvním pádě jednotného čísla) jako JSON pole. Použij výhradně tyto klíčová slova '''{tags_cache['tags']}'''",
-                },
-                {
-                    "role": "user",
-                    "content": "Extrahujte klíčová slova jako JSON pole (JSON array) pro vyhledávání z tohoto dotazu: 'Chci soutěž v Praze pro studenta střední školy se zájmem o finance.'",
-                },
-                {
-                    "role": "assistant",
-                    "content": '["finance", "praha", "student sš", "soutěž"]',
-                },
-                {
-                    "role": "user",
-                    "content": "Extrahujte klíčová slova jako JSON pole (JSON array) pro vyhledávání z tohoto dotazu: 'Jsem architekt a hledám kurzy na zlepšení svých dovedností v oblasti designu. Jsem z Brna.'",
-                },
-                {
-                    "role": "assistant",
-                    "content": '["kultura", "kurz", "architektura", "jihomoravský kraj"]',
-                },
-                {
-                    "role": "user",
-                    "content": f"Extrahujte klíčová slova jako JSON pole (JSON array) pro vyhledávání z tohoto dotazu: '{query}'",
-                },
-            ],
-            # temperature=0.3,
-            # reasoning_effort={"effort": "minimal"},
-            # max_completion_tokens=250,
-            # temperature=0.3
-        )
+        # Try parsing if it's a properly formatted JSON array
+        extracted_tags = json.loads(content)
+        if not isinstance(extracted_tags, list):
+            # If it parsed but isn't a list, extract it
+            if isinstance(extracted_tags, dict) and "keywords" in extracted_tags:
+                extracted_tags = extracted_tags["keywords"]
+            else:
+                # Default to splitting by commas if we got a valid JSON but wrong format
+                extracted_tags = [tag.strip().lower() for tag in content.split(",")]
+    except json.JSONDecodeError:
+        # If it's not valid JSON, just split by commas
+        extracted_tags = [tag.strip().lower() for tag in content.split(",")]
 
-        # Extract the response content
-        content = response.choices[0].message.content.strip()
-        # Handle various response formats from GPT
-        try:
-            # Try parsing if it's a properly formatted JSON array
-            extracted_tags = json.loads(content)
-            if not isinstance(extracted_tags, list):
-                # If it parsed but isn't a list, extract it
-                if isinstance(extracted_tags, dict) and "keywords" in extracted_tags:
-                    extracted_tags = extracted_tags["keywords"]
-                else:
-                    # Default to splitting by commas if we got a valid JSON but wrong format
-                    extracted_tags = [tag.strip().lower() for tag in content.split(",")]
-        except json.JSONDecodeError:
-            # If it's not valid JSON, just split by commas
-            extracted_tags = [tag.strip().lower() for tag in content.split(",")]
-
-        # Ensure all tags are strings and lowercase
-        extracted_tags = [str(tag).strip().lower() for tag in extracted_tags if tag]
+    # Ensure all tags are strings and lowercase
+    return [str(tag).strip().lower() for tag in extracted_tags if tag]
 
+
+def request_keywords(query, vocabulary):
+    """
+    Extract relevant keywords and tags from a user query using OpenAI,
+    restricted to the given vocabulary
+    """
+    try:
+        with span("llm_keywords"):
+            response = get_openai_client().chat.completions.create(
+                model="gpt-5-nano",
+                messages=keyword_messages(query, vocabulary),
+                # temperature=0.3,
+                # reasoning_effort={"effort": "minimal"},
+                # max_completion_tokens=250,
+                # temperature=0.3
+            )
+        record_usage(response)
+        extracted_tags = parse_keywords(response.choices[0].message.content)
         logger.info(f"Extracted tags from query '{query}': {extracted_tags}")
         return extracted_tags
     except Exception as e:
@@ -86,15 +232,38 @@ def extract_keywords(query):
         return []
 
 
+async def request_keywords_async(query, vocabulary):
+    """
+    request_keywords on AsyncOpenAI (cancellable while the request is in flight)
+    """
+    try:
+        with span("llm_keywords"):
+            response = await get_async_openai_client().chat.completions.create(
+                model="gpt-5-nano",
+                messages=keyword_messages(query, vocabulary),
+            )
+        record_usage(response)
+        extracted_tags = parse_keywords(response.choices[0].message.content)
+        logger.info(f"Extracted tags from query '{query}': {extracted_tags}")
+        return extracted_tags
+    except Exception as e:
+        logger.error(f"Error extracting keywords: {str(e)}")
+        return []
+
+
+record_init("module_import", IMPORT_STARTED)
+
+
+@instrument_handler("query_processor")
 def lambda_handler(event, context):
     """
     Lambda handler for the query processor
     """
-    logger.debug(f"Received event: {event}")
+    # Events are only formatted when DEBUG is enabled (LOG_LEVEL=DEBUG)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Received event: {event}")
     if event.get("httpMethod") == "OPTIONS" or event.get("routeKey", "").startswith("OPTIONS"):
-        response = handle_options()
-        logger.debug(f"OPTIONS response: {response}")
-        return response
+        return handle_options()
     try:
         # Parse the incoming request
         body = json.loads(event.get("body", "{}"))
@@ -104,21 +273,28 @@ def lambda_handler(event, context):
         # need to add condition if the actual message should be used or not
         # message_history = body.get("message_history", [])
 
-        logger.debug(f"Received event: {event}")
-
         if not query:
             return build_api_response(400, {"error": "No query provided"})
 
         # Extract keywords from the query
-        extracted_tags = extract_keywords(query)
+        extracted_tags, details = extract_keywords(query)
 
         # Log the query for analytics
         log_query(
-            query, extracted_tags, 0
-        )  # Results count will be updated by search function
+            query,
+            extracted_tags,
+            None,  # Results are counted by the search function (same request_id)
+            {**details, "keyword_cache_stats": keyword_cache.stats},
+        )
 
         return build_api_response(
-            200, {"query": query, "extracted_tags": extracted_tags}
+            200,
+            {
+                "query": query,
+                "extracted_tags": extracted_tags,
+                "source": details["source"],
+                "elapsed_ms": details["elapsed_ms"],
+            },
         )
     except Exception as e:
         logger.error(f"Error processing query: {str(e)}")
@@ -1,73 +1,250 @@
-import json
 import os
+import json
+import time
 import logging
-import sys
 
-import openai
+# Start of module init, reported with the other init stages by instrument_handler
+IMPORT_STARTED = time.perf_counter()
 
-from utils import build_api_response, handle_options
+# openai is imported by get_openai_client on the first request that calls the model
+from utils import (  # noqa: E402
+    LOG_LEVEL,
+    build_api_response,
+    handle_options,
+    fold_text,
+    get_openai_client,
+    get_async_openai_client,
+    ResultCache,
+    record_init,
+    instrument_handler,
+    span,
+    record_usage,
+    record_metric,
+    sse_event,
+)
 
 # Configure logging
 logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
+logger.setLevel(LOG_LEVEL)
 
-client = openai.OpenAI(
-    base_url=os.environ.get("OPENAI_API_URL"),
-    api_key=os.environ.get("OPENAI_API_KEY"),
+
+NO_RESULTS_RESPONSE = "Nenašel jsem žádné aktivity odpovídající vašemu vyhledávání. Zkuste použít jiná klíčová slova."
+FALLBACK_RESPONSE = "Zde je několik aktivit, které odpovídají vašemu vyhledávání. Dejte mi vědět, pokud byste o některé z nich chtěli více informací."
+
+# Generated answers per normalized query, result set and catalog version;
+# ENHANCE_CACHE_LOCATION ("s3://bucket/prefix" or a directory) enables the shared tier
+enhance_cache = ResultCache(
+    "enhanced",
+    max_entries=int(os.environ.get("ENHANCE_CACHE_MAX_ENTRIES", 1024)),
+    max_bytes=int(os.environ.get("ENHANCE_CACHE_MAX_BYTES", 8 * 1024 * 1024)),
+    ttl_seconds=float(os.environ.get("ENHANCE_CACHE_TTL_SECONDS", 7 * 86400)),
+    location=os.environ.get("ENHANCE_CACHE_LOCATION"),
 )
 
 
-def enhance_results(query, activities):
+def enhance_cache_key(query, activities, catalog_version=None):
     """
-    Enhance search results with a conversational response using OpenAI
+    Same normalized query and same activities give the same answer. The
+    activities come from the request body, so their prompt fields are always
+    part of the key: the same ids with other titles, descriptions, locations
+    or tags never share an answer. The catalog version only narrows the key.
     """
-    try:
-        if not activities or len(activities) == 0:
-            return "Nenašel jsem žádné aktivity odpovídající vašemu vyhledávání. Zkuste použít jiná klíčová slova."
+    prompt_fields = sorted(
+        json.dumps(
+            [activity.get(field) for field in ("id", "title", "short_description", "location", "tags")],
+            ensure_ascii=False,
+        )
+        for activity in activities
+    )
+    return (fold_text(query), prompt_fields, catalog_version)
+
+
+def log_enhance_cache(tier):
+    logger.info(json.dumps({"event_type": "enhance_cache", "tier": tier, "stats": enhance_cache.stats}))
+    record_metric(f"enhance_cache_{tier}", 1)
 
-        # Build a prompt for OpenAI
-        prompt = f"""
+
+def build_messages(query, activities):
+    """
+    Chat messages asking the model to explain why the activities fit the query
+    """
+    # Build a prompt for OpenAI
+    prompt = f"""
         Uživatel se zeptal na: "{query}"
         
         Našel/a jsem tyto aktivity, které by je mohly zajímat:
         """
 
-        # Add each activity to the prompt
-        for i, activity in enumerate(activities):
-            prompt += f"""
+    # Add each activity to the prompt
+    for i, activity in enumerate(activities):
+        prompt += f"""
             {i + 1}. {activity["title"]} - {activity["short_description"]}
             Lokace: {activity["location"]}
             Klíčová slova: {", ".join(activity["tags"])}
             """
 
-        prompt += """
+    prompt += """
         Vypracujte přátelskou, konverzační a krátkou odpověď s vysvětlením, proč tyto aktivity odpovídají dotazu uživatele. 
         """
 
-        # Call OpenAI API
-        response = client.chat.completions.create(
+    return [
+        {
+            "role": "system",
+            "content": "Jste užitečný/á asistent/ka pro radu s volnočasovými aktivitami. Buď stručný (maxinum 100 slov), ale zdůrazni klíčové vlastnosti. Nevyjmenovávejte aktivity znovu, pouze vysvětlete, proč se k nim hodí.",
+        },
+        {"role": "user", "content": prompt},
+    ]
+
+
+def request_enhancement(query, activities):
+    """
+    Generate the conversational response with OpenAI, raises on API errors
+    """
+    # Call OpenAI API
+    with span("llm_enhance"):
+        response = get_openai_client().chat.completions.create(
             model="gpt-5-nano",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "Jste užitečný/á asistent/ka pro radu s volnočasovými aktivitami. Buď stručný (maxinum 100 slov), ale zdůrazni klíčové vlastnosti. Nevyjmenovávejte aktivity znovu, pouze vysvětlete, proč se k nim hodí.",
-                },
-                {"role": "user", "content": prompt},
-            ],
+            messages=build_messages(query, activities),
             # max_completion_tokens=200,
             # temperature=0.7
         )
+    record_usage(response)
+    if logger.isEnabledFor(logging.DEBUG):
         logger.debug(f"OpenAI response: {response}")
-        # Extract and return the response
-        return response.choices[0].message.content.strip()
+    # Extract and return the response
+    return response.choices[0].message.content.strip()
+
+
+def enhance_results(query, activities, catalog_version=None):
+    """
+    Enhance search results with a conversational response using OpenAI,
+    answered from enhance_cache when the same query returned the same activities
+    """
+    if not activities or len(activities) == 0:
+        return NO_RESULTS_RESPONSE
+
+    key = enhance_cache_key(query, activities, catalog_version)
+    cached, tier = enhance_cache.get(key)
+    log_enhance_cache(tier)
+    if cached is not None:
+        return cached
+    try:
+        response = request_enhancement(query, activities)
+    except Exception as e:
+        logger.error(f"Error enhancing results: {str(e)}")
+        return FALLBACK_RESPONSE
+    if response:
+        enhance_cache.put(key, response)
+    return response
+
+
+async def enhance_results_async(query, activities, catalog_version=None):
+    """
+    enhance_results with the model call awaited on AsyncOpenAI (cancellable while in flight)
+    """
+    if not activities:
+        return NO_RESULTS_RESPONSE
+
+    key = enhance_cache_key(query, activities, catalog_version)
+    cached, tier = enhance_cache.get(key)
+    log_enhance_cache(tier)
+    if cached is not None:
+        return cached
+    try:
+        with span("llm_enhance"):
+            response = await get_async_openai_client().chat.completions.create(
+                model="gpt-5-nano",
+                messages=build_messages(query, activities),
+            )
+        record_usage(response)
+        response = response.choices[0].message.content.strip()
     except Exception as e:
         logger.error(f"Error enhancing results: {str(e)}")
-        return "Zde je několik aktivit, které odpovídají vašemu vyhledávání. Dejte mi vědět, pokud byste o některé z nich chtěli více informací."
+        return FALLBACK_RESPONSE
+    if response:
+        enhance_cache.put(key, response)
+    return response
+
+
+def stream_enhanced_results(query, activities, catalog_version=None):
+    """
+    Yield the conversational response in chunks as the model generates them
+
+    A cached answer is yielded at once. Falls back to the buffered call when
+    the streaming call fails before the first chunk (e.g. the endpoint does
+    not support streaming); a failure mid-stream ends the answer with what
+    was already sent. Only complete answers are cached.
+    """
+    if not activities:
+        yield NO_RESULTS_RESPONSE
+        return
+
+    key = enhance_cache_key(query, activities, catalog_version)
+    cached, tier = enhance_cache.get(key)
+    log_enhance_cache(tier)
+    if cached is not None:
+        yield cached
+        return
+
+    chunks = []
+    try:
+        # Timed up to the last chunk, including the time the consumer spends on each
+        with span("llm_enhance_stream"):
+            stream = get_openai_client().chat.completions.create(
+                model="gpt-5-nano",
+                messages=build_messages(query, activities),
+                stream=True,
+                # The last chunk then carries the token usage
+                stream_options={"include_usage": True},
+            )
+            for chunk in stream:
+                record_usage(chunk)
+                text = chunk.choices[0].delta.content if chunk.choices else None
+                if text:
+                    chunks.append(text)
+                    yield text
+    except Exception as e:
+        logger.error(f"Error streaming enhanced results: {str(e)}")
+        if chunks:
+            return
+
+    if chunks:
+        response = "".join(chunks).strip()
+    else:
+        try:
+            response = request_enhancement(query, activities)
+        except Exception as e:
+            logger.error(f"Error enhancing results: {str(e)}")
+            yield FALLBACK_RESPONSE
+            return
+        yield response
+    if response:
+        enhance_cache.put(key, response)
+
+
+def stream_events(query, results, catalog_version=None):
+    """
+    Server-sent events for a streamed answer: the search results first, then
+    one "token" event per response chunk and a final "done" event with the
+    whole response (same fields as the buffered JSON body)
+    """
+    yield sse_event("results", {"query": query, "count": len(results), "results": results})
+    chunks = []
+    for text in stream_enhanced_results(query, results, catalog_version):
+        chunks.append(text)
+        yield sse_event("token", {"text": text})
+    yield sse_event("done", {"response": "".join(chunks).strip()})
+
+
+record_init("module_import", IMPORT_STARTED)
 
 
+@instrument_handler("result_enhancer")
 def lambda_handler(event, context):
     """
-    Lambda handler for the result enhancer
+    Lambda handler for the result enhancer, always a JSON response: the
+    Python runtime cannot stream a body through API Gateway, so server-sent
+    events (stream_events) are only served where they stream, by local dev
     """
     if event.get("httpMethod") == "OPTIONS" or event.get("routeKey", "").startswith("OPTIONS"):
         return handle_options()
@@ -76,12 +253,14 @@ def lambda_handler(event, context):
         body = json.loads(event.get("body", "{}"))
         query = body.get("query", "")
         results = body.get("results", [])
+        # Version of the catalog the results came from (search response catalog_version)
+        catalog_version = body.get("catalog_version")
 
         if not query:
             return build_api_response(400, {"error": "No query provided"})
 
         # Enhance the results with a conversational response
-        enhanced_response = enhance_results(query, results)
+        enhanced_response = enhance_results(query, results, catalog_version)
 
         return build_api_response(
             200,
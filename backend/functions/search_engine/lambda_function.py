@@ -1,92 +1,860 @@
+import os
 import json
+import time
+import base64
+import heapq
+import bisect
 import logging
+from collections import Counter
 
-from utils import load_activities_from_s3, build_api_response, log_query, handle_options
+# Start of module init, reported with the other init stages by instrument_handler
+IMPORT_STARTED = time.perf_counter()
+
+from utils import (  # noqa: E402
+    LOG_LEVEL,
+    create_activities_catalog,
+    create_long_descriptions_catalog,
+    build_api_response,
+    build_json_body,
+    log_query,
+    handle_options,
+    fold_text,
+    tokenize,
+    record_init,
+    instrument_handler,
+    span,
+    ResultCache,
+)
+from activity_store import ActivityStore, as_list, encode_long_descriptions  # noqa: E402
+from search_index import (  # noqa: E402
+    FACETS,
+    build_search_index,
+    bitmap_from_positions,
+    iter_bits,
+    stem_phrase,
+    trigrams,
+)
+from text_index import TextIndex, analyze  # noqa: E402
+from catalog_snapshot import is_snapshot, read_snapshot  # noqa: E402
 
 # Configure logging
 logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
+logger.setLevel(LOG_LEVEL)
+
+# Score bonus for activities whose location mentions one of the query tags
+LOCATION_BOOST = 0.2
+
+# Minimal Dice similarity of character trigrams for a fuzzy tag match; below
+# 0.7 short unrelated words match ("stavba" -> "stáž", "kurýr" -> "kurz")
+FUZZY_THRESHOLD = 0.7
+# Shortest query tag resolved by prefix match
+MIN_PREFIX_LENGTH = 4
+
+# Weight of the full-text match next to the tag score (both are in [0, 1] before boosts)
+TEXT_WEIGHT = float(os.environ.get("TEXT_WEIGHT", 1.0))
+
+# Largest batch accepted by the {"queries": [...]} form of the handler
+MAX_BATCH_QUERIES = 25
+
+# Longest ranked id list memoized per query, i.e. the deepest page a cursor reaches
+MAX_RANKED_RESULTS = int(os.environ.get("MAX_RANKED_RESULTS", 500))
+# Pages ranked per search call: the requested page plus the next one, so the
+# first cursor is served from the memoized list and top-k pruning stays cheap
+RANKED_PREFETCH_PAGES = 2
 
 
-def initialize_cache() -> tuple[dict, dict]:
+def initialize_cache(activities_data) -> tuple[ActivityStore, dict]:
     """
-    Initialize the activities cache and build an inverted index for tags
+    Load the activities into a compact store and build the bitmap search index
+    and the full-text index
+
+    activities_data is a binary catalog snapshot (store and indexes are read as
+    prebuilt), the raw activities.json bytes or its parsed content. The parsed
+    JSON is dropped once all are built.
     """
-    activities_cache: dict = {}
-    tag_index: dict[str, set] = {}
+    if isinstance(activities_data, (bytes, bytearray, memoryview)):
+        if is_snapshot(activities_data):
+            activity_store, search_index = read_snapshot(activities_data)
+            logger.info(f"Loaded snapshot with {len(activity_store)} activities")
+            return activity_store, search_index
+        activities_data = json.loads(bytes(activities_data).decode("utf-8"))
 
-    # Load activities data if not cached
-    activities_cache = load_activities_from_s3()
+    activities = activities_data["activities"]
+    search_index = build_search_index(activities)
+    search_index["text_index"] = TextIndex.from_activities(activities, published_long_descriptions(activities))
+    activity_store = ActivityStore.from_activities(
+        activities, activities_data["metadata"], activities_data.get("icons")
+    )
 
-    # Build an inverted index for tags
-    for i, activity in enumerate(activities_cache["activities"]):
-        for tag in activity["tags"]:
-            tag = tag.lower()  # Normalize to lowercase for case-insensitive matching
-            if tag not in tag_index:
-                tag_index[tag] = set()
-            tag_index[tag].add(i)
+    logger.info(
+        f"Indexed {search_index['size']} activities with {len(search_index['tag_index'])} tags"
+        f" and {len(search_index['text_index'])} text terms"
+    )
+    # Sizing walks the whole index, only done when debugging
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Memory: {json.dumps(activity_store.memory_report(search_index))}")
+    return activity_store, search_index
 
-    logger.debug(f"{tag_index=}")
-    return activities_cache, tag_index
 
+def published_long_descriptions(activities: list[dict]) -> dict[str, str] | None:
+    """
+    Long descriptions of a slim catalog (activity id -> text) from the separate
+    store, so the full-text index covers the same text as the pipeline's
+    snapshot; None for catalogs carrying long_description inline
+    """
+    if any("long_description" in activity for activity in activities):
+        return None
+    return {activity_id: json.loads(text) for activity_id, text in long_descriptions.get().items()}
 
-def search_activities(
-    activities_cache: dict, tag_index: dict[str, set], tags: list, max_results: int = 3
-):
+
+def resolve_tag(search_index: dict, tag: str) -> str | None:
     """
-    Search for activities matching the given tags
-    Uses an inverted index for efficient lookup
+    Map a query tag to an indexed tag (the activity tags; locations and
+    education levels are facets, boosted or filtered on, not tags)
+
+    Tries, in order: exact lowercase match, diacritics-folded match, the same
+    words after Czech stemming ("kurzy" -> "kurz"), a distinctive word of a
+    multi-word tag ("zahraničí" -> "výjezd do zahraničí"), the shortest tag
+    starting with the query (bisect over the sorted folded vocabulary) and the
+    best trigram Dice similarity above FUZZY_THRESHOLD. Only tags sharing a
+    trigram with the query are scored, so no lookup scans the whole vocabulary.
+    A tag that resolves to nothing is skipped by the search rather than mapped
+    onto an unrelated tag that would empty match="all" results.
+    """
+    tag = tag.lower()
+    if tag in search_index["tag_index"]:
+        return tag
+
+    lookup = search_index["tag_lookup"]
+    folded = fold_text(tag)
+    if not folded:
+        return None
+    if folded in lookup["folded_tags"]:
+        return lookup["folded_tags"][folded][0]
+
+    stemmed = stem_phrase(folded)
+    matches = lookup["stemmed_tags"].get(stemmed) or lookup["word_stems"].get(stemmed)
+    if matches:
+        return lookup["folded_tags"][matches[0]][0]
+
+    if len(folded) >= MIN_PREFIX_LENGTH:
+        folded_sorted = lookup["folded_sorted"]
+        start = bisect.bisect_left(folded_sorted, folded)
+        end = bisect.bisect_left(folded_sorted, folded + "\uffff")
+        if start < end:
+            shortest = min(folded_sorted[start:end], key=len)
+            return lookup["folded_tags"][shortest][0]
+
+    query_grams = trigrams(folded)
+    shared: Counter = Counter()
+    for gram in query_grams:
+        shared.update(lookup["trigram_index"].get(gram, ()))
+    best, best_similarity = None, 0.0
+    for candidate, count in sorted(shared.items()):
+        similarity = 2 * count / (len(query_grams) + lookup["trigram_counts"][candidate])
+        if similarity > best_similarity:
+            best, best_similarity = candidate, similarity
+    if best_similarity < FUZZY_THRESHOLD:
+        return None
+    return lookup["folded_tags"][best][0]
+
+
+def resolve_tags(search_index: dict, tags: list) -> dict[str, str | None]:
+    """
+    Resolve every query tag, unresolvable tags map to None
+    """
+    return {tag: resolve_tag(search_index, tag) for tag in tags}
+
+
+def boosted_locations(search_index: dict, normalized_tags: list[str]) -> list[str]:
+    """
+    Folded location values containing one of the query tags
+    Scans the (small) location vocabulary instead of every candidate
+    """
+    folded_tags = [fold_text(tag) for tag in normalized_tags]
+    return [
+        location
+        for location in search_index["facet_index"]["location"]
+        if any(tag in location for tag in folded_tags)
+    ]
+
+
+def location_boost_mask(search_index: dict, normalized_tags: list[str]) -> int:
+    """
+    Bitmap of activities whose location contains one of the query tags
+    """
+    locations = search_index["facet_index"]["location"]
+    mask = 0
+    for location in boosted_locations(search_index, normalized_tags):
+        mask |= locations[location]
+    return mask
+
+
+def filter_bitmap(search_index: dict, filters: dict | None) -> int:
+    """
+    Bitmap of activities passing the structured filters
+    Values of one facet are OR-ed, different facets are AND-ed
+    """
+    allowed = search_index["all"]
+    for facet, values in (filters or {}).items():
+        if facet not in FACETS:
+            raise ValueError(f"Unknown filter: {facet}")
+        facet_index = search_index["facet_index"][facet]
+        facet_mask = 0
+        for value in as_list(values):
+            facet_mask |= facet_index.get(fold_text(value), 0)
+        allowed &= facet_mask
+    return allowed
+
+
+def restrict_bitmap(
+    search_index: dict,
+    bitmap: int,
+    exclude_tags: list | None = None,
+    filters: dict | None = None,
+) -> int:
+    """
+    Subtract activities having an excluded tag (NOT) and those failing the filters
+    """
+    for tag in exclude_tags or []:
+        bitmap &= ~search_index["tag_index"].get(tag.lower(), 0)
+    if filters:
+        bitmap &= filter_bitmap(search_index, filters)
+    return bitmap
+
+
+def candidate_bitmap(
+    search_index: dict,
+    tags: list,
+    match: str = "all",
+    exclude_tags: list | None = None,
+    filters: dict | None = None,
+) -> int:
+    """
+    Bitmap of activities matching the query: "all" intersects (AND) the tag
+    bitmaps, "any" unions (OR) them, then restrict_bitmap applies exclude_tags
+    and filters. Unknown tags are skipped.
+    """
+    tag_index = search_index["tag_index"]
+    known_tags = [tag.lower() for tag in tags if tag.lower() in tag_index]
+    if not known_tags:
+        return 0
+
+    # ints are immutable, the shared index is never modified
+    if match == "any":
+        matching = 0
+        for tag in known_tags:
+            matching |= tag_index[tag]
+    else:
+        matching = search_index["all"]
+        for tag in known_tags:
+            matching &= tag_index[tag]
+
+    return restrict_bitmap(search_index, matching, exclude_tags, filters)
+
+
+def ranked_candidate_bitmap(
+    search_index: dict,
+    tags: list,
+    exclude_tags: list | None = None,
+    filters: dict | None = None,
+) -> int:
+    """
+    Bitmap of activities considered by the ranked mode: any query tag matches,
+    or the location boost applies
+    """
+    normalized_tags = [tag.lower() for tag in tags]
+    candidates = candidate_bitmap(search_index, normalized_tags, "any")
+    candidates |= location_boost_mask(search_index, normalized_tags)
+    return restrict_bitmap(search_index, candidates, exclude_tags, filters)
+
+
+def facet_counts(search_index: dict, result_bitmap: int) -> dict[str, dict[str, int]]:
+    """
+    Per-facet value counts for a result set, computed as popcounts on the index
+    """
+    counts: dict[str, dict[str, int]] = {}
+    for facet, values in search_index["facet_index"].items():
+        labels = search_index["facet_labels"][facet]
+        counts[facet] = {}
+        for value, bitmap in values.items():
+            count = (bitmap & result_bitmap).bit_count()
+            if count:
+                counts[facet][labels[value]] = count
+    return counts
+
+
+def match_activities(
+    search_index: dict,
+    tags: list,
+    max_results: int = 3,
+    exclude_tags: list | None = None,
+    match: str = "all",
+    filters: dict | None = None,
+) -> list[int]:
+    """
+    Positions of the top activities matching the given tags (boolean mode)
+    Candidates are combined as bitmaps (see candidate_bitmap) and ranked by
+    partitioning them on the tag and location bitmaps (see top_by_terms)
     """
     # Handle empty tags
     if not tags or len(tags) == 0:
         return []
 
+    tag_index = search_index["tag_index"]
+
     # Normalize tags to lowercase
-    normalized_tags = [tag.lower() for tag in tags]
+    normalized_tags = list(dict.fromkeys(tag.lower() for tag in tags))
+    known_tags = [tag for tag in normalized_tags if tag in tag_index]
+    if not known_tags:
+        return []
+
+    matching = candidate_bitmap(search_index, known_tags, match, exclude_tags, filters)
+
+    # Number of matching tags / total tags in query, plus location boost: each
+    # tag is a term worth 1 / len(normalized_tags), the boost one more term
+    terms = [(1 / len(normalized_tags), tag_index[tag]) for tag in known_tags]
+    boosted = location_boost_mask(search_index, normalized_tags)
+    if boosted:
+        terms.append((LOCATION_BOOST, boosted))
+    return top_by_terms(terms, matching, max_results)
+
+
+def top_by_terms(terms: list[tuple[float, int]], candidates: int, max_results: int) -> list[int]:
+    """
+    Top candidates by the sum of the weights of the (weight, bitmap) terms they are in
+
+    Candidates are split best-first on matched / not matched terms; a branch
+    is only expanded while its upper bound (score so far + weights of the
+    remaining terms) can still reach the top-k, so the work depends on the
+    number of terms and k, not on the number of candidates. Ties keep catalog
+    order.
+    """
+    if max_results <= 0:
+        return []
+    terms = sorted(terms, key=lambda term: term[0], reverse=True)
+    remaining_bounds = [0.0] * (len(terms) + 1)
+    for depth in range(len(terms) - 1, -1, -1):
+        remaining_bounds[depth] = remaining_bounds[depth + 1] + terms[depth][0]
+
+    # Heap of (-upper bound, depth, score so far, bitmap); bounds are rounded so
+    # equal scores reached through different terms land on the same level
+    heap = [(-round(remaining_bounds[0], 9), 0, 0.0, candidates)]
+    ranked: list[int] = []
+    while heap and len(ranked) < max_results:
+        level = heap[0][0]
+        level_mask = 0
+        while heap and heap[0][0] == level:
+            _, depth, score, bitmap = heapq.heappop(heap)
+            if depth == len(terms):
+                level_mask |= bitmap
+                continue
+            bound, term_bitmap = terms[depth]
+            for child_score, child_bitmap in (
+                (score + bound, bitmap & term_bitmap),
+                (score, bitmap & ~term_bitmap),
+            ):
+                if child_bitmap:
+                    upper = round(child_score + remaining_bounds[depth + 1], 9)
+                    heapq.heappush(heap, (-upper, depth + 1, child_score, child_bitmap))
+        for idx in iter_bits(level_mask):
+            if len(ranked) == max_results:
+                break
+            ranked.append(idx)
+    return ranked
+
+
+def search_activities(
+    activity_store: ActivityStore,
+    search_index: dict,
+    tags: list,
+    max_results: int = 3,
+    exclude_tags: list | None = None,
+    match: str = "all",
+    filters: dict | None = None,
+):
+    """
+    Search for activities matching the given tags
+    Uses the bitmap index for efficient lookup
+    """
+    top = match_activities(search_index, tags, max_results, exclude_tags, match, filters)
+    return [activity_store.get(idx) for idx in top]
+
+
+def get_incidence_matrix(search_index: dict):
+    """
+    Incidence matrix of the index, built on the first batch and kept with the
+    index (a catalog reload replaces both)
+    """
+    if "incidence" not in search_index:
+        from incidence_matrix import IncidenceMatrix
+
+        search_index["incidence"] = IncidenceMatrix.from_search_index(search_index)
+    return search_index["incidence"]
 
-    # Find activities with matching tags
-    matching_indices: set[int] = set()
-    for tag in normalized_tags:
-        if tag in tag_index:
-            # For the first tag, add all matching activities
-            if len(matching_indices) == 0:
-                matching_indices = tag_index[tag]
-            # For subsequent tags, intersect with current matches
-            else:
-                matching_indices &= set(tag_index[tag])
-
-        # # Also check for partial matches (substrings)
-        # for indexed_tag in tag_index:
-        #     if tag in indexed_tag and tag != indexed_tag:
-        #         # For partial matches, we use a union instead of intersection
-        #         matching_indices |= set(tag_index[indexed_tag])
-
-    # Score matches based on number of matching tags
-    scored_activities: list[tuple[str, float]] = []
-    for idx in matching_indices:
-        activity = activities_cache["activities"][idx]
-        # Calculate score: number of matching tags / total tags in query
-        matching_tag_count = sum(
-            1 for tag in normalized_tags if tag in [t.lower() for t in activity["tags"]]
+
+def match_activities_batch(search_index: dict, queries: list[dict]) -> list[tuple[list[int], int]]:
+    """
+    Boolean search for a batch of queries, scored together on the incidence matrix
+    Each query is a dict of match_activities arguments (tags, max_results,
+    exclude_tags, match, filters). Returns (top, total) per query: top equals the
+    match_activities result, total the candidate_bitmap popcount.
+    """
+    tag_ids = search_index["tag_ids"]
+    prepared = []
+    for query in queries:
+        normalized_tags = list(dict.fromkeys(tag.lower() for tag in query.get("tags") or []))
+        exclude_tags = [tag.lower() for tag in query.get("exclude_tags") or []]
+        filters = query.get("filters")
+        prepared.append(
+            {
+                "tag_ids": [tag_ids[tag] for tag in normalized_tags if tag in tag_ids],
+                "size": len(normalized_tags),
+                "match": query.get("match", "all"),
+                "exclude_ids": [tag_ids[tag] for tag in exclude_tags if tag in tag_ids],
+                "allowed": filter_bitmap(search_index, filters) if filters else None,
+                "locations": boosted_locations(search_index, normalized_tags),
+                "max_results": query.get("max_results", 3),
+            }
+        )
+    return get_incidence_matrix(search_index).score(prepared, LOCATION_BOOST)
+
+
+def rank_activities(
+    search_index: dict,
+    tags: list,
+    max_results: int = 3,
+    exclude_tags: list | None = None,
+    filters: dict | None = None,
+) -> list[int]:
+    """
+    Rank activities by IDF-weighted tag overlap (OR semantics)
+
+    Score = sum of IDF of matched query tags / sum of IDF of known query tags,
+    plus the location boost. Each tag (and the location boost) is a term carrying
+    its max-score bound, see top_by_terms: low-value terms are skipped once k
+    activities are found. Ties keep catalog order.
+    """
+    tag_index = search_index["tag_index"]
+    idf = search_index["tag_idf"]
+
+    normalized_tags = list(dict.fromkeys(tag.lower() for tag in tags))
+    known_tags = [tag for tag in normalized_tags if tag in tag_index]
+    if not known_tags or max_results <= 0:
+        return []
+
+    # Each term is (max-score bound, bitmap); the location boost is one more term
+    total_idf = sum(idf[tag] for tag in known_tags)
+    terms = [(idf[tag] / total_idf, tag_index[tag]) for tag in known_tags]
+    boosted = location_boost_mask(search_index, normalized_tags)
+    if boosted:
+        terms.append((LOCATION_BOOST, boosted))
+
+    candidates = ranked_candidate_bitmap(search_index, normalized_tags, exclude_tags, filters)
+    return top_by_terms(terms, candidates, max_results)
+
+
+def tag_scorer(search_index: dict, tags: list, mode: str, candidates: int):
+    """
+    Tag score of a candidate as match_activities (boolean) or rank_activities
+    (ranked) define it, memoized per combination of matched query tags
+    """
+    tag_ids = search_index["tag_ids"]
+    normalized_tags = list(dict.fromkeys(tag.lower() for tag in tags))
+    known_tags = [tag for tag in normalized_tags if tag in tag_ids]
+    if mode == "ranked":
+        total_idf = sum(search_index["tag_idf"][tag] for tag in known_tags)
+        weights = {tag_ids[tag]: search_index["tag_idf"][tag] / total_idf for tag in known_tags}
+    else:
+        weights = {tag_ids[tag]: 1 / len(normalized_tags) for tag in known_tags}
+    query_mask = 0
+    for tag_id in weights:
+        query_mask |= 1 << tag_id
+    boosted = set(iter_bits(location_boost_mask(search_index, normalized_tags) & candidates))
+    activity_tags = search_index["activity_tags"]
+    combination_scores: dict[int, float] = {}
+
+    def score(idx: int) -> float:
+        matched = activity_tags[idx] & query_mask
+        value = combination_scores.get(matched)
+        if value is None:
+            value = combination_scores[matched] = sum(weights[tag_id] for tag_id in iter_bits(matched))
+        if idx in boosted:
+            value += LOCATION_BOOST
+        return value
+
+    return score
+
+
+def text_activities(
+    search_index: dict,
+    tags: list,
+    text: str,
+    max_results: int = 3,
+    exclude_tags: list | None = None,
+    match: str = "all",
+    mode: str = "boolean",
+    filters: dict | None = None,
+) -> tuple[list[int], int]:
+    """
+    Full-text search combined with tag scoring
+
+    Candidates are the tag search's candidates plus every activity whose title
+    or description contains a query term (after exclude_tags and filters).
+    Score = tag score + TEXT_WEIGHT * BM25 / best BM25 among the candidates,
+    so a text-only hit can outrank a weak tag match. Returns (top activity
+    indices, bitmap of all candidates); ties keep catalog order.
+    """
+    text_scores = search_index["text_index"].scores(analyze(text))
+    text_bitmap = bitmap_from_positions(text_scores, search_index["size"])
+    text_candidates = restrict_bitmap(search_index, text_bitmap, exclude_tags, filters)
+    if not tags:
+        if max_results <= 0:
+            return [], text_candidates
+        # Text only: rank the hits on BM25 alone, skipping the bitmap walk when nothing was excluded
+        positions = sorted(text_scores) if text_candidates == text_bitmap else iter_bits(text_candidates)
+        return heapq.nlargest(max_results, positions, key=text_scores.__getitem__), text_candidates
+
+    if mode == "ranked":
+        candidates = text_candidates | ranked_candidate_bitmap(search_index, tags, exclude_tags, filters)
+    else:
+        candidates = text_candidates | candidate_bitmap(search_index, tags, match, exclude_tags, filters)
+    if not candidates or max_results <= 0:
+        return [], candidates
+
+    if text_candidates == text_bitmap:
+        best = max(text_scores.values(), default=0.0)
+    else:
+        best = max((text_scores[idx] for idx in iter_bits(text_candidates)), default=0.0)
+    text_scale = TEXT_WEIGHT / best if best else 0.0
+    tag_score = tag_scorer(search_index, tags, mode, candidates)
+
+    def score(idx: int) -> float:
+        return tag_score(idx) + text_scores.get(idx, 0.0) * text_scale
+
+    return heapq.nlargest(max_results, iter_bits(candidates), key=score), candidates
+
+
+def find_activities(
+    search_index: dict,
+    tags: list,
+    max_results: int = 3,
+    exclude_tags: list | None = None,
+    match: str = "all",
+    mode: str = "boolean",
+    filters: dict | None = None,
+    text: str = "",
+):
+    """
+    Resolve the query tags and run a boolean or ranked search, combined with
+    a full-text search of titles and descriptions when text is given
+    Returns (top activity indices, bitmap of all matching activities, resolved tags)
+    """
+    # Map near-miss tags ("Soutěže", "kurzy", "stipendia") onto the indexed tags
+    with span("tag_resolution"):
+        resolved_tags = resolve_tags(search_index, tags)
+    search_tags = [resolved or tag for tag, resolved in resolved_tags.items()]
+
+    if text and search_index.get("text_index") is not None:
+        with span("text_scoring"):
+            top, result_bitmap = text_activities(
+                search_index, search_tags, text, max_results, exclude_tags, match, mode, filters
+            )
+        return top, result_bitmap, resolved_tags
+
+    # Search for matching activities
+    with span("scoring"):
+        if mode == "ranked":
+            top = rank_activities(
+                search_index=search_index,
+                tags=search_tags,
+                max_results=max_results,
+                exclude_tags=exclude_tags,
+                filters=filters,
+            )
+            result_bitmap = ranked_candidate_bitmap(search_index, search_tags, exclude_tags, filters)
+        else:
+            top = match_activities(
+                search_index=search_index,
+                tags=search_tags,
+                max_results=max_results,
+                exclude_tags=exclude_tags,
+                match=match,
+                filters=filters,
+            )
+            result_bitmap = candidate_bitmap(search_index, search_tags, match, exclude_tags, filters)
+    return top, result_bitmap, resolved_tags
+
+
+def find_activities_batch(search_index: dict, queries: list[dict]):
+    """
+    Resolve the tags of each query and run the boolean searches as one batch
+    Returns (top activity indices, total matching, resolved tags) per query
+    """
+    with span("tag_resolution"):
+        resolved = [resolve_tags(search_index, query["tags"]) for query in queries]
+    with span("scoring"):
+        results = match_activities_batch(
+            search_index,
+            [
+                {**query, "tags": [found or tag for tag, found in resolved_tags.items()]}
+                for query, resolved_tags in zip(queries, resolved)
+            ],
         )
-        score = matching_tag_count / len(normalized_tags)
+    return [(top, total, resolved_tags) for (top, total), resolved_tags in zip(results, resolved)]
+
 
-        # Also boost score for location matches
-        if any(tag in activity["location"].lower() for tag in normalized_tags):
-            score += 0.2
+# Loaded on first use (the prebuilt snapshot when published, activities.json
+# otherwise) and rebuilt whenever a new version is published
+catalog = create_activities_catalog(build=initialize_cache, prefer_snapshot=True)
+# Published next to the slim catalog, loaded only once a request asks for long descriptions
+long_descriptions = create_long_descriptions_catalog(build=encode_long_descriptions)
 
-        scored_activities.append((activity, score))
+# Ranked id lists of recent queries, so further pages are slices instead of new searches;
+# keys carry the catalog version and the cache is emptied when a new version is loaded
+ranked_cache = ResultCache(
+    "ranked",
+    max_entries=int(os.environ.get("RANKED_CACHE_MAX_ENTRIES", 256)),
+    max_bytes=int(os.environ.get("RANKED_CACHE_MAX_BYTES", 4 * 1024 * 1024)),
+    ttl_seconds=float(os.environ.get("RANKED_CACHE_TTL_SECONDS", 3600)),
+)
+catalog.on_reload(lambda version: ranked_cache.clear())
 
-    # Sort by score descending
-    scored_activities.sort(key=lambda x: x[1], reverse=True)
+record_init("module_import", IMPORT_STARTED)
 
-    # Return top N activities
-    return [activity for activity, _ in scored_activities[:max_results]]
 
+def is_string_list(value) -> bool:
+    return isinstance(value, list) and all(isinstance(item, str) for item in value)
 
-activities_cache, tag_index = initialize_cache()
 
+def validate_search(tags, match: str, mode: str, filters, text="", max_results=3, exclude_tags=None) -> str | None:
+    """
+    Error message for an invalid search, None when it can run
+    Every entry point runs its searches through it, so everything past it
+    can rely on the types
+    """
+    if not is_string_list(tags) or not isinstance(text, str):
+        return "tags must be a list of strings and text a string"
+    if exclude_tags is not None and not is_string_list(exclude_tags):
+        return "exclude_tags must be a list of strings"
+    if not tags and not text.strip():
+        return "No search tags or text provided"
+    if match not in ("all", "any"):
+        return "match must be 'all' or 'any'"
+    if mode not in ("boolean", "ranked"):
+        return "mode must be 'boolean' or 'ranked'"
+    if not isinstance(filters, dict) or any(facet not in FACETS for facet in filters):
+        return f"filters must be an object with keys from {list(FACETS)}"
+    for values in filters.values():
+        valid = isinstance(values, str) or is_string_list(values)
+        if not valid or not any(value.strip() for value in as_list(values)):
+            return "filter values must be a string or a non-empty list of strings"
+    if isinstance(max_results, bool) or not isinstance(max_results, int):
+        return f"max_results must be an integer from 1 to {MAX_RANKED_RESULTS}"
+    if not 1 <= max_results <= MAX_RANKED_RESULTS:
+        return f"max_results must be an integer from 1 to {MAX_RANKED_RESULTS}"
+    return None
+
+
+def normalize_search(
+    tags: list, exclude_tags: list, match: str, mode: str, filters: dict, text: str = ""
+) -> dict:
+    """
+    Canonical form of a search: tags and filter values in any order or case
+    give the same search, text is reduced to its folded words
+    """
+    return {
+        "tags": sorted(dict.fromkeys(tag.lower() for tag in tags)),
+        "exclude_tags": sorted(dict.fromkeys(tag.lower() for tag in exclude_tags or [])),
+        "match": match,
+        "mode": mode,
+        "filters": {
+            facet: sorted({fold_text(value) for value in as_list(values)})
+            for facet, values in sorted(filters.items())
+        },
+        "text": " ".join(tokenize(text)),
+    }
+
+
+def ranked_results(search_index: dict, search: dict, depth: int) -> dict:
+    """
+    Ranked ids (at least the first depth, capped at MAX_RANKED_RESULTS), total,
+    facets and resolved tags of a normalized search, memoized per catalog
+    version in ranked_cache. A memoized list too short for depth is ranked
+    again deeper, so only searches paged that far pay for a deep ranking.
+    """
+    depth = min(depth, MAX_RANKED_RESULTS)
+    key = (catalog.version, json.dumps(search, ensure_ascii=False, sort_keys=True))
+    cached, _ = ranked_cache.get(key)
+    if cached is not None and len(cached["ids"]) >= min(depth, cached["total"]):
+        return cached
+    if cached is not None:
+        # Deeper than before: at least double, so paging on costs a few re-rankings
+        depth = min(max(depth, 2 * len(cached["ids"])), MAX_RANKED_RESULTS)
+    top, result_bitmap, resolved_tags = find_activities(
+        search_index,
+        search["tags"],
+        depth,
+        search["exclude_tags"],
+        search["match"],
+        search["mode"],
+        search["filters"],
+        search["text"],
+    )
+    ranked = {
+        "ids": top,
+        "total": result_bitmap.bit_count(),
+        "facets": facet_counts(search_index, result_bitmap),
+        "resolved_tags": resolved_tags,
+    }
+    ranked_cache.put(key, ranked)
+    return ranked
+
+
+def cursor_error(search: dict, offset, page_size) -> str | None:
+    """
+    Error message for cursor state that does not describe a valid page, None when it does
+    """
+    error = validate_search(
+        search["tags"],
+        search["match"],
+        search["mode"],
+        search["filters"],
+        search["text"],
+        page_size,
+        search["exclude_tags"],
+    )
+    if error:
+        return error
+    if isinstance(offset, bool) or not isinstance(offset, int) or offset < 0:
+        return "offset must be a non-negative integer"
+    return None
+
+
+def encode_cursor(search: dict, offset: int, page_size: int, version: str | None) -> str:
+    """
+    Opaque cursor of the next page: the normalized search, where the page
+    starts, its size and the catalog version it was ranked on; raises
+    ValueError for state decode_cursor would reject
+    """
+    error = cursor_error(search, offset, page_size)
+    if error:
+        raise ValueError(error)
+    state = {"search": search, "offset": offset, "page_size": page_size, "version": version}
+    raw = json.dumps(state, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    """
+    State of an encode_cursor cursor, raises ValueError when it is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        state = json.loads(raw.decode("utf-8"))
+        search = state["search"]
+        # Cursors issued before text search existed
+        search.setdefault("text", "")
+        error = cursor_error(search, state["offset"], state["page_size"])
+        if error:
+            raise ValueError(error)
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        raise ValueError(f"Invalid cursor: {str(e)}") from e
+    return state
+
+
+def result_fragments(activity_store: ActivityStore, top: list[int], fields) -> list[bytes]:
+    """
+    Pre-encoded results: slim documents (icon key instead of the SVG, no
+    long_description) unless the requested fields include long_description,
+    which is then joined from the long-description store when the catalog
+    was published without it
+    """
+    if not fields or "long_description" not in fields:
+        return [activity_store.fragment(idx, slim=True) for idx in top]
+    if activity_store.has_long_descriptions:
+        return [activity_store.fragment(idx) for idx in top]
+    store = long_descriptions.get()
+    return [
+        activity_store.fragment(idx, long_description=store.get(str(activity_store.ids[idx])))
+        for idx in top
+    ]
+
+
+def search_batch(activity_store: ActivityStore, search_index: dict, queries, event):
+    """
+    Batch form of the handler: {"queries": [{"query", "tags", "exclude_tags",
+    "match", "filters", "fields", "max_results"}, ...]}, boolean mode only;
+    each query is validated and normalized like a single search, an invalid
+    one fails the batch with a 400 naming its position
+    """
+    if not isinstance(queries, list) or not queries:
+        return build_api_response(400, {"error": "queries must be a non-empty list"})
+    if len(queries) > MAX_BATCH_QUERIES:
+        return build_api_response(400, {"error": f"At most {MAX_BATCH_QUERIES} queries per batch"})
+
+    parsed = []
+    for position, query in enumerate(queries):
+        if not isinstance(query, dict):
+            return build_api_response(400, {"error": f"Query {position}: must be an object"})
+        tags = query.get("tags") or []
+        exclude_tags = query.get("exclude_tags") or []
+        match = query.get("match", "all")
+        filters = query.get("filters") or {}
+        max_results = query.get("max_results", 3)
+        if query.get("mode", "boolean") != "boolean":
+            return build_api_response(400, {"error": f"Query {position}: batch queries only support mode 'boolean'"})
+        error = validate_search(tags, match, "boolean", filters, "", max_results, exclude_tags)
+        if error:
+            return build_api_response(400, {"error": f"Query {position}: {error}"})
+        search = normalize_search(tags, exclude_tags, match, "boolean", filters)
+        parsed.append(
+            {
+                "tags": search["tags"],
+                "exclude_tags": search["exclude_tags"],
+                "match": match,
+                "filters": search["filters"],
+                "max_results": max_results,
+            }
+        )
+
+    bodies = []
+    returned = set()
+    for query, (top, total, resolved) in zip(queries, find_activities_batch(search_index, parsed)):
+        tags = query["tags"]
+        resolved_tags = {tag: resolved.get(tag.lower()) for tag in tags}
+        log_query(query.get("query", ""), tags, len(top), {"batch": len(queries)})
+        returned.update(top)
+        bodies.append(
+            build_json_body(
+                {
+                    "query": query.get("query", ""),
+                    "tags": tags,
+                    "resolved_tags": resolved_tags,
+                    "unknown_tags": [tag for tag, found in resolved_tags.items() if found is None],
+                    "filters": query.get("filters") or {},
+                    "count": len(top),
+                    "total": total,
+                },
+                "results",
+                result_fragments(activity_store, top, query.get("fields")),
+            )
+        )
 
+    body = build_json_body(
+        {
+            "catalog_version": catalog.version,
+            "mode": "boolean",
+            "count": len(bodies),
+            "icons": activity_store.icon_table(returned),
+        },
+        "results",
+        bodies,
+    )
+    return build_api_response(200, body, event)
+
+
+@instrument_handler("search_engine")
 def lambda_handler(event, context):
     """
     Lambda handler for the search engine
@@ -94,30 +862,81 @@ def lambda_handler(event, context):
     if event.get("httpMethod") == "OPTIONS" or event.get("routeKey", "").startswith("OPTIONS"):
         return handle_options()
     try:
+        activity_store, search_index = catalog.get()
+
         # Parse the incoming request
         body = json.loads(event.get("body", "{}"))
+        if "queries" in body:
+            return search_batch(activity_store, search_index, body["queries"], event)
         query = body.get("query", "")
-        tags = body.get("tags", [])
-        max_results = int(body.get("max_results", 3))
-
-        if not tags or len(tags) == 0:
-            return build_api_response(400, {"error": "No search tags provided"})
-
-        # Search for matching activities
-        results = search_activities(
-            activities_cache=activities_cache,
-            tag_index=tag_index,
-            tags=tags,
-            max_results=max_results,
+        fields = body.get("fields")
+
+        if body.get("cursor"):
+            # Next page of an earlier search: {"cursor": next_cursor from its response}
+            try:
+                state = decode_cursor(body["cursor"])
+            except ValueError as e:
+                logger.warning(str(e))
+                return build_api_response(400, {"error": "Invalid cursor"})
+            if state["version"] != catalog.version:
+                return build_api_response(
+                    400, {"error": "The catalog has changed since this cursor was issued, repeat the search"}
+                )
+            search = state["search"]
+            tags, filters, text = search["tags"], search["filters"], search["text"]
+            offset, max_results = state["offset"], state["page_size"]
+        else:
+            tags = body.get("tags") or []
+            text = body.get("text") or ""
+            filters = body.get("filters") or {}
+            match = body.get("match", "all")
+            mode = body.get("mode", "boolean")
+            max_results = body.get("max_results", 3)
+            exclude_tags = body.get("exclude_tags") or []
+            error = validate_search(tags, match, mode, filters, text, max_results, exclude_tags)
+            if error:
+                return build_api_response(400, {"error": error})
+            search = normalize_search(tags, exclude_tags, match, mode, filters, text)
+            offset = 0
+
+        # Ranks this page and the next one and memoizes them, further pages slice
+        # the memoized list (ranked deeper when a cursor goes past it)
+        ranked = ranked_results(search_index, search, offset + RANKED_PREFETCH_PAGES * max_results)
+        top = ranked["ids"][offset : offset + max_results]
+        next_offset = offset + len(top)
+        next_cursor = (
+            encode_cursor(search, next_offset, max_results, catalog.version)
+            if top and next_offset < min(ranked["total"], MAX_RANKED_RESULTS)
+            else None
         )
+        resolved_tags = {tag: ranked["resolved_tags"].get(tag.lower()) for tag in tags}
+        unknown_tags = [tag for tag, resolved in resolved_tags.items() if resolved is None]
 
         # Log the query and results for analytics
-        log_query(query, tags, len(results))
+        log_query(query, tags, len(top))
 
-        return build_api_response(
-            200,
-            {"query": query, "tags": tags, "count": len(results), "results": results},
+        # Results are joined from pre-encoded fragments, icons are sent once per response
+        body = build_json_body(
+            {
+                "query": query,
+                "tags": tags,
+                "text": text,
+                "catalog_version": catalog.version,
+                "mode": search["mode"],
+                "resolved_tags": resolved_tags,
+                "unknown_tags": unknown_tags,
+                "filters": filters,
+                "offset": offset,
+                "count": len(top),
+                "total": ranked["total"],
+                "next_cursor": next_cursor,
+                "facets": ranked["facets"],
+                "icons": activity_store.icon_table(top),
+            },
+            "results",
+            result_fragments(activity_store, top, fields),
         )
+        return build_api_response(200, body, event)
     except Exception as e:
         logger.error(f"Error searching activities: {str(e)}")
         return build_api_response(500, {"error": "Internal server error"})
@@ -0,0 +1,232 @@
+import math
+
+from utils import fold_text, stem_token
+from activity_store import as_list
+
+# Activity fields indexed for structured filters and facet counts
+FACETS = ("education_level", "location", "category")
+# Shortest word stem of a multi-word tag that identifies the tag on its own
+# (shorter words like "v", "do", "čr" are not distinctive)
+MIN_WORD_STEM_LENGTH = 4
+
+
+def bitmap_from_positions(positions, size: int) -> int:
+    """
+    Build an activity bitmap (bit i set = activity i matches) from a list of positions
+    """
+    buffer = bytearray((size + 7) // 8)
+    for position in positions:
+        buffer[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(buffer, "little")
+
+
+def iter_bits(bitmap: int):
+    """
+    Yield positions of the set bits of a bitmap in ascending order
+    """
+    bits = bin(bitmap)[:1:-1]  # least significant bit first
+    position = bits.find("1")
+    while position != -1:
+        yield position
+        position = bits.find("1", position + 1)
+
+
+def tag_idf(document_frequency: int, size: int) -> float:
+    """
+    BM25-style inverse document frequency, always positive
+    """
+    return math.log(1 + (size - document_frequency + 0.5) / (document_frequency + 0.5))
+
+
+def trigrams(text: str) -> set[str]:
+    """
+    Character trigrams of a folded string, padded so word boundaries count
+    """
+    padded = f"  {text} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def stem_phrase(folded: str) -> str:
+    return " ".join(stem_token(word) for word in folded.split())
+
+
+def build_tag_lookup(tags) -> dict:
+    """
+    Build the structures used to resolve near-miss query tags
+
+    - folded_tags: diacritics-folded tag -> indexed tags
+    - stemmed_tags: folded tag with each word stemmed -> folded tags
+    - word_stems: stem of a distinctive word of a multi-word tag -> folded tags
+    - folded_sorted: sorted folded tags for prefix lookups with bisect
+    - trigram_index: trigram -> folded tags containing it
+    - trigram_counts: folded tag -> number of its trigrams
+    """
+    folded_tags: dict[str, list[str]] = {}
+    for tag in tags:
+        folded_tags.setdefault(fold_text(tag), []).append(tag)
+
+    stemmed_tags: dict[str, list[str]] = {}
+    word_stems: dict[str, list[str]] = {}
+    for folded in sorted(folded_tags, key=len):
+        stemmed_tags.setdefault(stem_phrase(folded), []).append(folded)
+        words = folded.split()
+        if len(words) > 1:
+            for stem in dict.fromkeys(stem_token(word) for word in words):
+                if len(stem) >= MIN_WORD_STEM_LENGTH:
+                    word_stems.setdefault(stem, []).append(folded)
+
+    trigram_index: dict[str, list[str]] = {}
+    trigram_counts: dict[str, int] = {}
+    for folded in folded_tags:
+        grams = trigrams(folded)
+        trigram_counts[folded] = len(grams)
+        for gram in grams:
+            trigram_index.setdefault(gram, []).append(folded)
+
+    return {
+        "folded_tags": folded_tags,
+        "stemmed_tags": stemmed_tags,
+        "word_stems": word_stems,
+        "folded_sorted": sorted(folded_tags),
+        "trigram_index": trigram_index,
+        "trigram_counts": trigram_counts,
+    }
+
+
+def build_search_index(activities: list[dict]) -> dict:
+    """
+    Build bitmap indexes over the activities
+
+    - tag_index: tag -> bitmap of activities having the tag
+    - tag_ids: tag -> bit position used in the per-activity tag masks
+    - activity_tags: per-activity bitmap of tag ids (lowercased tags, computed once)
+    - tag_idf: tag -> inverse document frequency, also the tag's max-score bound
+    - facet_index: facet -> folded value -> bitmap of activities
+    - facet_labels: facet -> folded value -> value as written in the catalog
+    - tag_lookup: folded / trigram lookups for fuzzy tag resolution
+    """
+    tag_ids: dict[str, int] = {}
+    tag_postings: dict[str, list[int]] = {}
+    facet_postings: dict[str, dict[str, list[int]]] = {facet: {} for facet in FACETS}
+    facet_labels: dict[str, dict[str, str]] = {facet: {} for facet in FACETS}
+    activity_tags: list[int] = []
+
+    for i, activity in enumerate(activities):
+        tags_mask = 0
+        for tag in activity["tags"]:
+            tag = tag.lower()  # Normalize to lowercase for case-insensitive matching
+            if tag not in tag_ids:
+                tag_ids[tag] = len(tag_ids)
+                tag_postings[tag] = []
+            if not tags_mask >> tag_ids[tag] & 1:
+                tag_postings[tag].append(i)
+            tags_mask |= 1 << tag_ids[tag]
+        activity_tags.append(tags_mask)
+
+        for facet in FACETS:
+            for value in as_list(activity.get(facet)):
+                folded = fold_text(value)
+                facet_labels[facet].setdefault(folded, value)
+                postings = facet_postings[facet].setdefault(folded, [])
+                if not postings or postings[-1] != i:
+                    postings.append(i)
+
+    size = len(activities)
+    return finish_search_index(
+        size,
+        {tag: bitmap_from_positions(positions, size) for tag, positions in tag_postings.items()},
+        activity_tags,
+        {
+            facet: {
+                value: bitmap_from_positions(positions, size)
+                for value, positions in postings.items()
+            }
+            for facet, postings in facet_postings.items()
+        },
+        facet_labels,
+    )
+
+
+def finish_search_index(
+    size: int,
+    tag_index: dict[str, int],
+    activity_tags: list[int],
+    facet_index: dict[str, dict[str, int]],
+    facet_labels: dict[str, dict[str, str]],
+) -> dict:
+    """
+    Assemble the search index from its bitmaps, deriving IDF and the tag lookup
+    tag_index must be ordered by tag id
+    """
+    return {
+        "size": size,
+        "all": (1 << size) - 1,
+        "tag_ids": {tag: tag_id for tag_id, tag in enumerate(tag_index)},
+        "tag_index": tag_index,
+        "activity_tags": activity_tags,
+        "tag_idf": {tag: tag_idf(bitmap.bit_count(), size) for tag, bitmap in tag_index.items()},
+        "facet_index": facet_index,
+        "facet_labels": facet_labels,
+        "tag_lookup": build_tag_lookup(tag_index),
+    }
+
+
+def _pack_bitmaps(bitmaps, width: int) -> bytes:
+    return b"".join(bitmap.to_bytes(width, "little") for bitmap in bitmaps)
+
+
+def _unpack_bitmaps(buffer, width: int) -> list[int]:
+    # A copy per bitmap: the search works on ints, not on the buffer
+    return [
+        int.from_bytes(buffer[start : start + width], "little")
+        for start in range(0, len(buffer), width)
+    ]
+
+
+def index_to_sections(search_index: dict) -> tuple[dict, dict[str, bytes]]:
+    """
+    Split the index into a JSON-serializable header and fixed-width bitmap sections
+    Bitmaps are stored little-endian, one (size + 7) // 8 byte block per bitmap
+    """
+    size = search_index["size"]
+    width = (size + 7) // 8
+    tag_width = (len(search_index["tag_index"]) + 7) // 8
+    header = {
+        "size": size,
+        "tags": list(search_index["tag_index"]),
+        "facets": {
+            facet: [[value, search_index["facet_labels"][facet][value]] for value in values]
+            for facet, values in search_index["facet_index"].items()
+        },
+    }
+    sections = {
+        "tag_bitmaps": _pack_bitmaps(search_index["tag_index"].values(), width),
+        "activity_tags": _pack_bitmaps(search_index["activity_tags"], tag_width),
+    }
+    for facet, values in search_index["facet_index"].items():
+        sections[f"facet_bitmaps.{facet}"] = _pack_bitmaps(values.values(), width)
+    return header, sections
+
+
+def index_from_sections(header: dict, sections: dict) -> dict:
+    """
+    Rebuild the index written by index_to_sections
+    Bitmap sections are converted to ints, unlike the store sections they are not kept as views
+    """
+    size = header["size"]
+    width = (size + 7) // 8
+    tag_width = (len(header["tags"]) + 7) // 8
+    tag_bitmaps = _unpack_bitmaps(sections["tag_bitmaps"], width) if width else []
+    facet_index: dict[str, dict[str, int]] = {}
+    facet_labels: dict[str, dict[str, str]] = {}
+    for facet, values in header["facets"].items():
+        bitmaps = _unpack_bitmaps(sections[f"facet_bitmaps.{facet}"], width) if width else []
+        facet_index[facet] = {value: bitmap for (value, _), bitmap in zip(values, bitmaps)}
+        facet_labels[facet] = {value: label for value, label in values}
+    return finish_search_index(
+        size,
+        dict(zip(header["tags"], tag_bitmaps)),
+        _unpack_bitmaps(sections["activity_tags"], tag_width) if tag_width else [0] * size,
+        facet_index,
+        facet_labels,
+    )
@@ -0,0 +1,166 @@
+"""
+Deterministic tag extraction from a user query, the fast path before the LLM
+
+Vocabulary entries (tags, locations, education levels, categories) and a few
+aliases (cities -> regions, school types -> education levels) become
+sequences of folded, stemmed words. An Aho-Corasick automaton over those word
+sequences finds every entry mentioned in the query in one pass, so matches
+respect word boundaries ("kurz" does not match "kurzor") and inflected forms
+("v Praze", "soutěže", "kurzy") still match.
+"""
+from utils import stem_token, tokenize
+
+# Folded words that carry no search intent, ignored in queries and patterns
+STOPWORDS = frozenset(
+    """
+    a i o u v ve k ke s se z ze na do od po pro pri za pod nad mezi bez nebo ale ani
+    jsem jsi je jsme jste jsou byt bych bys chci chtel chtela chteli hledam hledame
+    hledat hledal hledala najdi najit najdete doporuc doporucte poradte poradit prosim
+    mam mame mi me mne muj moje moji nas nam vas vam nejaky nejakou nejake nejakeho neco
+    jak kde co kdy ktery ktera ktere kterou tento tato toto ten ta to tak take taky jen uz
+    jeste treba rad rada bavi zajem zajmem zajima zajimam zajimaji ahoj dobry den dekuji
+    """.split()
+)
+
+# Alias phrases for vocabulary entries, used only when the entry is in the vocabulary
+ALIASES = {
+    "Praha": ["praze", "prahy"],
+    "Jihomoravský kraj": ["brno", "brne", "jizni morava"],
+    "Moravskoslezský kraj": ["ostrava", "ostrave"],
+    "Plzeňský kraj": ["plzen", "plzni", "plzne"],
+    "Olomoucký kraj": ["olomouc", "olomouci"],
+    "Liberecký kraj": ["liberec", "liberci"],
+    "Královehradecký kraj": ["hradec kralove", "hradci kralove"],
+    "Pardubický kraj": ["pardubice", "pardubicich"],
+    "Zlínský kraj": ["zlin", "zline"],
+    "Kraj Vysočina": ["vysocina", "jihlava", "jihlave"],
+    "Jihočeský kraj": ["ceske budejovice", "ceskych budejovicich"],
+    "Karlovarský kraj": ["karlovy vary", "karlovych varech"],
+    "Ústecký kraj": ["usti nad labem"],
+    "celá ČR/online": ["online", "cela cr", "cela republika"],
+    "student sš": ["ss", "stredni skola", "stredoskolak", "stredoskolacka", "gymnazium"],
+    "student vš": ["vs", "vysoka skola", "vysokoskolak", "vysokoskolacka", "univerzita"],
+    "student zš": ["zs", "zakladni skola", "zak", "zakyne"],
+}
+
+# Confidence of a match by how the query words relate to the pattern
+EXACT_CONFIDENCE = 1.0
+STEMMED_CONFIDENCE = 0.9
+ALIAS_CONFIDENCE = 0.85
+
+
+def _content_words(text) -> list[str]:
+    return [word for word in tokenize(text) if word not in STOPWORDS]
+
+
+def _entry_key(value) -> str:
+    return " ".join(tokenize(value))
+
+
+class TagExtractor:
+    """
+    Word-level Aho-Corasick automaton over stemmed vocabulary phrases
+    """
+
+    def __init__(self):
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        # Patterns ending in a state: (length in words, tag, folded words, is alias)
+        self._output: list[list[tuple]] = [[]]
+
+    @classmethod
+    def from_tags_data(cls, tags_data: dict):
+        """
+        Build the automaton for a unique_tags.json document
+        """
+        extractor = cls()
+        entries = {}
+        for field in ("tags", "locations", "education_levels", "categories"):
+            for value in tags_data.get(field) or []:
+                entries.setdefault(_entry_key(value), value)
+
+        for value in entries.values():
+            extractor._add(_content_words(value), value.lower(), alias=False)
+        for target, aliases in ALIASES.items():
+            value = entries.get(_entry_key(target))
+            if value is None:
+                continue
+            for alias in aliases:
+                extractor._add(_content_words(alias), value.lower(), alias=True)
+        extractor._link()
+        return extractor
+
+    def _add(self, words: list[str], tag: str, alias: bool):
+        if not words:
+            return
+        state = 0
+        for stem in (stem_token(word) for word in words):
+            if stem not in self._goto[state]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[state][stem] = len(self._goto) - 1
+            state = self._goto[state][stem]
+        self._output[state].append((len(words), tag, tuple(words), alias))
+
+    def _link(self):
+        """
+        Breadth-first failure links; each state also inherits the outputs of its failure state
+        """
+        queue = list(self._goto[0].values())  # depth 1 states fail to the root
+        for state in queue:
+            for stem, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and stem not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(stem, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def extract(self, query: str) -> dict:
+        """
+        Tags mentioned in the query
+
+        Returns {"tags": [...], "matches": [{"tag", "text", "confidence"}],
+        "coverage": share of the query's content words covered by matches,
+        "confidence": coverage times the mean match confidence}
+        """
+        words = _content_words(query)
+        candidates = []
+        state = 0
+        for position, stem in enumerate(stem_token(word) for word in words):
+            while state and stem not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(stem, 0)
+            for length, tag, pattern_words, alias in self._output[state]:
+                start = position - length + 1
+                if alias:
+                    confidence = ALIAS_CONFIDENCE
+                elif tuple(words[start : position + 1]) == pattern_words:
+                    confidence = EXACT_CONFIDENCE
+                else:
+                    confidence = STEMMED_CONFIDENCE
+                candidates.append((start, position + 1, tag, confidence))
+
+        # Longest matches first, then leftmost; overlapping shorter matches are dropped
+        covered = [False] * len(words)
+        matches = []
+        seen_tags = set()
+        for start, end, tag, confidence in sorted(candidates, key=lambda c: (c[0] - c[1], c[0])):
+            if any(covered[start:end]):
+                continue
+            covered[start:end] = [True] * (end - start)
+            if tag not in seen_tags:
+                seen_tags.add(tag)
+                matches.append((start, {"tag": tag, "text": " ".join(words[start:end]), "confidence": confidence}))
+        # Report in query order
+        matches = [match for _, match in sorted(matches, key=lambda item: item[0])]
+
+        coverage = sum(covered) / len(words) if words else 0.0
+        mean_confidence = sum(match["confidence"] for match in matches) / len(matches) if matches else 0.0
+        return {
+            "tags": [match["tag"] for match in matches],
+            "matches": matches,
+            "coverage": round(coverage, 3),
+            "confidence": round(coverage * mean_confidence, 3),
+        }
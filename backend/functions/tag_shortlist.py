@@ -0,0 +1,79 @@
+"""
+Candidate tag shortlisting for the keyword-extraction prompt
+
+Vocabulary tags are ranked against the query by cosine similarity of
+character 3-gram TF-IDF vectors (folded text, word-boundary padded), so
+inflected or misspelled words still score ("soutezi" ~ "soutěž"). The
+L2-normalized tag x n-gram matrix is computed once per vocabulary, on the
+first ranking, so NumPy is only imported on the LLM path.
+"""
+import math
+
+from utils import tokenize
+
+
+def char_ngrams(text, n=3) -> list[str]:
+    """
+    Character n-grams of each folded word, padded with spaces at word boundaries
+    """
+    grams = []
+    for word in tokenize(text):
+        padded = f" {word} "
+        grams.extend(padded[i : i + n] for i in range(max(len(padded) - n + 1, 1)))
+    return grams
+
+
+class TagShortlist:
+    def __init__(self, tags: list[str]):
+        self.tags = list(tags)
+        self._columns = None  # n-gram -> matrix column
+        self._idf = None
+        self._matrix = None
+
+    def _build(self):
+        import numpy as np
+
+        documents = [char_ngrams(tag) for tag in self.tags]
+        columns: dict[str, int] = {}
+        for grams in documents:
+            for gram in grams:
+                columns.setdefault(gram, len(columns))
+
+        counts = np.zeros((len(self.tags), max(len(columns), 1)), dtype=np.float32)
+        for row, grams in enumerate(documents):
+            for gram in grams:
+                counts[row, columns[gram]] += 1
+        document_frequency = np.count_nonzero(counts, axis=0)
+        idf = np.log((1 + len(self.tags)) / (1 + document_frequency)).astype(np.float32) + 1
+        matrix = counts * idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        self._matrix = matrix / np.where(norms == 0, 1, norms)
+        self._idf = idf
+        self._columns = columns
+
+    def rank(self, query: str, limit: int) -> list[str]:
+        """
+        Up to limit tags most similar to the query, best first (vocabulary order on ties)
+        """
+        if len(self.tags) <= limit:
+            return list(self.tags)
+        if self._matrix is None:
+            self._build()
+        import numpy as np
+
+        vector = np.zeros(self._matrix.shape[1], dtype=np.float32)
+        for gram in char_ngrams(query):
+            column = self._columns.get(gram)
+            if column is not None:
+                vector[column] += self._idf[column]
+        scores = self._matrix @ vector
+        # Stable sort keeps vocabulary order for equal scores
+        order = np.argsort(-scores, kind="stable")[:limit]
+        return [self.tags[i] for i in order]
+
+
+def estimate_tokens(text) -> int:
+    """
+    Rough token count of a prompt (about 4 UTF-8 bytes per token, Czech text with diacritics)
+    """
+    return math.ceil(len(str(text).encode("utf-8")) / 4)
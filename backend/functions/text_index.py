@@ -0,0 +1,144 @@
+"""
+BM25 full-text index over activity titles and descriptions
+
+Text is analyzed the same way for activities and queries: folded words
+(utils.tokenize), the tag extractor's Czech stopwords dropped and the light
+Czech stemmer applied (utils.stem_token), so "olympiáda", "olympiády" and
+"olympiadu" are one term. Title words count TITLE_WEIGHT times. The body is
+the long description when the catalog has it, the short description (its
+first 120 characters) otherwise.
+
+BM25 impacts (idf * saturated, length-normalized term frequency) are
+computed when the index is built and stored next to the postings, so a query
+only adds up the impacts of its terms' postings and keeps the top k in a heap.
+"""
+import re
+import heapq
+from array import array
+from functools import lru_cache
+from collections import Counter
+
+from utils import stem_token, tokenize
+from tag_extractor import STOPWORDS
+from search_index import tag_idf
+
+# BM25 term frequency saturation and length normalization
+K1 = 1.2
+B = 0.75
+# A title word counts like this many body words
+TITLE_WEIGHT = 2
+
+# HTML tags and entities of the descriptions
+HTML_MARKUP = re.compile(r"<[^>]*>|&#?\w+;")
+WORD = re.compile(r"\w+")
+
+
+@lru_cache(maxsize=65536)
+def analyze_word(word: str) -> tuple[str, ...]:
+    """
+    Index terms of one lowercase word (folding may split it), memoized: the
+    vocabulary is small next to the number of words in a catalog
+    """
+    return tuple(stem_token(token) for token in tokenize(word) if token not in STOPWORDS)
+
+
+def analyze(text) -> list[str]:
+    """
+    Index terms of a text, in order
+    """
+    words = WORD.findall(HTML_MARKUP.sub(" ", text or "").lower())
+    return [term for word in words for term in analyze_word(word)]
+
+
+class TextIndex:
+    """
+    Inverted index: term -> (activity positions, BM25 impacts) in flat arrays,
+    postings of term i are [offsets[i], offsets[i + 1])
+    """
+
+    __slots__ = ("terms", "_term_ids", "_offsets", "_docs", "_impacts")
+
+    # Flat sections written to / read from a catalog snapshot, with their array type
+    SECTIONS = {"offsets": "I", "docs": "I", "impacts": "f"}
+
+    def __init__(self, terms: list[str], offsets, docs, impacts):
+        self.terms = terms
+        self._term_ids = {term: term_id for term_id, term in enumerate(terms)}
+        self._offsets = offsets
+        self._docs = docs
+        self._impacts = impacts
+
+    @classmethod
+    def from_activities(cls, activities, long_descriptions: dict | None = None):
+        """
+        Index the activities (in catalog order); long_descriptions maps str(id)
+        to the long description of catalogs that publish it separately
+        """
+        postings: dict[str, list[tuple[int, int]]] = {}
+        lengths = []
+        for idx, activity in enumerate(activities):
+            body = activity.get("long_description")
+            if body is None and long_descriptions:
+                body = long_descriptions.get(str(activity.get("id")))
+            frequencies = Counter(analyze(body if body is not None else activity.get("short_description")))
+            for term in analyze(activity.get("title")):
+                frequencies[term] += TITLE_WEIGHT
+            for term, frequency in frequencies.items():
+                postings.setdefault(term, []).append((idx, frequency))
+            lengths.append(sum(frequencies.values()))
+
+        size = len(lengths)
+        average_length = sum(lengths) / size if size else 0.0
+        norms = [K1 * (1 - B + B * length / average_length) for length in lengths]
+        offsets, docs, impacts = array("I", [0]), array("I"), array("f")
+        for term_postings in postings.values():
+            weight = tag_idf(len(term_postings), size) * (K1 + 1)
+            for idx, frequency in term_postings:
+                docs.append(idx)
+                impacts.append(weight * frequency / (frequency + norms[idx]))
+            offsets.append(len(docs))
+        return cls(list(postings), offsets, docs, impacts)
+
+    def to_sections(self) -> tuple[dict, dict[str, bytes]]:
+        header = {"terms": self.terms}
+        sections = {name: bytes(getattr(self, f"_{name}")) for name in self.SECTIONS}
+        return header, sections
+
+    @classmethod
+    def from_sections(cls, header: dict, sections: dict):
+        """
+        Rebuild the index from to_sections output, the sections are used in place
+        """
+        arrays = {name: memoryview(sections[name]).cast(typecode) for name, typecode in cls.SECTIONS.items()}
+        return cls(header["terms"], arrays["offsets"], arrays["docs"], arrays["impacts"])
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def scores(self, terms: list[str]) -> dict[int, float]:
+        """
+        BM25 score of every activity containing at least one of the (analyzed) query terms
+        """
+        ranges = []
+        for term in dict.fromkeys(terms):
+            term_id = self._term_ids.get(term)
+            if term_id is not None:
+                ranges.append((self._offsets[term_id], self._offsets[term_id + 1]))
+        if not ranges:
+            return {}
+        # The longest posting list seeds the scores in one go, the others are added to it
+        ranges.sort(key=lambda bounds: bounds[0] - bounds[1])
+        start, end = ranges[0]
+        scores = dict(zip(self._docs[start:end], self._impacts[start:end]))
+        get = scores.get
+        for start, end in ranges[1:]:
+            for idx, impact in zip(self._docs[start:end], self._impacts[start:end]):
+                scores[idx] = get(idx, 0.0) + impact
+        return scores
+
+    def search(self, text: str, max_results: int = 10) -> list[tuple[int, float]]:
+        """
+        (position, score) of the best matching activities, best first (ties keep catalog order)
+        """
+        scores = self.scores(analyze(text))
+        return heapq.nsmallest(max_results, scores.items(), key=lambda item: (-item[1], item[0]))
@@ -1,99 +1,874 @@
-import json
 import os
+import gzip
+import json
+import time
+import uuid
+import base64
+import random
+import hashlib
 import logging
+import functools
+import contextlib
+import threading
+from collections import OrderedDict
 
-import boto3
+from unidecode import unidecode
 
-# Configure logging
+# Configure logging; DEBUG (request events, raw model responses) is for local development
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
 logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
+logger.setLevel(LOG_LEVEL)
+
 
+# Milliseconds spent in each init stage of this container (imports, clients, first catalog loads)
+INIT_TIMINGS = {}
+_init_reported = False
 
-def load_activities_from_s3():
+
+def record_init(stage, started):
     """
-    Load activities data from S3 bucket
-    Returns the activities data as a Python dictionary
+    Record the duration of an init stage that began at time.perf_counter() == started
+    Only the first occurrence of a stage is kept
     """
-    try:
-        s3_client = boto3.client("s3")
-        bucket_name = os.environ.get("ACTIVITIES_BUCKET_NAME")
-        file_key = os.environ.get("ACTIVITIES_FILE_KEY", "activities.json")
+    INIT_TIMINGS.setdefault(stage, round((time.perf_counter() - started) * 1000, 2))
 
-        response = s3_client.get_object(Bucket=bucket_name, Key=file_key)
-        activities_data = json.loads(response["Body"].read().decode("utf-8"))
 
-        logger.info(
-            f"Successfully loaded {len(activities_data['activities'])} activities from S3"
-        )
-        return activities_data
-    except Exception as e:
-        logger.error(f"Error loading activities from S3: {str(e)}")
-        # Return a minimal valid structure in case of failure
-        return {
-            "metadata": {"version": "error", "totalActivities": 0},
-            "activities": [],
-        }
+# Invocation traces: spans (milliseconds per stage), counters such as OpenAI
+# token usage and the cold/warm flag, emitted as one CloudWatch Embedded Metric
+# Format line per invocation. METRICS_SINK is "stdout" (read by CloudWatch Logs
+# in Lambda), a file path to append to, or "off".
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "ActivityChatbot")
+METRICS_SINK = os.environ.get("METRICS_SINK", "stdout")
+REQUEST_ID_HEADER = "X-Request-Id"
+
+# Trace of the invocation running on this thread (None outside invocations)
+_traces = threading.local()
+
 
+def request_id_from(event, context=None):
+    """
+    Request id shared by the functions serving one user request: the
+    X-Request-Id header sent by the frontend, else the Lambda request id
+    """
+    headers = (event or {}).get("headers") or {}
+    for name, value in headers.items():
+        if name.lower() == REQUEST_ID_HEADER.lower() and value:
+            return value[:128]
+    return getattr(context, "aws_request_id", None) or uuid.uuid4().hex
+
+
+def current_trace():
+    return getattr(_traces, "trace", None)
+
+
+def current_request_id():
+    trace = current_trace()
+    return trace["request_id"] if trace else None
 
-def load_tags_from_s3():
+
+@contextlib.contextmanager
+def span(name):
     """
-    Load tags data from S3 bucket
-    Returns the tags data as a Python dictionary
+    Time a block into the current trace (durations of repeated spans add up)
+    Does nothing outside a traced invocation
     """
+    trace = current_trace()
+    started = time.perf_counter()
     try:
-        s3_client = boto3.client("s3")
-        bucket_name = os.environ.get("TAGS_BUCKET_NAME")
-        file_key = os.environ.get("TAGS_FILE_KEY", "unique_tags.json")
+        yield
+    finally:
+        if trace is not None:
+            trace["spans"][name] = trace["spans"].get(name, 0.0) + (time.perf_counter() - started) * 1000
+
+
+def record_metric(name, value, unit="Count"):
+    """
+    Add value to a counter of the current trace
+    """
+    trace = current_trace()
+    if trace is not None:
+        total, _ = trace["metrics"].get(name, (0, unit))
+        trace["metrics"][name] = (total + value, unit)
 
-        response = s3_client.get_object(Bucket=bucket_name, Key=file_key)
-        activities_data = json.loads(response["Body"].read().decode("utf-8"))
 
-        logger.info(f"Successfully loaded {len(activities_data['tags'])} tags from S3")
-        return activities_data
+def record_usage(response):
+    """
+    Count the tokens of an OpenAI response or stream chunk (usage is None when not reported)
+    """
+    usage = getattr(response, "usage", None)
+    for field in ("prompt_tokens", "completion_tokens", "total_tokens"):
+        value = getattr(usage, field, None)
+        if value:
+            record_metric(field, value)
+    if usage is not None:
+        record_metric("llm_calls", 1)
+
+
+def emit_metrics(record):
+    """
+    Write one EMF line to METRICS_SINK
+    """
+    if METRICS_SINK == "off":
+        return
+    line = json.dumps(record, ensure_ascii=False)
+    try:
+        if METRICS_SINK == "stdout":
+            print(line, flush=True)
+        else:
+            with open(METRICS_SINK, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
     except Exception as e:
-        logger.error(f"Error loading activities from S3: {str(e)}")
-        # Return a minimal valid structure in case of failure
-        return {"metadata": {"version": "error", "totalActivities": 0}, "tags": []}
+        logger.error(f"Error writing metrics: {str(e)}")
 
 
-def get_cors_headers():
+def trace_record(trace, status_code, duration_ms):
+    """
+    EMF record of a finished trace: spans as <name>_ms metrics, dimension "function"
+    """
+    values = {f"{name}_ms": round(value, 2) for name, value in trace["spans"].items()}
+    values["duration_ms"] = round(duration_ms, 2)
+    values["cold_start"] = int(trace["cold_start"])
+    units = {name: "Milliseconds" for name in values}
+    units["cold_start"] = "Count"
+    for name, (value, unit) in trace["metrics"].items():
+        values[name] = value
+        units[name] = unit
     return {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [
+                {
+                    "Namespace": METRICS_NAMESPACE,
+                    "Dimensions": [["function"]],
+                    "Metrics": [{"Name": name, "Unit": unit} for name, unit in units.items()],
+                }
+            ],
+        },
+        "function": trace["function"],
+        "request_id": trace["request_id"],
+        "status_code": status_code,
+        **values,
+    }
+
+
+def instrument_handler(function_name):
+    """
+    Decorator for Lambda handlers: traces every invocation (request id, cold
+    start flag, spans, token usage) and emits it as EMF, writes query_log when
+    a flush is due (waiting at most QUERY_LOG_FLUSH_TIMEOUT_SECONDS) and logs
+    INIT_TIMINGS once per container, after the first invocation (so lazily
+    created clients and catalogs are included)
+    """
+
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            global _init_reported
+            started = time.perf_counter()
+            trace = {
+                "function": function_name,
+                "request_id": request_id_from(event, context),
+                "cold_start": not _init_reported,
+                "spans": {},
+                "metrics": {},
+            }
+            _traces.trace = trace
+            response = None
+            try:
+                response = handler(event, context)
+                return response
+            finally:
+                # Batched query-log write, once enough records are buffered or the oldest
+                # is old enough. It has to finish before the handler returns, when Lambda
+                # freezes the environment, but a slow write only delays the response by
+                # the timeout and completes when the environment is thawed
+                with span("query_log_flush"):
+                    query_log.flush_due(QUERY_LOG_FLUSH_TIMEOUT_SECONDS)
+                _traces.trace = None
+                status_code = response.get("statusCode") if isinstance(response, dict) else 500
+                emit_metrics(trace_record(trace, status_code, (time.perf_counter() - started) * 1000))
+                if not _init_reported:
+                    _init_reported = True
+                    record_init("first_invocation", started)
+                    logger.info(
+                        json.dumps(
+                            {
+                                "event_type": "init_report",
+                                "function": function_name,
+                                "request_id": trace["request_id"],
+                                "timings_ms": INIT_TIMINGS,
+                            }
+                        )
+                    )
+
+        return wrapper
+
+    return decorator
+
+
+# Clients are created on first use and shared by everything in the container
+_s3_client = None
+_openai_client = None
+_client_lock = threading.Lock()
+
+
+def get_s3_client():
+    """
+    Shared S3 client (boto3 is imported on first use, off the OPTIONS path)
+    """
+    global _s3_client
+    if _s3_client is None:
+        with _client_lock:
+            if _s3_client is None:
+                started = time.perf_counter()
+                import boto3
+                from botocore.config import Config
+
+                _s3_client = boto3.session.Session().client(
+                    "s3", config=Config(tcp_keepalive=True, retries={"max_attempts": 3, "mode": "standard"})
+                )
+                record_init("s3_client", started)
+    return _s3_client
+
+
+def get_openai_client():
+    """
+    Shared OpenAI client, its HTTP connection pool is reused across invocations
+    """
+    global _openai_client
+    if _openai_client is None:
+        with _client_lock:
+            if _openai_client is None:
+                started = time.perf_counter()
+                import openai
+
+                _openai_client = openai.OpenAI(
+                    base_url=os.environ.get("OPENAI_API_URL"),
+                    api_key=os.environ.get("OPENAI_API_KEY"),
+                )
+                record_init("openai_client", started)
+    return _openai_client
+
+
+# Async clients hold connections bound to an event loop, so each thread (and its loop) has its own
+_async_clients = threading.local()
+
+
+def get_async_openai_client():
+    """
+    AsyncOpenAI client of the calling thread, for pipelines that overlap model calls
+    """
+    client = getattr(_async_clients, "openai", None)
+    if client is None:
+        started = time.perf_counter()
+        import openai
+
+        client = _async_clients.openai = openai.AsyncOpenAI(
+            base_url=os.environ.get("OPENAI_API_URL"),
+            api_key=os.environ.get("OPENAI_API_KEY"),
+        )
+        record_init("async_openai_client", started)
+    return client
+
+
+# Seconds between conditional checks for a newer catalog version (spec: every 30 minutes)
+CATALOG_REFRESH_SECONDS = float(os.environ.get("CATALOG_REFRESH_SECONDS", 1800))
+# Seconds before retrying after a failed load
+CATALOG_RETRY_SECONDS = float(os.environ.get("CATALOG_RETRY_SECONDS", 30))
+
+# Minimal valid structures served until a catalog version is loaded
+EMPTY_ACTIVITIES = {"metadata": {"version": "error", "totalActivities": 0}, "activities": []}
+EMPTY_TAGS = {"metadata": {"version": "error", "totalActivities": 0}, "tags": []}
+EMPTY_LONG_DESCRIPTIONS = {"metadata": {"version": "error", "totalActivities": 0}, "long_descriptions": {}}
+
+
+def parse_json(raw):
+    return json.loads(raw.decode("utf-8"))
+
+
+class CatalogLoader:
+    """
+    Catalog stored in S3, reloaded when a new version is published
+
+    get() returns build(parse(raw object)) for the current version. At most
+    every refresh_seconds it issues a conditional get_object (IfNoneMatch on
+    the stored ETag), so an unchanged catalog costs a 304 and nothing else. A
+    new version is parsed and built off to the side and swapped in with a
+    single assignment. A failed load keeps the last good version (or
+    build(empty) when none was loaded yet) and is retried after retry_seconds.
+
+    When fallback_key is set, file_key is preferred and fallback_key is loaded
+    while file_key is missing or unusable. With parse=None, build receives the
+    raw bytes. Callbacks registered with on_reload are called with the new
+    version after every swap, to drop anything derived from the previous one.
+    """
+
+    def __init__(
+        self,
+        bucket_name,
+        file_key,
+        empty,
+        build=None,
+        fallback_key=None,
+        parse=parse_json,
+        refresh_seconds=CATALOG_REFRESH_SECONDS,
+        retry_seconds=CATALOG_RETRY_SECONDS,
+        s3_client=None,
+    ):
+        self.bucket_name = bucket_name
+        self.file_key = file_key
+        self.fallback_key = fallback_key
+        self.refresh_seconds = refresh_seconds
+        self.retry_seconds = retry_seconds
+        self._build = build or (lambda data: data)
+        self._parse = parse
+        self._empty = empty
+        self._empty_value = None
+        self._s3_client = s3_client
+        self._current = None  # (key, etag, built value)
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self._reload_callbacks = []
+
+    @property
+    def version(self):
+        """
+        ETag of the loaded version, None until the first successful load
+        """
+        return self._current[1].strip('"') if self._current else None
+
+    @property
+    def loaded_key(self):
+        return self._current[0] if self._current else None
+
+    def on_reload(self, callback):
+        """
+        Call callback(version) whenever a new version is swapped in
+        """
+        self._reload_callbacks.append(callback)
+
+    def get(self):
+        if time.monotonic() >= self._next_check:
+            self.refresh()
+        if self._current is not None:
+            return self._current[2]
+        if self._empty_value is None:
+            self._empty_value = self._build(self._empty)
+        return self._empty_value
+
+    def refresh(self):
+        """
+        Check S3 for a new version now, returns True when a new version was swapped in
+        """
+        # Another thread is already refreshing, keep serving the current version
+        if not self._lock.acquire(blocking=False):
+            return False
+        try:
+            return self._refresh()
+        finally:
+            self._lock.release()
+
+    def _refresh(self):
+        keys = [self.file_key] + ([self.fallback_key] if self.fallback_key else [])
+        for key in keys:
+            request = {"Bucket": self.bucket_name, "Key": key}
+            if self._current is not None and self._current[0] == key:
+                request["IfNoneMatch"] = self._current[1]
+            started = time.perf_counter()
+            try:
+                s3_client = self._s3_client or get_s3_client()
+                with span("s3_load"):
+                    response = s3_client.get_object(**request)
+                    raw = response["Body"].read()
+                with span("catalog_build"):
+                    value = self._build(self._parse(raw) if self._parse else raw)
+            except Exception as e:
+                # botocore ClientError, checked by shape so botocore is not imported here
+                error = getattr(e, "response", None)
+                code = error.get("Error", {}).get("Code") if isinstance(error, dict) else None
+                if code in ("304", "NotModified"):
+                    self._next_check = time.monotonic() + self.refresh_seconds
+                    return False
+                if key != keys[-1]:
+                    logger.warning(f"Cannot use s3://{self.bucket_name}/{key}, falling back: {str(e)}")
+                    continue
+                return self._failed(key, e)
+
+            self._current = (key, response.get("ETag", ""), value)
+            self._next_check = time.monotonic() + self.refresh_seconds
+            record_init(f"catalog:{key}", started)
+            logger.info(f"Loaded s3://{self.bucket_name}/{key} version {self.version}")
+            for callback in self._reload_callbacks:
+                try:
+                    callback(self.version)
+                except Exception as e:
+                    logger.error(f"Error in reload callback for s3://{self.bucket_name}/{key}: {str(e)}")
+            return True
+
+    def _failed(self, key, error):
+        state = f"keeping version {self.version}" if self._current else "no version loaded yet"
+        logger.error(f"Error loading s3://{self.bucket_name}/{key} ({state}): {str(error)}")
+        self._next_check = time.monotonic() + self.retry_seconds
+        return False
+
+
+def create_activities_catalog(build=None, prefer_snapshot=False):
+    """
+    Catalog loader for the activities file configured in the environment
+    With prefer_snapshot, the binary snapshot is loaded when it exists (build
+    receives raw bytes for either file)
+    """
+    bucket_name = os.environ.get("ACTIVITIES_BUCKET_NAME")
+    file_key = os.environ.get("ACTIVITIES_FILE_KEY", "activities.json")
+    if prefer_snapshot:
+        return CatalogLoader(
+            bucket_name,
+            os.environ.get("ACTIVITIES_SNAPSHOT_KEY", "activities.snapshot"),
+            EMPTY_ACTIVITIES,
+            build=build,
+            fallback_key=file_key,
+            parse=None,
+        )
+    return CatalogLoader(bucket_name, file_key, EMPTY_ACTIVITIES, build=build)
+
+
+def create_long_descriptions_catalog(build=None):
+    """
+    Catalog loader for the long-description store (activity id -> long_description)
+    published next to slim activity catalogs; nothing is loaded before the first get()
+    """
+    return CatalogLoader(
+        os.environ.get("ACTIVITIES_BUCKET_NAME"),
+        os.environ.get("ACTIVITIES_LONG_KEY", "activities_long.json"),
+        EMPTY_LONG_DESCRIPTIONS,
+        build=build,
+    )
+
+
+def create_tags_catalog(build=None):
+    """
+    Catalog loader for the unique tags file configured in the environment
+    """
+    return CatalogLoader(
+        os.environ.get("TAGS_BUCKET_NAME"),
+        os.environ.get("TAGS_FILE_KEY", "unique_tags.json"),
+        EMPTY_TAGS,
+        build=build,
+    )
+
+
+class ResultCache:
+    """
+    Two-level cache for expensive results (e.g. model calls)
+
+    - in-process LRU with TTL, shared by the invocations of a warm container
+    - optional persistent tier shared by all containers: "s3://bucket/prefix"
+      or a local directory, one JSON object per entry
+
+    Keys are hashed, callers put everything the value depends on (such as a
+    catalog version) into the key, so stale entries are simply never hit
+    again. Persistent tier errors are logged and treated as misses.
+    """
+
+    def __init__(self, name, max_entries=1024, ttl_seconds=86400, location=None, max_bytes=None):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.location = location or None
+        # Counters plus the current in-process size, for tuning capacity
+        self.stats = {"memory_hits": 0, "persistent_hits": 0, "misses": 0, "entries": 0, "bytes": 0}
+        self._entries = OrderedDict()  # hashed key -> (expires at, value, encoded size)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(*parts):
+        return hashlib.sha256("\n".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """
+        Returns (value, tier) where tier is "memory", "persistent" or "miss"
+        """
+        hashed = self.make_key(key)
+        with self._lock:
+            entry = self._entries.get(hashed)
+            if entry is not None and entry[0] > time.time():
+                self._entries.move_to_end(hashed)
+                self.stats["memory_hits"] += 1
+                return entry[1], "memory"
+
+        stored = self._read_persistent(hashed)
+        if stored is not None and stored.get("expires_at", 0) > time.time():
+            self._remember(hashed, stored["expires_at"], stored["value"])
+            self.stats["persistent_hits"] += 1
+            return stored["value"], "persistent"
+
+        self.stats["misses"] += 1
+        return None, "miss"
+
+    def put(self, key, value):
+        hashed = self.make_key(key)
+        expires_at = time.time() + self.ttl_seconds
+        self._remember(hashed, expires_at, value)
+        self._write_persistent(hashed, {"expires_at": expires_at, "value": value})
+
+    def clear(self):
+        """
+        Drop the in-process entries (the persistent tier is left as is)
+        """
+        with self._lock:
+            self._entries.clear()
+            self.stats.update(entries=0, bytes=0)
+
+    def _remember(self, hashed, expires_at, value):
+        size = len(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+        with self._lock:
+            previous = self._entries.pop(hashed, None)
+            if previous is not None:
+                self.stats["bytes"] -= previous[2]
+            self._entries[hashed] = (expires_at, value, size)
+            self.stats["bytes"] += size
+            while len(self._entries) > self.max_entries or (
+                self.max_bytes is not None and self.stats["bytes"] > self.max_bytes and len(self._entries) > 1
+            ):
+                self.stats["bytes"] -= self._entries.popitem(last=False)[1][2]
+            self.stats["entries"] = len(self._entries)
+
+    def _persistent_path(self, hashed):
+        if self.location.startswith("s3://"):
+            bucket, _, prefix = self.location[len("s3://") :].partition("/")
+            return bucket, "/".join(part for part in (prefix.strip("/"), self.name, f"{hashed}.json") if part)
+        return None, os.path.join(self.location, self.name, f"{hashed}.json")
+
+    def _read_persistent(self, hashed):
+        if not self.location:
+            return None
+        bucket, path = self._persistent_path(hashed)
+        try:
+            if bucket:
+                raw = get_s3_client().get_object(Bucket=bucket, Key=path)["Body"].read()
+            else:
+                with open(path, "rb") as f:
+                    raw = f.read()
+            return json.loads(raw.decode("utf-8"))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            error = getattr(e, "response", None)
+            if isinstance(error, dict) and error.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                return None
+            logger.warning(f"Error reading {self.name} cache entry {path}: {str(e)}")
+            return None
+
+    def _write_persistent(self, hashed, entry):
+        if not self.location:
+            return
+        bucket, path = self._persistent_path(hashed)
+        raw = json.dumps(entry, ensure_ascii=False).encode("utf-8")
+        try:
+            if bucket:
+                get_s3_client().put_object(Bucket=bucket, Key=path, Body=raw, ContentType="application/json")
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                temporary = f"{path}.{os.getpid()}.tmp"
+                with open(temporary, "wb") as f:
+                    f.write(raw)
+                os.replace(temporary, path)
+        except Exception as e:
+            logger.warning(f"Error writing {self.name} cache entry {path}: {str(e)}")
+
+
+class QueryLogSink:
+    """
+    Buffered, sampled query log ("for future model training")
+
+    add() keeps a sampled share of the records (sampling is per request id, so
+    the functions serving one request keep or drop it together) as encoded
+    JSON lines in memory and never does I/O; when the buffer is full, records
+    are dropped and counted. flush() writes the buffer as one gzip-compressed
+    JSONL object under location ("s3://bucket/prefix" or a local directory),
+    partitioned by date. Handlers call flush_due() at the end of each
+    invocation, which writes once max_bytes or max_records are buffered or the
+    oldest record is max_age_seconds old, on a thread the handler waits for
+    with a timeout. A failed write drops its batch; records that are not due
+    yet when an execution environment is shut down are lost, max_age_seconds
+    bounds how many.
+    """
+
+    def __init__(
+        self,
+        name,
+        location=None,
+        sample_rate=1.0,
+        max_bytes=256 * 1024,
+        max_age_seconds=60,
+        max_records=5000,
+    ):
+        self.name = name
+        self.location = location or None
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.max_records = max_records
+        self.stats = {"buffered": 0, "sampled_out": 0, "dropped": 0, "written": 0, "batches": 0}
+        self._lines = []
+        self._bytes = 0
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._flusher = None
+
+    def sampled(self, request_id=None):
+        if self.sample_rate >= 1:
+            return True
+        if request_id:
+            bucket = int(hashlib.sha256(str(request_id).encode("utf-8")).hexdigest()[:8], 16)
+            return bucket / 0xFFFFFFFF < self.sample_rate
+        return random.random() < self.sample_rate
+
+    def add(self, record, request_id=None):
+        """
+        Buffer a record, returns False when it was sampled out or dropped
+        """
+        if not self.location:
+            return False
+        if not self.sampled(request_id):
+            self.stats["sampled_out"] += 1
+            return False
+        line = json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n"
+        with self._lock:
+            if len(self._lines) >= self.max_records:
+                self.stats["dropped"] += 1
+                return False
+            self._lines.append(line)
+            self._bytes += len(line)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            self.stats["buffered"] = len(self._lines)
+        return True
+
+    def due(self):
+        with self._lock:
+            return self._due()
+
+    def _due(self):
+        # Callers hold self._lock
+        return bool(self._lines) and (
+            self._bytes >= self.max_bytes
+            or len(self._lines) >= self.max_records
+            or time.monotonic() - self._oldest >= self.max_age_seconds
+        )
+
+    def flush_due(self, timeout=None):
+        """
+        Write the buffer if a flush is due, waiting at most timeout seconds for
+        the write (it carries on in the background after that)
+        """
+        flusher = self.flush_in_background()
+        if flusher is not None:
+            flusher.join(timeout)
+
+    def flush_in_background(self):
+        """
+        Start a due flush on a daemon thread, at most one at a time, returns the
+        thread or None. In Lambda the thread is frozen with the execution
+        environment once the response is returned, see flush_due.
+        """
+        with self._lock:
+            if not self._due() or (self._flusher is not None and self._flusher.is_alive()):
+                return None
+            self._flusher = threading.Thread(
+                target=self.flush, kwargs={"due_only": True}, name=f"{self.name}-flush", daemon=True
+            )
+            self._flusher.start()
+            return self._flusher
+
+    def flush(self, due_only=False):
+        """
+        Write the buffered records as one object, returns the number written
+        """
+        with self._lock:
+            if not self._lines or (due_only and not self._due()):
+                return 0
+            lines, self._lines, self._bytes, self._oldest = self._lines, [], 0, None
+            self.stats["buffered"] = 0
+
+        body = gzip.compress(b"".join(lines))
+        now = time.gmtime()
+        name = f"{time.strftime('%Y%m%dT%H%M%SZ', now)}-{uuid.uuid4().hex[:12]}.jsonl.gz"
+        partition = f"dt={time.strftime('%Y-%m-%d', now)}"
+        try:
+            if self.location.startswith("s3://"):
+                bucket, _, prefix = self.location[len("s3://") :].partition("/")
+                key = "/".join(part for part in (prefix.strip("/"), self.name, partition, name) if part)
+                get_s3_client().put_object(
+                    Bucket=bucket, Key=key, Body=body, ContentType="application/x-ndjson", ContentEncoding="gzip"
+                )
+            else:
+                directory = os.path.join(self.location, self.name, partition)
+                os.makedirs(directory, exist_ok=True)
+                with open(os.path.join(directory, name), "wb") as f:
+                    f.write(body)
+        except Exception as e:
+            self.stats["dropped"] += len(lines)
+            logger.error(f"Error writing {len(lines)} {self.name} records: {str(e)}")
+            return 0
+        self.stats["written"] += len(lines)
+        self.stats["batches"] += 1
+        return len(lines)
+
+
+# Seconds a handler waits for a due query-log write before returning its response
+QUERY_LOG_FLUSH_TIMEOUT_SECONDS = float(os.environ.get("QUERY_LOG_FLUSH_TIMEOUT_SECONDS", 1.0))
+
+# Query log shared by the handlers of a container, see log_query
+query_log = QueryLogSink(
+    "query-log",
+    location=os.environ.get("QUERY_LOG_LOCATION"),
+    sample_rate=float(os.environ.get("QUERY_LOG_SAMPLE_RATE", 1.0)),
+    max_bytes=int(os.environ.get("QUERY_LOG_MAX_BYTES", 256 * 1024)),
+    max_age_seconds=float(os.environ.get("QUERY_LOG_MAX_AGE_SECONDS", 60)),
+)
+
+
+def fold_text(text):
+    """
+    Normalize text for matching: strip diacritics, lowercase, collapse whitespace
+    """
+    return " ".join(unidecode(str(text)).lower().split())
+
+
+# Czech case and number endings (diacritics folded), longest first
+CZECH_SUFFIXES = sorted(
+    [
+        "ech", "ich", "ych", "ami", "emi", "imi", "ymi", "ovi", "ove", "ach", "aty", "ata",
+        "eho", "iho", "emu", "imu",
+        "ou", "em", "ho", "mu", "um", "ym", "im", "ej", "es", "ie",
+        "a", "e", "i", "o", "u", "y",
+    ],
+    key=len,
+    reverse=True,
+)
+
+
+def stem_token(token):
+    """
+    Light stemmer for a folded Czech word: drops one case/number ending,
+    keeping at least 3 characters (enough to conflate "soutez", "souteze", "soutezi")
+    """
+    for suffix in CZECH_SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            return token[: -len(suffix)]
+    return token
+
+
+def tokenize(text):
+    """
+    Folded alphanumeric words of a text
+    """
+    return "".join(c if c.isalnum() else " " for c in fold_text(text)).split()
+
+
+def get_cors_headers():
+    headers = {
         "Access-Control-Allow-Origin": "*",
-        "Access-Control-Allow-Headers": "Content-Type, Authorization, X-Amz-Date, X-Api-Key, X-Amz-Security-Token",
+        "Access-Control-Allow-Headers": "Content-Type, Authorization, X-Amz-Date, X-Api-Key, X-Amz-Security-Token, X-Request-Id",
         "Access-Control-Allow-Methods": "POST, OPTIONS, GET",
         "Access-Control-Max-Age": "300"
     }
+    # Echo the request id so clients can find the traces of a response
+    request_id = current_request_id()
+    if request_id:
+        headers[REQUEST_ID_HEADER] = request_id
+    return headers
 
 
 def handle_options():
     return {"statusCode": 200, "headers": get_cors_headers(), "body": ""}
 
 
-def build_api_response(status_code, body):
+# Responses smaller than this are not worth compressing
+GZIP_MIN_BYTES = 1024
+
+
+def accepts_gzip(event):
+    """
+    Check the Accept-Encoding header of an API Gateway event (header names may be any case)
+    """
+    headers = (event or {}).get("headers") or {}
+    for name, value in headers.items():
+        if name.lower() == "accept-encoding" and "gzip" in (value or "").lower():
+            return True
+    return False
+
+
+def build_json_body(body, key, fragments):
+    """
+    Encode body as JSON with body[key] set to an array joined from pre-encoded JSON fragments
+    """
+    with span("serialization"):
+        array = b"[" + b",".join(fragments) + b"]"
+        head = json.dumps({name: value for name, value in body.items() if name != key})
+        separator = b", " if len(head) > 2 else b""
+        return head[:-1].encode("utf-8") + separator + json.dumps(key).encode("utf-8") + b": " + array + b"}"
+
+
+def build_api_response(status_code, body, event=None):
     """
     Helper function to build a properly formatted API Gateway response
+    body is a JSON-serializable object or already encoded JSON bytes. When the
+    request event accepts gzip, larger bodies are returned gzip-compressed and
+    base64-encoded (API Gateway binary response).
     """
-    return {
-        "statusCode": status_code,
-        "headers": get_cors_headers(),
-        "body": json.dumps(body),
-    }
+    with span("serialization"):
+        payload = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+        headers = get_cors_headers()
 
+        if accepts_gzip(event) and len(payload) >= GZIP_MIN_BYTES:
+            return {
+                "statusCode": status_code,
+                "headers": {
+                    **headers,
+                    "Content-Type": "application/json",
+                    "Content-Encoding": "gzip",
+                    "Vary": "Accept-Encoding",
+                },
+                "body": base64.b64encode(gzip.compress(payload, mtime=0)).decode("ascii"),
+                "isBase64Encoded": True,
+            }
+        return {
+            "statusCode": status_code,
+            "headers": headers,
+            "body": payload.decode("utf-8"),
+        }
 
-def log_query(query, extracted_tags, results_count):
+
+def sse_event(event, data):
+    """
+    Encode one server-sent event with a JSON payload
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def log_query(query, extracted_tags, results_count, extra=None):
     """
-    Log search query for analytics
+    Log search query for analytics, extra fields (e.g. cache statistics) are merged in
+    Records go to query_log when QUERY_LOG_LOCATION is set, to the log otherwise
     """
     try:
-        logger.info(
-            json.dumps(
-                {
-                    "event_type": "search_query",
-                    "query": query,
-                    "extracted_tags": extracted_tags,
-                    "results_count": results_count,
-                }
-            )
-        )
+        trace = current_trace()
+        record = {
+            "event_type": "search_query",
+            "timestamp": round(time.time(), 3),
+            "function": trace["function"] if trace else None,
+            "request_id": trace["request_id"] if trace else None,
+            "query": query,
+            "extracted_tags": extracted_tags,
+            "results_count": results_count,
+            **(extra or {}),
+        }
+        if query_log.location:
+            query_log.add(record, record["request_id"])
+        else:
+            logger.info(json.dumps(record))
     except Exception as e:
         logger.error(f"Error logging query: {str(e)}")
@@ -1,14 +1,15 @@
 import os
 import json
 import logging
-import importlib.util
-import sys
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 import boto3
 from dotenv import load_dotenv
 import glob
 
+from chat_pipeline import load_stage, answer_chat, chat_pipeline_events
+from utils import query_log
+
 # Load environment variables from .env file if present
 load_dotenv()
 
@@ -33,27 +34,29 @@ s3_client = boto3.client(
     region_name=os.environ.get('AWS_REGION', 'us-east-1'),
 )
 
-# Function to import a lambda function from a file path
-def import_lambda_function(function_path):
-    """Import a lambda function from a file path"""
-    module_name = os.path.basename(function_path).replace('.py', '')
-    spec = importlib.util.spec_from_file_location(module_name, function_path) 
-    module = importlib.util.module_from_spec(spec)
-    sys.modules[module_name] = module
-    spec.loader.exec_module(module)
-    return module.lambda_handler
+# Lambda modules are loaded once per server process (the reloader restarts it on code changes),
+# so catalogs, indexes, caches and clients are shared across requests like in a warm Lambda
+def import_lambda_function(stage):
+    """Lambda handler of a stage (query_processor, search_engine, result_enhancer)"""
+    return load_stage(stage).lambda_handler
+
+def lambda_event():
+    """
+    Lambda-like event of the current request; Accept-Encoding is dropped so the
+    handlers return plain JSON bodies (Flask re-encodes them with jsonify)
+    """
+    headers = {name: value for name, value in request.headers.items() if name.lower() != 'accept-encoding'}
+    return {'body': json.dumps(request.json), 'headers': headers}
 
 @app.route('/process-query', methods=['POST'])
 def process_query():
     """Process a user query through the query processor Lambda"""
     try:
-        # Dynamically import the lambda function
-        query_processor = import_lambda_function('/app/backend/functions/query_processor/lambda_function.py')
+        # Get the (once loaded) lambda function
+        query_processor = import_lambda_function('query_processor')
         
         # Create a Lambda-like event object
-        event = {
-            'body': json.dumps(request.json)
-        }
+        event = lambda_event()
         
         # Call the query processor Lambda
         response = query_processor(event, {})
@@ -69,13 +72,11 @@ def process_query():
 def search_activities():
     """Search for activities using the search engine Lambda"""
     try:
-        # Dynamically import the lambda function
-        search_engine = import_lambda_function('/app/backend/functions/search_engine/lambda_function.py')
+        # Get the (once loaded) lambda function
+        search_engine = import_lambda_function('search_engine')
         
         # Create a Lambda-like event object
-        event = {
-            'body': json.dumps(request.json)
-        }
+        event = lambda_event()
         
         # Call the search engine Lambda
         response = search_engine(event, {})
@@ -91,13 +92,25 @@ def search_activities():
 def enhance_results():
     """Enhance search results using the result enhancer Lambda"""
     try:
-        # Dynamically import the lambda function
-        result_enhancer = import_lambda_function('/app/backend/functions/result_enhancer/lambda_function.py')
+        # Stream server-sent events when asked to (results first, then the answer as it is generated)
+        data = request.json or {}
+        if data.get('stream') or 'text/event-stream' in request.headers.get('Accept', ''):
+            if not data.get('query'):
+                return jsonify({'error': 'No query provided'}), 400
+            events = load_stage('result_enhancer').stream_events(
+                data['query'], data.get('results', []), data.get('catalog_version')
+            )
+            return Response(
+                stream_with_context(events),
+                mimetype='text/event-stream',
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+            )
+
+        # Get the (once loaded) lambda function
+        result_enhancer = import_lambda_function('result_enhancer')
         
         # Create a Lambda-like event object
-        event = {
-            'body': json.dumps(request.json)
-        }
+        event = lambda_event()
         
         # Call the result enhancer Lambda
         response = result_enhancer(event, {})
@@ -109,58 +122,45 @@ def enhance_results():
         logger.error(f"Error enhancing results: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/chat', methods=['POST'])
 @app.route('/api/chat', methods=['POST'])
 def chat():
     """
-    Combined endpoint that handles the full chat flow:
+    Combined endpoint that handles the full chat flow in-process:
     1. Process the query to extract keywords
     2. Search for activities based on keywords
     3. Enhance the results with conversational responses
+    Streams server-sent events when asked to (stream: true or Accept: text/event-stream)
     """
     try:
-        # Dynamically import all lambda functions
-        query_processor = import_lambda_function('functions/query_processor/lambda_function.py')
-        search_engine = import_lambda_function('functions/search_engine/lambda_function.py')
-        result_enhancer = import_lambda_function('functions/result_enhancer/lambda_function.py')
-        
-        # Get the query from the request
-        data = request.json
+        data = request.json or {}
         query = data.get('query', '')
         
-        if not query:
+        if not isinstance(query, str) or not query.strip():
             return jsonify({'error': 'No query provided'}), 400
-        
-        # Step 1: Process the query
-        query_event = {'body': json.dumps({'query': query})}
-        query_response = query_processor(query_event, {})
-        query_result = json.loads(query_response.get('body', '{}'))
-        
-        # Extract the keywords
-        keywords = query_result.get('extracted_tags', [])
-        
-        # Step 2: Search for activities
-        search_event = {'body': json.dumps({'keywords': keywords})}
-        search_response = search_engine(search_event, {})
-        search_result = json.loads(search_response.get('body', '{}'))
-        
-        # Get the activities
-        activities = search_result.get('activities', [])
-        
-        # Step 3: Enhance the results
-        enhance_event = {'body': json.dumps({'query': query, 'activities': activities})}
-        enhance_response = result_enhancer(enhance_event, {})
-        enhance_result = json.loads(enhance_response.get('body', '{}'))
-        
-        # Return the final response
-        return jsonify({
-            'query': query,
-            'keywords': keywords,
-            'results': enhance_result.get('enhanced_results', [])
-        })
+
+        arguments = (query, data.get('max_results', 3), data.get('mode', 'boolean'), data.get('filters') or {})
+        # Same checks as the chat Lambda
+        error = load_stage('search_engine').validate_search([], 'all', arguments[2], arguments[3], query, arguments[1])
+        if error:
+            return jsonify({'error': error}), 400
+        if data.get('stream') or 'text/event-stream' in request.headers.get('Accept', ''):
+            return Response(
+                stream_with_context(chat_pipeline_events(*arguments)),
+                mimetype='text/event-stream',
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+            )
+        return jsonify(answer_chat(*arguments))
     except Exception as e:
         logger.error(f"Error processing chat: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.after_request
+def flush_query_log(response):
+    """Write buffered query-log records once due, off the response path (the chat routes bypass the Lambda handlers)"""
+    query_log.flush_in_background()
+    return response
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -0,0 +1,66 @@
+"""
+Exercise utils.CatalogLoader hot reload against the local MinIO from docker-compose.yml
+
+    docker compose up -d minio minio-setup
+    PYTHONPATH=backend/functions uv run python backend/local-dev/check_catalog_reload.py
+"""
+import os
+import json
+import logging
+
+import boto3
+
+from utils import CatalogLoader, EMPTY_ACTIVITIES
+
+logging.basicConfig(level=logging.INFO)
+
+BUCKET = os.environ.get("ACTIVITIES_BUCKET_NAME", "activities")
+KEY = "catalog-reload-check.json"
+
+s3_client = boto3.client(
+    "s3",
+    endpoint_url=os.environ.get("AWS_ENDPOINT_URL", "http://localhost:9990"),
+    aws_access_key_id=os.environ.get("AWS_ACCESS_KEY_ID", "minioadmin"),
+    aws_secret_access_key=os.environ.get("AWS_SECRET_ACCESS_KEY", "minioadmin"),
+    region_name=os.environ.get("AWS_REGION", "us-east-1"),
+)
+
+
+def publish(activities_count):
+    activities = [{"id": i, "title": f"Activity {i}", "tags": ["test"]} for i in range(activities_count)]
+    body = {"metadata": {"version": str(activities_count)}, "activities": activities}
+    s3_client.put_object(Bucket=BUCKET, Key=KEY, Body=json.dumps(body).encode("utf-8"))
+
+
+def main():
+    loader = CatalogLoader(
+        BUCKET,
+        KEY,
+        EMPTY_ACTIVITIES,
+        build=lambda data: len(data["activities"]),
+        refresh_seconds=0,
+        retry_seconds=0,
+        s3_client=s3_client,
+    )
+
+    s3_client.delete_object(Bucket=BUCKET, Key=KEY)
+    assert loader.get() == 0 and loader.version is None, "missing object must serve the empty stub"
+
+    publish(2)
+    assert loader.get() == 2, "first version must be loaded after the failed attempt"
+    first_version = loader.version
+
+    assert not loader.refresh(), "unchanged object must answer 304 Not Modified"
+    assert loader.version == first_version
+
+    publish(3)
+    assert loader.get() == 3 and loader.version != first_version, "new version must be swapped in"
+
+    s3_client.delete_object(Bucket=BUCKET, Key=KEY)
+    assert loader.get() == 3, "failed reload must keep the last good version"
+
+    print("Catalog reload check passed")
+
+
+if __name__ == "__main__":
+    main()
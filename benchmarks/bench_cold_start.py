@@ -0,0 +1,66 @@
+"""
+Compare search_engine cold-start paths: activities.json (parse + build) vs binary snapshot
+
+    PYTHONPATH=backend/functions python benchmarks/bench_cold_start.py --sizes 400 10000 100000
+"""
+import sys
+import json
+import time
+import argparse
+import importlib.util
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "backend" / "functions"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from catalog_snapshot import build_snapshot  # noqa: E402
+from synthetic_catalog import generate_catalog  # noqa: E402
+
+
+def load_search_engine():
+    path = ROOT / "backend" / "functions" / "search_engine" / "lambda_function.py"
+    spec = importlib.util.spec_from_file_location("search_engine_lambda", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def best_of(repeat, function, *args):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[400, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    search_engine = load_search_engine()
+    results = []
+    for size in args.sizes:
+        catalog = generate_catalog(size)
+        json_bytes = json.dumps(catalog, ensure_ascii=False).encode("utf-8")
+        snapshot = build_snapshot(catalog["activities"], catalog["metadata"], catalog["icons"])
+        json_seconds = best_of(args.repeat, search_engine.initialize_cache, json_bytes)
+        snapshot_seconds = best_of(args.repeat, search_engine.initialize_cache, snapshot)
+        results.append(
+            {
+                "activities": size,
+                "json_bytes": len(json_bytes),
+                "snapshot_bytes": len(snapshot),
+                "json_init_ms": round(json_seconds * 1000, 2),
+                "snapshot_init_ms": round(snapshot_seconds * 1000, 2),
+                "speedup": round(json_seconds / snapshot_seconds, 1),
+            }
+        )
+    print(json.dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    main()
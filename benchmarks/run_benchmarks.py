@@ -0,0 +1,166 @@
+"""
+Microbenchmarks of the search Lambda and the data pipeline on synthetic catalogs
+
+Times initialize_cache (activities.json and snapshot), search_activities over
+several query shapes, full-text searches (find_activities with text), response serialization (build_json_body +
+build_api_response, plain and gzip) and get_data_json.process_rows. Prints
+JSON; with --check, every benchmark listed in thresholds.json must have a
+median at or below its limit (milliseconds), otherwise the exit code is 1.
+
+    python benchmarks/run_benchmarks.py --sizes 400 10000 --check
+    python benchmarks/run_benchmarks.py --sizes 200000 --only search --output results.json
+"""
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "backend" / "functions"))
+sys.path.insert(0, str(ROOT / "data"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from utils import build_api_response, build_json_body  # noqa: E402
+from catalog_snapshot import build_snapshot  # noqa: E402
+from get_data_json import process_rows  # noqa: E402
+from bench_cold_start import load_search_engine  # noqa: E402
+from synthetic_catalog import LOCATIONS, TAGS, generate_catalog, generate_rows  # noqa: E402
+
+THRESHOLDS_PATH = Path(__file__).resolve().parent / "thresholds.json"
+
+# Query shapes: search_activities keyword arguments
+QUERY_SHAPES = {
+    "single_tag": {"tags": [TAGS[0]]},
+    "two_tags_all": {"tags": [TAGS[1], TAGS[3]], "match": "all"},
+    "three_tags_any": {"tags": TAGS[4:7], "match": "any", "max_results": 10},
+    "exclude": {"tags": TAGS[:2], "match": "any", "exclude_tags": [TAGS[2]]},
+    "filters": {"tags": TAGS[5:7], "match": "any", "filters": {"location": [LOCATIONS[0]]}},
+    "location_boost": {"tags": [TAGS[6], "praha"], "match": "any"},
+    "unknown_tag": {"tags": ["neexistující štítek"]},
+}
+
+# Full-text query shapes: find_activities keyword arguments
+TEXT_SHAPES = {
+    "text_rare": {"tags": [], "text": "olympiáda umělé inteligence", "max_results": 10},
+    "text_common": {"tags": [], "text": "program pro studenty online", "max_results": 10},
+    "text_with_tags": {"tags": TAGS[4:6], "match": "any", "text": "letní škola podnikání", "max_results": 10},
+}
+
+GZIP_EVENT = {"headers": {"Accept-Encoding": "gzip"}}
+
+
+def measure(function, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        "repeat": repeat,
+        "min_ms": round(timings[0], 4),
+        "median_ms": round(statistics.median(timings), 4),
+        "p95_ms": round(timings[min(int(len(timings) * 0.95), len(timings) - 1)], 4),
+    }
+
+
+def bench_size(search_engine, size: int, repeat: int, only: list[str] | None):
+    """
+    Yield (name, measurement) for every benchmark on a catalog of size activities
+    """
+    def enabled(group):
+        return not only or group in only
+
+    catalog = generate_catalog(size)
+    json_bytes = json.dumps(catalog, ensure_ascii=False).encode("utf-8")
+    snapshot = build_snapshot(catalog["activities"], catalog["metadata"], catalog["icons"])
+    # Building is the slow part, fewer repeats keep large sizes practical
+    init_repeat = max(1, min(repeat, 200_000 // size))
+
+    if enabled("init"):
+        yield "init/json", measure(lambda: search_engine.initialize_cache(json_bytes), init_repeat)
+        yield "init/snapshot", measure(lambda: search_engine.initialize_cache(snapshot), init_repeat)
+
+    activity_store, search_index = search_engine.initialize_cache(snapshot)
+    if enabled("search"):
+        for shape, arguments in QUERY_SHAPES.items():
+            yield f"search/{shape}", measure(
+                lambda: search_engine.search_activities(activity_store, search_index, **arguments),
+                repeat,
+            )
+
+    if enabled("text"):
+        for shape, arguments in TEXT_SHAPES.items():
+            yield f"search/{shape}", measure(
+                lambda: search_engine.find_activities(search_index, **arguments), repeat
+            )
+
+    if enabled("response"):
+        for count in (10, 100):
+            fragments = [activity_store.fragment(idx) for idx in range(min(count, size))]
+            head = {"query": "stáž v zahraničí", "count": len(fragments)}
+            yield f"response/json_{count}", measure(
+                lambda: build_api_response(200, build_json_body(head, "results", fragments)), repeat
+            )
+            yield f"response/gzip_{count}", measure(
+                lambda: build_api_response(200, build_json_body(head, "results", fragments), GZIP_EVENT),
+                repeat,
+            )
+
+    if enabled("process_rows"):
+        rows = generate_rows(size)
+        yield "process_rows", measure(lambda: process_rows(rows), init_repeat)
+
+
+def check_thresholds(results: list[dict], thresholds: dict) -> list[dict]:
+    """
+    Benchmarks whose median exceeds their threshold
+    """
+    regressions = []
+    for result in results:
+        limit = thresholds.get(f"{result['name']}/{result['size']}")
+        if limit is not None and result["median_ms"] > limit:
+            regressions.append(
+                {"name": result["name"], "size": result["size"], "median_ms": result["median_ms"], "limit_ms": limit}
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[400, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--only", nargs="+", choices=["init", "search", "text", "response", "process_rows"])
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    parser.add_argument("--thresholds", default=str(THRESHOLDS_PATH))
+    parser.add_argument("--check", action="store_true", help="Exit with 1 when a threshold is exceeded")
+    args = parser.parse_args()
+
+    search_engine = load_search_engine()
+    results = []
+    for size in args.sizes:
+        for name, measurement in bench_size(search_engine, size, args.repeat, args.only):
+            results.append({"name": name, "size": size, **measurement})
+            print(f"{name}/{size}: {measurement['median_ms']} ms", file=sys.stderr)
+
+    with open(args.thresholds, encoding="utf-8") as f:
+        thresholds = json.load(f)
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+        "regressions": check_thresholds(results, thresholds),
+    }
+    output = json.dumps(report, ensure_ascii=False, indent=4)
+    print(output)
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+    if args.check and report["regressions"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
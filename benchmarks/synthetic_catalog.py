@@ -0,0 +1,171 @@
+"""
+Seeded generator of synthetic activity catalogs for benchmarks
+
+The vocabulary (tags, locations, education levels) is read from the frontend's
+unique_tags.json. Frequencies follow a Zipf-like law over a seeded ordering of
+each vocabulary, so a few tags / regions dominate like in the real catalog, and
+activities carry 1-3 tags, mostly one location and one or two education levels.
+Titles and descriptions are assembled from Czech phrases so text-heavy paths
+(JSON encoding, diacritics folding, gzip) see realistic input.
+
+    python benchmarks/synthetic_catalog.py 10000 > /tmp/activities.json
+"""
+import json
+import random
+import argparse
+from pathlib import Path
+
+UNIQUE_TAGS_PATH = Path(__file__).resolve().parent.parent / "frontend" / "public" / "data" / "unique_tags.json"
+
+with open(UNIQUE_TAGS_PATH, encoding="utf-8") as f:
+    _vocabulary = json.load(f)
+
+TAGS = _vocabulary["tags"]
+LOCATIONS = _vocabulary["locations"]
+EDUCATION_LEVELS = _vocabulary["education_levels"]
+CATEGORIES = ["Vzdělávání", "Dobrovolnictví", "Zahraničí", "Soutěže", "Kariéra"]
+
+# Icon table of the catalog, activities reference it by key
+ICONS = {key: f'<svg xmlns="http://www.w3.org/2000/svg" aria-label="{key}"></svg>' for key in ("default", "trophy", "book")}
+
+# Zipf exponent of the tag / location frequencies
+ZIPF_EXPONENT = 1.1
+
+TITLE_SUBJECTS = [
+    "Letní škola",
+    "Mezinárodní soutěž",
+    "Dobrovolnický program",
+    "Stáž v neziskové organizaci",
+    "Kurz programování",
+    "Stipendijní program",
+    "Výměnný pobyt",
+    "Debatní klub",
+    "Workshop kreativního psaní",
+    "Přírodovědná olympiáda",
+]
+TITLE_TOPICS = [
+    "pro mladé vědce",
+    "ekologie a udržitelnosti",
+    "podnikání",
+    "umělé inteligence",
+    "žurnalistiky",
+    "mezinárodních vztahů",
+    "zdravotnictví",
+    "kultury a umění",
+]
+SENTENCES = [
+    "Program je určen studentům, kteří chtějí rozvíjet své dovednosti.",
+    "Účastníci získají certifikát a kontakty na odborníky z praxe.",
+    "Přihlášky se podávají online do konce měsíce.",
+    "Aktivita probíhá v českém i anglickém jazyce.",
+    "Náklady na ubytování a stravu hradí pořadatel.",
+    "Zkušení mentoři pomohou s přípravou projektu.",
+    "Během pobytu navštívíte partnerské univerzity a firmy.",
+    "Vítězové postupují do mezinárodního kola.",
+]
+
+
+def zipf_weights(values: list, rng: random.Random) -> list[float]:
+    """
+    Zipf-like weights over a seeded permutation of the values (same order per seed)
+    """
+    ranks = list(range(1, len(values) + 1))
+    rng.shuffle(ranks)
+    return [1 / rank**ZIPF_EXPONENT for rank in ranks]
+
+
+def weighted_sample(rng: random.Random, values: list, weights: list[float], count: int) -> list:
+    """
+    count distinct values drawn by weight
+    """
+    chosen: list = []
+    while len(chosen) < min(count, len(values)):
+        value = rng.choices(values, weights)[0]
+        if value not in chosen:
+            chosen.append(value)
+    return chosen
+
+
+def generate_records(size: int, seed: int = 42):
+    """
+    Yield (title, description, tags, locations, education levels, category) per activity
+    """
+    rng = random.Random(seed)
+    tag_weights = zipf_weights(TAGS, rng)
+    location_weights = zipf_weights(LOCATIONS, rng)
+    for i in range(size):
+        title = f"{rng.choice(TITLE_SUBJECTS)} {rng.choice(TITLE_TOPICS)} {i}"
+        description = " ".join(rng.choices(SENTENCES, k=rng.randint(3, 8)))
+        yield (
+            title,
+            description,
+            weighted_sample(rng, TAGS, tag_weights, rng.choices([1, 2, 3], [5, 3, 2])[0]),
+            weighted_sample(rng, LOCATIONS, location_weights, rng.choices([1, 2], [8, 2])[0]),
+            rng.sample(EDUCATION_LEVELS, rng.randint(1, 2)),
+            rng.sample(CATEGORIES, rng.randint(0, 2)),
+        )
+
+
+def generate_catalog(size: int, seed: int = 42) -> dict:
+    """
+    activities.json-shaped catalog of size activities (slim search documents and
+    the icon table, long descriptions are published separately)
+    """
+    activities = []
+    for i, (title, description, tags, locations, levels, category) in enumerate(
+        generate_records(size, seed)
+    ):
+        activities.append(
+            {
+                "id": i,
+                "title": title,
+                "location": locations,
+                "tags": tags,
+                "education_level": levels,
+                "category": category,
+                "short_description": description[:120],
+                "icon": list(ICONS)[i % len(ICONS)],
+                "created_at": "2025-01-15T12:00:00Z",
+                "updated_at": "2025-06-20T14:30:00Z",
+            }
+        )
+    return {
+        "metadata": {"version": "synthetic", "totalActivities": size},
+        "icons": ICONS,
+        "activities": activities,
+    }
+
+
+def generate_rows(size: int, seed: int = 42) -> list[dict]:
+    """
+    Rows shaped like the database CSV export read by data/get_data_json.py
+    """
+    rows = []
+    for title, description, tags, locations, levels, category in generate_records(size, seed):
+        properties = [
+            ("Místo", ", ".join(locations)),
+            ("Pro koho", ", ".join(levels)),
+            ("Typ aktivity", ", ".join(tags)),
+        ]
+        row = {
+            "Jméno": title,
+            "Popis": f"<p>{description}</p>\\n",
+            "Kategorie": ", ".join(category),
+        }
+        for number, (name, value) in enumerate(properties, start=1):
+            row[f"Název {number}"] = name
+            row[f"Hodnota(y) {number}"] = value
+        rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("size", type=int)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    print(json.dumps(generate_catalog(args.size, args.seed), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
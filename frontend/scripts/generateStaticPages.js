@@ -63,6 +63,18 @@ async function generateStaticPages() {
       };
     }
     
+    // Catalog documents reference icons by key and keep long descriptions in a separate store
+    const longDescriptionsPath = path.join(__dirname, '../public/data/activities_long.json');
+    const longDescriptions = fs.existsSync(longDescriptionsPath)
+      ? JSON.parse(fs.readFileSync(longDescriptionsPath, 'utf8')).long_descriptions || {}
+      : {};
+    const icons = activitiesData.icons || {};
+    activitiesData.activities = activitiesData.activities.map(activity => ({
+      ...activity,
+      thumbnail_url: activity.thumbnail_url || icons[activity.icon],
+      long_description: activity.long_description || longDescriptions[String(activity.id)]
+    }));
+
     // Create activities directory
     const staticDir = path.join(__dirname, '../build/aktivity');
     if (!fs.existsSync(staticDir)) {
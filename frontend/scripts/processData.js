@@ -34,6 +34,20 @@ async function processDataFiles() {
     console.log(`   Original size: ${rawData.length} bytes`);
     console.log(`   Protected size: ${protectedData.length} bytes`);
 
+    // Long descriptions are a separate store and ship protected the same way
+    const longDescriptionsPath = path.join(publicDataDir, 'activities_long.json');
+    const protectedLongDescriptionsPath = path.join(publicDataDir, 'activities_long_protected.json');
+
+    if (fs.existsSync(longDescriptionsPath)) {
+      console.log('📊 Processing long descriptions...');
+      const rawLongData = fs.readFileSync(longDescriptionsPath, 'utf8');
+      const protectedLongData = protectData(JSON.parse(rawLongData));
+      fs.writeFileSync(protectedLongDescriptionsPath, protectedLongData, 'utf8');
+      console.log('✅ Long descriptions protected successfully');
+      console.log(`   Original size: ${rawLongData.length} bytes`);
+      console.log(`   Protected size: ${protectedLongData.length} bytes`);
+    }
+
     // Also copy unique_tags.json to ensure it's available
     const uniqueTagsPath = path.join(publicDataDir, 'unique_tags.json');
     const buildUniqueTagsPath = path.join(buildDataDir, 'data', 'unique_tags.json');
@@ -5,6 +5,7 @@ import analyticsService from '../services/analyticsService';
 import logo from '../files/image.png';
 import './ActivityPage.css';
 import { unprotectData } from '../utils/dataProtection';
+import { expandActivities } from '../services/activityDataService';
 
 const ActivityPage = () => {
   const { id } = useParams();
@@ -59,7 +60,8 @@ const ActivityPage = () => {
           return;
         }
         
-        setActivity(foundActivity);
+        const [fullActivity] = await expandActivities([foundActivity], activitiesData.icons);
+        setActivity(fullActivity);
         
         // Track page visit
         analyticsService.trackActivityPageView(foundActivity.id, foundActivity.title);
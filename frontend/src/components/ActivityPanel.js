@@ -5,6 +5,7 @@ import ActivityResult from './ActivityResult';
 import analyticsService from '../services/analyticsService';
 import logo from '../files/image.png';
 import { unprotectData } from '../utils/dataProtection';
+import { expandActivities } from '../services/activityDataService';
 
 // Sample data as fallback - moved outside component to avoid dependency issues
 const sampleActivities = [
@@ -89,7 +90,7 @@ const ActivityPanel = () => {
           const parsedData = typeof decodedData === 'string' ? JSON.parse(decodedData) : decodedData;
           // Handle the structure {metadata, activities}
           const activitiesArray = parsedData.activities || parsedData;
-          setActivities(activitiesArray);
+          setActivities(await expandActivities(activitiesArray, parsedData.icons));
           setLoading(false);
           return;
         }
@@ -1,6 +1,7 @@
-import React, { useState, memo } from 'react';
+import React, { useState, useEffect, memo } from 'react';
 import './ActivityResult.css';
 import analyticsService from '../services/analyticsService';
+import { getLongDescription } from '../services/activityDataService';
 
 const ActivityResult = memo(({ 
   activity, 
@@ -9,6 +10,16 @@ const ActivityResult = memo(({
   isStandalonePage = false 
 }) => {
   const [expanded, setExpanded] = useState(showFullContent);
+  const [fetchedLongDescription, setFetchedLongDescription] = useState(null);
+  const isExpanded = expanded || showFullContent;
+  const longDescription = activity.long_description || fetchedLongDescription;
+
+  // Search results are slim documents, the long description is fetched on the first expand
+  useEffect(() => {
+    if (isExpanded && !longDescription) {
+      getLongDescription(activity.id).then((text) => setFetchedLongDescription(text || null));
+    }
+  }, [isExpanded, longDescription, activity.id]);
 
   const toggleExpand = () => {
     if (onToggleExpand) {
@@ -79,7 +90,7 @@ const ActivityResult = memo(({
         <div 
           className="activity-description"
           dangerouslySetInnerHTML={{
-            __html: (expanded || showFullContent) ? activity.long_description : activity.short_description
+            __html: isExpanded ? (longDescription || activity.short_description) : activity.short_description
           }}
         />
         
@@ -49,35 +49,41 @@ const ChatInterface = ({ isExpanded, onToggleExpand }) => {
     
     try {
       // Add typing indicator
-      setTimeout(() => {
+      const typingTimer = setTimeout(() => {
         setMessages(prev => [...prev, { type: 'bot', text: '', loading: true, timestamp: Date.now() }]);
       }, 500);
-      
+
+      // Streamed updates replace the typing indicator with the answer as it is generated
+      // (a stable timestamp keeps one React key for the draft across updates)
+      const streamTimestamp = userMessage.timestamp + 1;
+      const showPartialResponse = (partial) => {
+        clearTimeout(typingTimer);
+        setMessages(prev => [
+          ...prev.filter(msg => !msg.loading && !msg.streaming),
+          { type: 'bot', text: partial.response, results: partial.results, streaming: true, timestamp: streamTimestamp }
+        ]);
+      };
+
       // Send query to chatbot service with full message history
-      const response = await chatbotService.sendQuery(currentQuery, messages);
+      const response = await chatbotService.sendQuery(currentQuery, messages, showPartialResponse);
+      clearTimeout(typingTimer);
       
-      // Remove typing indicator
-      setMessages(prev => prev.filter(msg => !msg.loading));
+      // Replace the typing indicator or the streamed draft with the final response
+      const botMessage = { 
+        type: 'bot', 
+        text: response.response,
+        results: response.results,
+        timestamp: streamTimestamp
+      };
+      setMessages(prev => [...prev.filter(msg => !msg.loading && !msg.streaming), botMessage]);
       
-      // Add bot response with slight delay for natural feel
-      setTimeout(() => {
-        const botMessage = { 
-          type: 'bot', 
-          text: response.response,
-          results: response.results,
-          timestamp: Date.now()
-        };
-        
-        setMessages(prev => [...prev, botMessage]);
-        
-        // Track chat response
-        const resultsCount = response.results ? response.results.length : 0;
-        analyticsService.trackChatResponse('Success', resultsCount);
-      }, 300);
+      // Track chat response
+      const resultsCount = response.results ? response.results.length : 0;
+      analyticsService.trackChatResponse('Success', resultsCount);
       
     } catch (error) {
-      // Remove typing indicator
-      setMessages(prev => prev.filter(msg => !msg.loading));
+      // Remove typing indicator and any streamed draft
+      setMessages(prev => prev.filter(msg => !msg.loading && !msg.streaming));
       
       // Add error message
       setMessages(prev => [
@@ -0,0 +1,55 @@
+/**
+ * Slim activity documents
+ * Activities reference their icon by key (the catalog file and every search
+ * response carry the icon table) and long descriptions live in a separate
+ * store, fetched once when first needed.
+ */
+
+import { unprotectData } from '../utils/dataProtection';
+
+let longDescriptionsPromise = null;
+
+export function loadLongDescriptions() {
+  if (!longDescriptionsPromise) {
+    longDescriptionsPromise = fetch('/data/activities_long_protected.json')
+      .then((response) => {
+        if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+        return response.text();
+      })
+      .then((protectedData) => {
+        const decodedData = unprotectData(protectedData);
+        const data = typeof decodedData === 'string' ? JSON.parse(decodedData) : decodedData;
+        return data.long_descriptions || {};
+      })
+      .catch((error) => {
+        console.error('Error loading long descriptions:', error);
+        // Retry on the next call
+        longDescriptionsPromise = null;
+        return {};
+      });
+  }
+  return longDescriptionsPromise;
+}
+
+export async function getLongDescription(id) {
+  const longDescriptions = await loadLongDescriptions();
+  return longDescriptions[String(id)];
+}
+
+// Set thumbnail_url from the icon table on activities referencing an icon by key
+export function withIcons(activities, icons) {
+  if (!icons || !Array.isArray(activities)) return activities;
+  return activities.map((activity) =>
+    activity.thumbnail_url || !activity.icon ? activity : { ...activity, thumbnail_url: icons[activity.icon] }
+  );
+}
+
+// Full records from catalog documents: icons resolved and long descriptions joined
+export async function expandActivities(activities, icons) {
+  const longDescriptions = await loadLongDescriptions();
+  return withIcons(activities, icons).map((activity) =>
+    activity.long_description || !longDescriptions[String(activity.id)]
+      ? activity
+      : { ...activity, long_description: longDescriptions[String(activity.id)] }
+  );
+}
@@ -1,4 +1,5 @@
 import axios from 'axios';
+import { withIcons } from './activityDataService';
 
 // Runtime config loader: fetch /config.json at app startup (served from the same host)
 // Falls back to REACT_APP_API_BASE_URL (build-time) or a safe default if config.json isn't available.
@@ -32,21 +33,96 @@ async function getApiClient() {
   });
 }
 
+// Parse a server-sent event stream from a fetch response, calling onEvent(name, data) per event
+async function readEventStream(response, onEvent) {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  for (;;) {
+    const { done, value } = await reader.read();
+    buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) >= 0) {
+      const block = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      let name = 'message';
+      const data = [];
+      block.split('\n').forEach((line) => {
+        if (line.startsWith('event:')) name = line.slice(6).trim();
+        else if (line.startsWith('data:')) data.push(line.slice(5).trim());
+      });
+      if (data.length) onEvent(name, JSON.parse(data.join('\n')));
+    }
+    if (done) return;
+  }
+}
+
+// POST a request answered with server-sent events: results arrive first, then the text as it is
+// generated. Resolves to the same shape as the buffered JSON response.
+async function streamRequest(path, payload, onUpdate, headers = {}) {
+  const cfg = await loadRuntimeConfig();
+  const response = await fetch(`${cfg.API_BASE_URL}${path}`, {
+    method: 'POST',
+    headers: { ...headers, 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+    body: JSON.stringify({ ...payload, stream: true }),
+  });
+  if (!response.ok) throw new Error(`${path} request failed with status ${response.status}`);
+  // Servers without streaming support answer with the buffered JSON body
+  if (!(response.headers.get('Content-Type') || '').includes('text/event-stream') || !response.body) {
+    return response.json();
+  }
+
+  const answer = { query: payload.query, results: payload.results || [], response: '' };
+  await readEventStream(response, (name, data) => {
+    if (name === 'token') answer.response += data.text;
+    else Object.assign(answer, data);
+    onUpdate({ ...answer });
+  });
+  return answer;
+}
+
+const canStream = (onUpdate) => Boolean(onUpdate) && typeof ReadableStream !== 'undefined';
+
+// Results are slim documents referencing their icon by key, resolved from the response's icon table
+const resolveIcons = (answer, icons = answer && answer.icons) =>
+  answer && Array.isArray(answer.results) ? { ...answer, results: withIcons(answer.results, icons) } : answer;
+
+// One id per user query, sent with every call it makes so the backend traces can be correlated
+function newRequestId() {
+  if (typeof crypto !== 'undefined' && crypto.randomUUID) return crypto.randomUUID();
+  return `${Date.now().toString(16)}-${Math.random().toString(16).slice(2)}`;
+}
+
 export const chatbotService = {
   /**
    * Send a query to the chatbot API
    * @param {string} query - The user's current query
    * @param {Array} messageHistory - The full conversation history
+   * @param {Function} onUpdate - Optional callback receiving the partial response while it streams
    * @returns {Promise} - Promise resolving to chatbot response
    */
-  async sendQuery(query, messageHistory = []) {
+  async sendQuery(query, messageHistory = [], onUpdate = null) {
     try {
       const client = await getApiClient();
+      const headers = { 'X-Request-Id': newRequestId() };
+
+      // One request for the whole flow (extract -> search -> enhance run in a single invocation)
+      try {
+        if (canStream(onUpdate)) {
+          return resolveIcons(
+            await streamRequest('/chat', { query, max_results: 3 }, (answer) => onUpdate(resolveIcons(answer)), headers)
+          );
+        }
+        return resolveIcons((await client.post('/chat', { query, max_results: 3 }, { headers })).data);
+      } catch (chatError) {
+        console.warn('Chat request failed, falling back to the step-by-step flow:', chatError);
+      }
+
       // Step 1: Process the query to extract keywords
       const processResponse = await client.post('/process-query', { 
         query,
         messageHistory 
-      });
+      }, { headers });
       const { extracted_tags } = processResponse.data;
       
       if (!extracted_tags || extracted_tags.length === 0) {
@@ -58,17 +134,33 @@ export const chatbotService = {
         query, 
         tags: extracted_tags,
         max_results: 3
-      });
+      }, { headers });
       
-      const { results } = searchResponse.data;
+      const { results, catalog_version, icons } = searchResponse.data;
       
-      // Step 3: Enhance the results with a conversational response
+      // Step 3: Enhance the results with a conversational response, streamed when possible
+      if (canStream(onUpdate)) {
+        try {
+          return resolveIcons(
+            await streamRequest(
+              '/enhance',
+              { query, results, catalog_version },
+              (answer) => onUpdate(resolveIcons(answer, icons)),
+              headers
+            ),
+            icons
+          );
+        } catch (streamError) {
+          console.warn('Streaming enhance failed, falling back to a buffered request:', streamError);
+        }
+      }
       const enhanceResponse = await client.post('/enhance', {
         query,
-        results
-      });
+        results,
+        catalog_version
+      }, { headers });
       
-      return enhanceResponse.data;
+      return resolveIcons(enhanceResponse.data, icons);
     } catch (error) {
       console.error('Error sending query to chatbot:', error);
       throw error;
@@ -84,7 +176,8 @@ export const chatbotService = {
   async logFeedback(queryId, helpful) {
     try {
       const client = await getApiClient();
-      return await client.post('/feedback', { queryId, helpful });
+      const headers = { 'X-Request-Id': newRequestId() };
+      return await client.post('/feedback', { queryId, helpful }, { headers });
     } catch (error) {
       console.error('Error logging feedback:', error);
       // Don't throw error for feedback logging
@@ -16,6 +16,22 @@ resource "aws_s3_bucket" "activity_data_bucket" {
   force_destroy = true # Allow bucket destroy even if objects exist
 }
 
+# Expire cached model results (entries of old catalog versions are never read again)
+resource "aws_s3_bucket_lifecycle_configuration" "activity_data_bucket_cache" {
+  bucket = aws_s3_bucket.activity_data_bucket.id
+
+  rule {
+    id     = "expire-cache"
+    status = "Enabled"
+    filter {
+      prefix = "cache/"
+    }
+    expiration {
+      days = 7
+    }
+  }
+}
+
 # Upload activities JSON (used by Lambda backend)
 resource "aws_s3_object" "activities_json" {
   bucket       = aws_s3_bucket.activity_data_bucket.id
@@ -25,6 +41,28 @@ resource "aws_s3_object" "activities_json" {
   content_type = "application/json"
 }
 
+# Upload the prebuilt search snapshot when the data pipeline produced one
+# (preferred by the search Lambda, activities.json is the fallback)
+resource "aws_s3_object" "activities_snapshot" {
+  count        = fileexists("${path.module}/../../data/activities_real.snapshot") ? 1 : 0
+  bucket       = aws_s3_bucket.activity_data_bucket.id
+  key          = "activities.snapshot"
+  source       = "${path.module}/../../data/activities_real.snapshot"
+  etag         = filemd5("${path.module}/../../data/activities_real.snapshot")
+  content_type = "application/octet-stream"
+}
+
+# Upload the long descriptions published next to the slim activities JSON
+# (read by the search Lambda only when a request asks for long_description)
+resource "aws_s3_object" "activities_long" {
+  count        = fileexists("${path.module}/../../data/activities_long.json") ? 1 : 0
+  bucket       = aws_s3_bucket.activity_data_bucket.id
+  key          = "activities_long.json"
+  source       = "${path.module}/../../data/activities_long.json"
+  etag         = filemd5("${path.module}/../../data/activities_long.json")
+  content_type = "application/json"
+}
+
 # Upload tags JSON (used by backend search)
 resource "aws_s3_object" "tags_json" {
   bucket       = aws_s3_bucket.activity_data_bucket.id
@@ -79,14 +117,28 @@ resource "aws_iam_policy" "lambda_s3_access" {
   description = "Allow Lambda functions to access S3 bucket"
   policy = jsonencode({
     Version = "2012-10-17"
-    Statement = [{
-      Effect = "Allow"
-      Action = ["s3:GetObject", "s3:ListBucket"]
-      Resource = [
-        aws_s3_bucket.activity_data_bucket.arn,
-        "${aws_s3_bucket.activity_data_bucket.arn}/*"
-      ]
-    }]
+    Statement = [
+      {
+        Effect = "Allow"
+        Action = ["s3:GetObject", "s3:ListBucket"]
+        Resource = [
+          aws_s3_bucket.activity_data_bucket.arn,
+          "${aws_s3_bucket.activity_data_bucket.arn}/*"
+        ]
+      },
+      {
+        # Shared result caches written by the Lambdas
+        Effect   = "Allow"
+        Action   = ["s3:PutObject"]
+        Resource = ["${aws_s3_bucket.activity_data_bucket.arn}/cache/*"]
+      },
+      {
+        # Batched query logs (training data), see QueryLogSink
+        Effect   = "Allow"
+        Action   = ["s3:PutObject"]
+        Resource = ["${aws_s3_bucket.activity_data_bucket.arn}/logs/*"]
+      }
+    ]
   })
 }
 
@@ -121,11 +173,38 @@ data "archive_file" "result_enhancer_zip" {
   excludes    = ["__pycache__"]
 }
 
+# The chat function runs all three stages in-process; each stage's lambda_function.py
+# is packaged under its own module name (see backend/functions/chat_pipeline.py)
+data "archive_file" "chat_zip" {
+  type        = "zip"
+  output_path = "${path.module}/../../backend/deployments/chat.zip"
+
+  source {
+    content  = file("${path.module}/../../backend/functions/chat/lambda_function.py")
+    filename = "lambda_function.py"
+  }
+  source {
+    content  = file("${path.module}/../../backend/functions/query_processor/lambda_function.py")
+    filename = "query_processor_lambda.py"
+  }
+  source {
+    content  = file("${path.module}/../../backend/functions/search_engine/lambda_function.py")
+    filename = "search_engine_lambda.py"
+  }
+  source {
+    content  = file("${path.module}/../../backend/functions/result_enhancer/lambda_function.py")
+    filename = "result_enhancer_lambda.py"
+  }
+}
+
 # Create Lambda Layer ZIP from requirements
 resource "null_resource" "build_lambda_layer" {
   triggers = {
     requirements_hash = filesha256("${path.module}/../../backend/requirements.txt")
-    utils_hash        = filesha256("${path.module}/../../backend/functions/utils.py")
+    shared_hash       = sha256(join("", [
+      for f in sort(fileset("${path.module}/../../backend/functions", "*.py")) :
+      filesha256("${path.module}/../../backend/functions/${f}")
+    ]))
   }
 
   provisioner "local-exec" {
@@ -164,9 +243,14 @@ resource "aws_lambda_function" "query_processor_function" {
   memory_size      = 256
   environment {
     variables = {
-      OPENAI_API_KEY   = var.openai_api_key
-      TAGS_BUCKET_NAME = aws_s3_bucket.activity_data_bucket.id
-      TAGS_FILE_KEY    = "unique_tags.json"
+      OPENAI_API_KEY             = var.openai_api_key
+      TAGS_BUCKET_NAME           = aws_s3_bucket.activity_data_bucket.id
+      TAGS_FILE_KEY              = "unique_tags.json"
+      KEYWORD_CACHE_LOCATION     = "s3://${aws_s3_bucket.activity_data_bucket.id}/cache" # shared by all containers
+      LOCAL_EXTRACTION_THRESHOLD = var.local_extraction_threshold
+      QUERY_LOG_LOCATION         = "s3://${aws_s3_bucket.activity_data_bucket.id}/logs"
+      QUERY_LOG_SAMPLE_RATE      = var.query_log_sample_rate
+      LOG_LEVEL                  = var.log_level
     }
   }
 
@@ -185,8 +269,13 @@ resource "aws_lambda_function" "search_engine_function" {
   memory_size      = 256
   environment {
     variables = {
-      ACTIVITIES_BUCKET_NAME = aws_s3_bucket.activity_data_bucket.id
-      ACTIVITIES_FILE_KEY    = "activities.json"
+      ACTIVITIES_BUCKET_NAME  = aws_s3_bucket.activity_data_bucket.id
+      ACTIVITIES_FILE_KEY     = "activities.json"
+      ACTIVITIES_SNAPSHOT_KEY = "activities.snapshot"
+      ACTIVITIES_LONG_KEY     = "activities_long.json"
+      QUERY_LOG_LOCATION      = "s3://${aws_s3_bucket.activity_data_bucket.id}/logs"
+      QUERY_LOG_SAMPLE_RATE   = var.query_log_sample_rate
+      LOG_LEVEL               = var.log_level
     }
   }
 
@@ -204,7 +293,42 @@ resource "aws_lambda_function" "result_enhancer_function" {
   timeout          = 10
   memory_size      = 256
   environment {
-    variables = { OPENAI_API_KEY = var.openai_api_key }
+    variables = {
+      OPENAI_API_KEY         = var.openai_api_key
+      ENHANCE_CACHE_LOCATION = "s3://${aws_s3_bucket.activity_data_bucket.id}/cache" # shared by all containers
+      LOG_LEVEL              = var.log_level
+    }
+  }
+
+  layers = [aws_lambda_layer_version.dependencies.arn]
+}
+
+# Lambda: Chat (extract -> search -> enhance in one invocation)
+resource "aws_lambda_function" "chat_function" {
+  function_name    = "activity-database-chat"
+  filename         = data.archive_file.chat_zip.output_path
+  source_code_hash = data.archive_file.chat_zip.output_base64sha256
+  role             = aws_iam_role.lambda_execution_role.arn
+  handler          = "lambda_function.lambda_handler"
+  runtime          = "python3.10"
+  timeout          = 20
+  memory_size      = 512
+  environment {
+    variables = {
+      OPENAI_API_KEY             = var.openai_api_key
+      ACTIVITIES_BUCKET_NAME     = aws_s3_bucket.activity_data_bucket.id
+      ACTIVITIES_FILE_KEY        = "activities.json"
+      ACTIVITIES_SNAPSHOT_KEY    = "activities.snapshot"
+      ACTIVITIES_LONG_KEY        = "activities_long.json"
+      TAGS_BUCKET_NAME           = aws_s3_bucket.activity_data_bucket.id
+      TAGS_FILE_KEY              = "unique_tags.json"
+      KEYWORD_CACHE_LOCATION     = "s3://${aws_s3_bucket.activity_data_bucket.id}/cache"
+      ENHANCE_CACHE_LOCATION     = "s3://${aws_s3_bucket.activity_data_bucket.id}/cache"
+      LOCAL_EXTRACTION_THRESHOLD = var.local_extraction_threshold
+      QUERY_LOG_LOCATION         = "s3://${aws_s3_bucket.activity_data_bucket.id}/logs"
+      QUERY_LOG_SAMPLE_RATE      = var.query_log_sample_rate
+      LOG_LEVEL                  = var.log_level
+    }
   }
 
   layers = [aws_lambda_layer_version.dependencies.arn]
@@ -223,7 +347,7 @@ resource "aws_apigatewayv2_api" "api" {
   # CORS configuration for Vercel frontend
   cors_configuration {
     allow_credentials = false
-    allow_headers     = ["content-type", "x-amz-date", "authorization", "x-api-key", "x-amz-security-token"]
+    allow_headers     = ["content-type", "x-amz-date", "authorization", "x-api-key", "x-amz-security-token", "x-request-id"]
     allow_methods     = ["GET", "HEAD", "OPTIONS", "POST"]
     allow_origins = [
       "https://*.vercel.app",
@@ -284,6 +408,13 @@ resource "aws_apigatewayv2_integration" "result_enhancer_integration" {
   integration_uri    = aws_lambda_function.result_enhancer_function.invoke_arn
 }
 
+resource "aws_apigatewayv2_integration" "chat_integration" {
+  api_id             = aws_apigatewayv2_api.api.id
+  integration_type   = "AWS_PROXY"
+  integration_method = "POST"
+  integration_uri    = aws_lambda_function.chat_function.invoke_arn
+}
+
 # API Routes
 resource "aws_apigatewayv2_route" "query_processor_route" {
   api_id    = aws_apigatewayv2_api.api.id
@@ -303,6 +434,12 @@ resource "aws_apigatewayv2_route" "result_enhancer_route" {
   target    = "integrations/${aws_apigatewayv2_integration.result_enhancer_integration.id}"
 }
 
+resource "aws_apigatewayv2_route" "chat_route" {
+  api_id    = aws_apigatewayv2_api.api.id
+  route_key = "POST /chat"
+  target    = "integrations/${aws_apigatewayv2_integration.chat_integration.id}"
+}
+
 # Lambda permissions for API Gateway
 resource "aws_lambda_permission" "query_processor_permission" {
   statement_id  = "AllowAPIGatewayInvoke"
@@ -326,4 +463,12 @@ resource "aws_lambda_permission" "result_enhancer_permission" {
   function_name = aws_lambda_function.result_enhancer_function.function_name
   principal     = "apigateway.amazonaws.com"
   source_arn    = "${aws_apigatewayv2_api.api.execution_arn}/*"
+}
+
+resource "aws_lambda_permission" "chat_permission" {
+  statement_id  = "AllowAPIGatewayInvoke"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.chat_function.function_name
+  principal     = "apigateway.amazonaws.com"
+  source_arn    = "${aws_apigatewayv2_api.api.execution_arn}/*"
 }
\ No newline at end of file
@@ -23,6 +23,10 @@ output "lambda_functions" {
       name = aws_lambda_function.result_enhancer_function.function_name
       arn  = aws_lambda_function.result_enhancer_function.arn
     }
+    chat = {
+      name = aws_lambda_function.chat_function.function_name
+      arn  = aws_lambda_function.chat_function.arn
+    }
   }
 }
 
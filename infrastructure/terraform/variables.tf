@@ -43,4 +43,21 @@ variable "custom_domain" {
   description = "Custom domain for the frontend (e.g., yourdomain.cz). Leave empty if using Vercel default domain."
   type        = string
   default     = ""
-}
\ No newline at end of file
+}
+variable "local_extraction_threshold" {
+  description = "Confidence (0-1) of the local tag extractor above which the query processor skips the LLM"
+  type        = number
+  default     = 0.8
+}
+
+variable "query_log_sample_rate" {
+  description = "Share (0-1) of requests whose queries are written to the S3 query log"
+  type        = number
+  default     = 1.0
+}
+
+variable "log_level" {
+  description = "Lambda log level; DEBUG also logs request events and raw model responses"
+  type        = string
+  default     = "INFO"
+}
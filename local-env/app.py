@@ -1,8 +1,13 @@
+import ast
 import json
 import os
+import re
+import time
 import random
 import logging
-from flask import Flask, request, jsonify
+import threading
+import unicodedata
+from flask import Flask, Response, request, jsonify, stream_with_context
 
 app = Flask(__name__)
 
@@ -10,104 +15,248 @@ app = Flask(__name__)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Configure mock responses
-KEYWORD_TEMPLATES = [
-    ["outdoor", "hiking", "nature", "adventure"],
-    ["indoor", "cooking", "recipe", "food"],
-    ["family", "children", "fun", "games"],
-    ["sport", "exercise", "fitness", "health"],
-    ["art", "creative", "craft", "diy"],
-    ["music", "concert", "performance", "entertainment"],
-    ["technology", "coding", "programming", "computer"],
-    ["reading", "book", "literature", "learning"]
-]
+# Behaviour of the mock, read from the environment and changeable at runtime with POST /mock/config
+# - latency_ms / jitter_ms / latency_distribution: delay before the first token
+#   ("fixed", "uniform": latency +- jitter, "normal": jitter is the standard deviation,
+#   "lognormal": latency is the median, jitter the spread of a long-tailed delay)
+# - tokens_per_second: pace of streamed tokens (0 sends them at once)
+# - error_rate / rate_limit_rate: share of requests answered with 500 / 429
+# - timeout_rate / timeout_seconds: share of requests that hang before answering
+CONFIG = {
+    "latency_ms": float(os.environ.get("MOCK_LATENCY_MS", 0)),
+    "jitter_ms": float(os.environ.get("MOCK_JITTER_MS", 0)),
+    "latency_distribution": os.environ.get("MOCK_LATENCY_DISTRIBUTION", "uniform"),
+    "tokens_per_second": float(os.environ.get("MOCK_TOKENS_PER_SECOND", 50)),
+    "error_rate": float(os.environ.get("MOCK_ERROR_RATE", 0)),
+    "rate_limit_rate": float(os.environ.get("MOCK_RATE_LIMIT_RATE", 0)),
+    "timeout_rate": float(os.environ.get("MOCK_TIMEOUT_RATE", 0)),
+    "timeout_seconds": float(os.environ.get("MOCK_TIMEOUT_SECONDS", 30)),
+    "seed": os.environ.get("MOCK_SEED"),
+}
+
+# Shared between request threads
+_random = random.Random(CONFIG["seed"])
+_random_lock = threading.Lock()
+
+# Markers of our real (Czech) prompts
+KEYWORD_MARKER = "extrakci klíčových slov"
+ENHANCE_MARKER = "volnočasovými aktivitami"
 
 ENHANCEMENT_TEMPLATES = [
-    "You might enjoy {activity_name}. It's a great way to {description}.",
-    "Have you tried {activity_name}? Many people find it's perfect for {description}.",
-    "Based on your interests, I recommend {activity_name}. It's ideal for {description}.",
-    "{activity_name} could be a good match for you. It allows you to {description}.",
-    "Consider trying {activity_name}. It's a wonderful activity that helps you {description}."
+    "Na tvůj dotaz „{query}“ se skvěle hodí {titles}. {reason}",
+    "Podívej se na {titles}. {reason}",
+    "Zkus {titles}, odpovídají tomu, co hledáš. {reason}",
 ]
+ENHANCEMENT_REASONS = [
+    "Získáš nové zkušenosti a poznáš lidi se stejnými zájmy.",
+    "Rozvineš své dovednosti a můžeš si je přidat do životopisu.",
+    "Jsou určené přesně pro tvou věkovou skupinu a dají se snadno zapojit.",
+]
+
+
+def fold(text: str) -> str:
+    """
+    Lowercase without diacritics
+    """
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def words(text: str) -> list[str]:
+    return re.findall(r"\w+", fold(text))
+
+
+def chance(rate: float) -> bool:
+    with _random_lock:
+        return rate > 0 and _random.random() < rate
+
+
+def sample_latency() -> float:
+    """
+    Delay before the first token in seconds, drawn from the configured distribution
+    """
+    latency, jitter = CONFIG["latency_ms"], CONFIG["jitter_ms"]
+    distribution = CONFIG["latency_distribution"]
+    with _random_lock:
+        if distribution == "normal":
+            value = _random.gauss(latency, jitter)
+        elif distribution == "lognormal" and latency > 0:
+            value = _random.lognormvariate(0, jitter / latency if jitter else 0) * latency
+        elif distribution == "fixed":
+            value = latency
+        else:
+            value = latency + _random.uniform(-jitter, jitter)
+    return max(value, 0) / 1000
+
+
+def keyword_response(messages) -> str:
+    """
+    Vocabulary keywords whose words start like a word of the query, as the
+    query processor prompt asks (JSON array restricted to the offered vocabulary)
+    """
+    system = messages[0]["content"]
+    vocabulary_match = re.search(r"'''(.*)'''", system, re.DOTALL)
+    try:
+        vocabulary = ast.literal_eval(vocabulary_match.group(1)) if vocabulary_match else []
+    except (ValueError, SyntaxError):
+        vocabulary = []
+
+    query_match = re.search(r"dotazu: '(.*)'", messages[-1]["content"], re.DOTALL)
+    query_words = words(query_match.group(1) if query_match else messages[-1]["content"])
+
+    keywords = []
+    for keyword in vocabulary:
+        stems = [word[: max(3, len(word) - 2)] for word in words(keyword) if len(word) > 2]
+        if stems and all(any(query_word.startswith(stem) for query_word in query_words) for stem in stems):
+            keywords.append(keyword)
+    if not keywords and vocabulary:
+        keywords = [vocabulary[0]]
+    return json.dumps(keywords[:5], ensure_ascii=False)
+
+
+def enhance_response(messages) -> str:
+    """
+    Short Czech answer naming the activities listed in the result enhancer prompt
+    """
+    prompt = messages[-1]["content"]
+    query_match = re.search(r'zeptal na: "(.*?)"', prompt)
+    titles = re.findall(r"^\s*\d+\. (.+?) - ", prompt, re.MULTILINE)
+    with _random_lock:
+        template = _random.choice(ENHANCEMENT_TEMPLATES)
+        reason = _random.choice(ENHANCEMENT_REASONS)
+    return template.format(
+        query=query_match.group(1) if query_match else "",
+        titles=", ".join(titles) or "tyto aktivity",
+        reason=reason,
+    )
+
 
-@app.route('/v1/chat/completions', methods=['POST'])
+def completion_content(messages) -> str:
+    system_message = next((m for m in messages if m["role"] == "system"), {}).get("content", "")
+    if KEYWORD_MARKER in system_message:
+        return keyword_response(messages)
+    if ENHANCE_MARKER in system_message:
+        return enhance_response(messages)
+    # Generic response
+    return "Toto je odpověď simulovaného OpenAI API."
+
+
+def count_tokens(text: str) -> int:
+    # Rough token count, about 4 UTF-8 bytes per token
+    return max(1, len(text.encode("utf-8")) // 4)
+
+
+def split_tokens(text: str) -> list[str]:
+    return re.findall(r"\S+\s*|\s+", text)
+
+
+def error_response(status: int, message: str, error_type: str):
+    return jsonify({"error": {"message": message, "type": error_type, "code": None}}), status
+
+
+def stream_chunks(completion_id: str, model: str, content: str, usage: dict | None):
+    """
+    Server-sent chat.completion.chunk events paced at tokens_per_second
+    """
+    def chunk(delta, finish_reason=None):
+        payload = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+    rate = CONFIG["tokens_per_second"]
+    yield chunk({"role": "assistant", "content": ""})
+    for token in split_tokens(content):
+        if rate > 0:
+            time.sleep(1 / rate)
+        yield chunk({"content": token})
+    yield chunk({}, "stop")
+    if usage is not None:
+        yield (
+            "data: "
+            + json.dumps(
+                {"id": completion_id, "object": "chat.completion.chunk", "model": model, "choices": [], "usage": usage}
+            )
+            + "\n\n"
+        )
+    yield "data: [DONE]\n\n"
+
+
+@app.route("/v1/chat/completions", methods=["POST"])
 def chat_completions():
     """Mock OpenAI chat completions endpoint"""
-    data = request.json
-    messages = data.get('messages', [])
-    
-    # Log the incoming request
-    logger.info(f"Received request: {json.dumps(data)}")
-    
-    # Determine the type of response based on the system message
-    system_message = next((m for m in messages if m['role'] == 'system'), {}).get('content', '')
-    user_message = next((m for m in messages if m['role'] == 'user'), {}).get('content', '')
-    
-    if "keyword extraction" in system_message.lower():
-        # This is a query processor request
-        response_content = json.dumps(random.choice(KEYWORD_TEMPLATES))
-    
-    elif "enhance search results" in system_message.lower():
-        # This is a result enhancer request
-        try:
-            # Try to parse the activities from the user message
-            activities_start = user_message.find('[')
-            activities_end = user_message.rfind(']')
-            
-            if activities_start >= 0 and activities_end > activities_start:
-                activities_json = user_message[activities_start:activities_end+1]
-                activities = json.loads(activities_json)
-                
-                # Generate enhanced responses for each activity
-                enhanced_results = []
-                for activity in activities:
-                    activity_name = activity.get('name', 'this activity')
-                    description = activity.get('description', 'have fun')
-                    
-                    # Generate a conversational response
-                    template = random.choice(ENHANCEMENT_TEMPLATES)
-                    enhanced_text = template.format(
-                        activity_name=activity_name,
-                        description=description[:50] + "..." if len(description) > 50 else description
-                    )
-                    
-                    enhanced_results.append({
-                        "original": activity,
-                        "enhanced_text": enhanced_text
-                    })
-                
-                response_content = json.dumps({"enhanced_results": enhanced_results})
-            else:
-                response_content = json.dumps({"enhanced_results": []})
-        except Exception as e:
-            logger.error(f"Error processing result enhancer request: {str(e)}")
-            response_content = json.dumps({"enhanced_results": []})
-    
-    else:
-        # Generic response
-        response_content = json.dumps({"response": "This is a mock response from the OpenAI API"})
-    
+    data = request.json or {}
+    messages = data.get("messages", [])
+    model = data.get("model", "gpt-5-nano")
+    logger.debug(f"Received request: {json.dumps(data, ensure_ascii=False)}")
+
+    # Injected failures
+    if chance(CONFIG["timeout_rate"]):
+        time.sleep(CONFIG["timeout_seconds"])
+        return error_response(504, "Injected timeout", "timeout")
+    time.sleep(sample_latency())
+    if chance(CONFIG["rate_limit_rate"]):
+        return error_response(429, "Injected rate limit", "rate_limit_exceeded")
+    if chance(CONFIG["error_rate"]):
+        return error_response(500, "Injected server error", "server_error")
+
+    content = completion_content(messages)
+    prompt_tokens = sum(count_tokens(message.get("content") or "") for message in messages)
+    completion_tokens = count_tokens(content)
+    usage = {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+    with _random_lock:
+        completion_id = f"mock-{_random.randint(1000, 9999)}"
+
+    if data.get("stream"):
+        include_usage = (data.get("stream_options") or {}).get("include_usage")
+        return Response(
+            stream_with_context(stream_chunks(completion_id, model, content, usage if include_usage else None)),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache"},
+        )
+
     # Build OpenAI-like response structure
     response = {
-        "id": f"mock-{random.randint(1000, 9999)}",
+        "id": completion_id,
         "object": "chat.completion",
-        "created": 1630000000,
-        "model": "gpt-3.5-turbo-mock",
+        "created": int(time.time()),
+        "model": model,
         "choices": [
             {
                 "index": 0,
-                "message": {
-                    "role": "assistant",
-                    "content": response_content
-                },
-                "finish_reason": "stop"
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
             }
-        ]
+        ],
+        "usage": usage,
     }
-    
-    logger.info(f"Sending response: {json.dumps(response)}")
+    logger.debug(f"Sending response: {json.dumps(response, ensure_ascii=False)}")
     return jsonify(response)
 
-if __name__ == '__main__':
-    port = int(os.environ.get('PORT', 8080))
-    app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
+
+@app.route("/mock/config", methods=["GET", "POST"])
+def mock_config():
+    """Read or update the latency / streaming / failure settings"""
+    if request.method == "POST":
+        updates = request.json or {}
+        unknown = [key for key in updates if key not in CONFIG]
+        if unknown:
+            return jsonify({"error": f"Unknown settings: {unknown}"}), 400
+        CONFIG.update(updates)
+        if "seed" in updates:
+            with _random_lock:
+                _random.seed(updates["seed"])
+    return jsonify(CONFIG)
+
+
+if __name__ == "__main__":
+    port = int(os.environ.get("PORT", 8080))
+    app.run(host="0.0.0.0", port=port, debug=True, threaded=True)
@@ -0,0 +1,171 @@
+"""
+Open-loop load generator for the local-dev server
+
+Replays JSONL traffic (one {"query": ...} object per line; "title" / "body" are
+used when "query" is missing, so requests.jsonl-style files work as is) at a
+target rate and reports latency percentiles per stage as JSON.
+
+- chat mode: POST /api/chat, stages are the client round trip plus the
+  server-side timings_ms (extract, search, enhance, total)
+- steps mode: the frontend's three calls (/process-query, /search, /enhance),
+  each timed by the client
+
+Requests are started on schedule whether or not earlier ones finished, so
+queueing in the server shows up in the percentiles.
+
+    python local-env/load_test.py --rps 20 --duration 30
+    python local-env/load_test.py --mode steps --traffic requests.jsonl --requests 200
+"""
+import sys
+import json
+import time
+import argparse
+import threading
+import urllib.error
+import urllib.request
+from pathlib import Path
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_TRAFFIC = Path(__file__).resolve().parent / "traffic.jsonl"
+
+
+def load_traffic(path) -> list[str]:
+    queries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                query = record.get("query") or record.get("title") or record.get("body")
+                if query:
+                    queries.append(query)
+    if not queries:
+        raise ValueError(f"No queries in {path}")
+    return queries
+
+
+def post(base_url: str, path: str, payload: dict, timeout: float) -> tuple[dict, float]:
+    """
+    POST JSON, returns (response body, elapsed ms); raises on HTTP errors
+    """
+    data = json.dumps(payload).encode("utf-8")
+    req = urllib.request.Request(
+        base_url + path, data=data, headers={"Content-Type": "application/json"}, method="POST"
+    )
+    started = time.perf_counter()
+    with urllib.request.urlopen(req, timeout=timeout) as response:
+        body = json.loads(response.read().decode("utf-8"))
+    return body, (time.perf_counter() - started) * 1000
+
+
+def run_chat(base_url: str, query: str, timeout: float) -> dict[str, float]:
+    body, elapsed = post(base_url, "/api/chat", {"query": query}, timeout)
+    timings = {f"server_{stage}": value for stage, value in (body.get("timings_ms") or {}).items()}
+    return {"chat": elapsed, **timings}
+
+
+def run_steps(base_url: str, query: str, timeout: float) -> dict[str, float]:
+    processed, extract_ms = post(base_url, "/process-query", {"query": query}, timeout)
+    tags = processed.get("extracted_tags") or []
+    timings = {"process_query": extract_ms}
+    if not tags:
+        return timings
+    found, timings["search"] = post(base_url, "/search", {"query": query, "tags": tags}, timeout)
+    _, timings["enhance"] = post(
+        base_url,
+        "/enhance",
+        {"query": query, "results": found.get("results", []), "catalog_version": found.get("catalog_version")},
+        timeout,
+    )
+    timings["total"] = extract_ms + timings["search"] + timings["enhance"]
+    return timings
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    """
+    Nearest-rank percentile of sorted values
+    """
+    rank = max(int(round(fraction * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(samples: dict[str, list[float]]) -> dict:
+    summary = {}
+    for stage, values in samples.items():
+        values = sorted(values)
+        summary[stage] = {
+            "count": len(values),
+            "mean_ms": round(sum(values) / len(values), 2),
+            "p50_ms": round(percentile(values, 0.50), 2),
+            "p95_ms": round(percentile(values, 0.95), 2),
+            "p99_ms": round(percentile(values, 0.99), 2),
+            "max_ms": round(values[-1], 2),
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:5550", help="Base URL of the local-dev server")
+    parser.add_argument("--traffic", default=str(DEFAULT_TRAFFIC))
+    parser.add_argument("--mode", choices=["chat", "steps"], default="chat")
+    parser.add_argument("--rps", type=float, default=5, help="Target requests per second")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of traffic (ignored with --requests)")
+    parser.add_argument("--requests", type=int, help="Number of requests to send")
+    parser.add_argument("--concurrency", type=int, default=64, help="Most requests in flight")
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    queries = load_traffic(args.traffic)
+    total = args.requests or max(int(args.rps * args.duration), 1)
+    run = run_chat if args.mode == "chat" else run_steps
+
+    samples: dict[str, list[float]] = defaultdict(list)
+    errors: dict[str, int] = defaultdict(int)
+    lock = threading.Lock()
+
+    def send(query):
+        try:
+            timings = run(args.url.rstrip("/"), query, args.timeout)
+        except urllib.error.HTTPError as e:
+            with lock:
+                errors[f"http_{e.code}"] += 1
+            return
+        except Exception as e:
+            with lock:
+                errors[type(e).__name__] += 1
+            return
+        with lock:
+            for stage, value in timings.items():
+                samples[stage].append(value)
+
+    started = time.perf_counter()
+    lag = 0.0
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for i in range(total):
+            delay = started + i / args.rps - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                lag = max(lag, -delay)
+            pool.submit(send, queries[i % len(queries)])
+        sending = time.perf_counter() - started
+    elapsed = time.perf_counter() - started
+
+    report = {
+        "mode": args.mode,
+        "requests": total,
+        "target_rps": args.rps,
+        "achieved_rps": round(total / max(sending, 1e-9), 2),
+        "wall_seconds": round(elapsed, 2),
+        "max_schedule_lag_ms": round(lag * 1000, 2),
+        "errors": dict(errors),
+        "stages": summarize(samples),
+    }
+    print(json.dumps(report, indent=4))
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
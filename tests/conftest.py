@@ -0,0 +1,93 @@
+"""
+Shared fixtures: the Lambda modules are imported from backend/functions (as in
+the Lambda package) and S3 is replaced by an in-memory fake
+"""
+import io
+import sys
+import json
+import hashlib
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+FUNCTIONS = ROOT / "backend" / "functions"
+sys.path.insert(0, str(FUNCTIONS))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from synthetic_catalog import generate_catalog  # noqa: E402
+
+
+class FakeClientError(Exception):
+    """
+    Shaped like botocore's ClientError (the loaders only look at .response)
+    """
+
+    def __init__(self, code):
+        super().__init__(code)
+        self.response = {"Error": {"Code": code}}
+
+
+class FakeS3:
+    """
+    In-memory get_object / put_object with ETags and IfNoneMatch
+    """
+
+    def __init__(self):
+        self.objects = {}
+        self.calls = 0
+        self.fail = False
+
+    def etag(self, key):
+        return '"' + hashlib.md5(self.objects[key]).hexdigest() + '"'
+
+    def get_object(self, Bucket, Key, IfNoneMatch=None, **kwargs):
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError("S3 is unavailable")
+        if Key not in self.objects:
+            raise FakeClientError("NoSuchKey")
+        etag = self.etag(Key)
+        if IfNoneMatch == etag:
+            raise FakeClientError("304")
+        return {"Body": io.BytesIO(self.objects[Key]), "ETag": etag}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[Key] = Body if isinstance(Body, bytes) else Body.encode("utf-8")
+
+
+@pytest.fixture
+def fake_s3():
+    return FakeS3()
+
+
+@pytest.fixture(scope="session")
+def catalog_data():
+    """
+    Seeded synthetic catalog (activities.json shape)
+    """
+    return generate_catalog(400)
+
+
+def load_lambda(name):
+    """
+    Fresh instance of backend/functions/<name>/lambda_function.py
+    """
+    path = FUNCTIONS / name / "lambda_function.py"
+    spec = importlib.util.spec_from_file_location(f"{name}_lambda_function", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def search_engine(fake_s3, catalog_data):
+    """
+    Search Lambda module serving catalog_data from the fake S3
+    """
+    fake_s3.put_object("activities", "activities.json", json.dumps(catalog_data, ensure_ascii=False))
+    module = load_lambda("search_engine")
+    module.catalog._s3_client = fake_s3
+    module.ranked_cache.clear()
+    return module
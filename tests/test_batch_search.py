@@ -0,0 +1,94 @@
+"""
+Batch search: incidence-matrix scoring equals the single-query ranking
+"""
+import json
+import random
+
+import pytest
+
+import incidence_matrix
+from search_index import build_search_index
+from synthetic_catalog import LOCATIONS, generate_catalog
+from conftest import load_lambda
+
+
+@pytest.fixture(scope="module")
+def search_index():
+    return build_search_index(generate_catalog(2000, seed=5)["activities"])
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return load_lambda("search_engine")
+
+
+def random_queries(search_index, count, seed):
+    rng = random.Random(seed)
+    vocabulary = list(search_index["tag_index"]) + ["praha", "brno", "neznámý štítek"]
+    return [
+        {
+            "tags": rng.sample(vocabulary, rng.randint(1, 5)),
+            "max_results": rng.choice([1, 3, 10, 50]),
+            "exclude_tags": rng.sample(vocabulary, rng.randint(0, 1)),
+            "match": rng.choice(["all", "any"]),
+            "filters": rng.choice([None, {"location": [rng.choice(LOCATIONS)]}]),
+        }
+        for _ in range(count)
+    ]
+
+
+def expected_results(engine, search_index, queries):
+    return [
+        (
+            engine.match_activities(search_index, **query),
+            bin(
+                engine.candidate_bitmap(
+                    search_index, query["tags"], query["match"], query["exclude_tags"], query["filters"]
+                )
+            ).count("1"),
+        )
+        for query in queries
+    ]
+
+
+def test_batch_equals_single_queries(engine, search_index):
+    queries = random_queries(search_index, 300, seed=17)
+    assert engine.match_activities_batch(search_index, queries) == expected_results(engine, search_index, queries)
+
+
+def test_large_batches_are_scored_in_chunks(engine, search_index, monkeypatch):
+    monkeypatch.setattr(incidence_matrix, "MAX_SCORED_CELLS", 3 * search_index["size"])
+    queries = random_queries(search_index, 40, seed=23)
+    assert engine.match_activities_batch(search_index, queries) == expected_results(engine, search_index, queries)
+
+
+def batch(engine, queries):
+    response = engine.lambda_handler({"body": json.dumps({"queries": queries}, ensure_ascii=False)}, None)
+    return response["statusCode"], json.loads(response["body"])
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        {"tags": "praha"},
+        {"tags": ["praha"], "max_results": "x"},
+        {"tags": ["praha"], "max_results": -5},
+        {"tags": ["praha"], "exclude_tags": [None]},
+        {"tags": ["praha"], "filters": {"location": None}},
+        {"tags": ["praha"], "mode": "ranked"},
+        {"tags": []},
+        "praha",
+    ],
+)
+def test_invalid_query_names_its_position(search_engine, query):
+    status, body = batch(search_engine, [{"tags": ["praha"]}, query])
+    assert status == 400
+    assert body["error"].startswith("Query 1:")
+
+
+def test_batch_response(search_engine):
+    status, body = batch(search_engine, [{"tags": ["Praha"], "max_results": 2}, {"tags": ["nic takového"]}])
+    assert status == 200
+    first, second = body["results"]
+    assert first["tags"] == ["Praha"] and first["count"] <= 2
+    assert second["unknown_tags"] == ["nic takového"] and second["count"] == 0
@@ -0,0 +1,133 @@
+"""
+CatalogLoader: conditional reloads, failures and the fallback key
+"""
+import json
+
+import pytest
+
+from utils import CatalogLoader, EMPTY_ACTIVITIES
+from catalog_snapshot import build_snapshot, is_snapshot, read_snapshot
+
+
+class CountingBuild:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, data):
+        self.calls += 1
+        return data
+
+
+def load_catalog(raw):
+    return read_snapshot(raw) if is_snapshot(raw) else json.loads(raw)
+
+
+def put_json(fake_s3, key, data):
+    fake_s3.put_object("activities", key, json.dumps(data, ensure_ascii=False))
+
+
+@pytest.fixture
+def build():
+    return CountingBuild()
+
+
+@pytest.fixture
+def loader(fake_s3, build):
+    return CatalogLoader("activities", "activities.json", EMPTY_ACTIVITIES, build=build, s3_client=fake_s3)
+
+
+def test_unchanged_catalog_costs_a_304(fake_s3, loader, build):
+    put_json(fake_s3, "activities.json", {"activities": [1]})
+    assert loader.get() == {"activities": [1]}
+    assert loader.version == fake_s3.etag("activities.json").strip('"')
+
+    # Within refresh_seconds nothing is requested
+    calls = fake_s3.calls
+    loader.get()
+    assert fake_s3.calls == calls
+
+    assert loader.refresh() is False
+    assert fake_s3.calls == calls + 1
+    assert build.calls == 1
+
+
+def test_new_version_is_swapped_in(fake_s3, loader):
+    reloaded = []
+    loader.on_reload(reloaded.append)
+    put_json(fake_s3, "activities.json", {"activities": [1]})
+    loader.get()
+    first_version = loader.version
+    put_json(fake_s3, "activities.json", {"activities": [1, 2]})
+    assert loader.refresh() is True
+    assert loader.get() == {"activities": [1, 2]}
+    assert loader.version != first_version
+    assert reloaded == [first_version, loader.version]
+
+
+def test_bad_json_keeps_the_last_good_version(fake_s3, loader, build):
+    put_json(fake_s3, "activities.json", {"activities": [1]})
+    loader.get()
+    version = loader.version
+    fake_s3.put_object("activities", "activities.json", b'{"activities": [')
+    assert loader.refresh() is False
+    assert loader.get() == {"activities": [1]}
+    assert loader.version == version
+    assert build.calls == 1
+
+
+def test_failed_first_load_serves_empty_and_retries(fake_s3, build):
+    loader = CatalogLoader(
+        "activities", "activities.json", EMPTY_ACTIVITIES, build=build, retry_seconds=0, s3_client=fake_s3
+    )
+    fake_s3.fail = True
+    assert loader.get() == EMPTY_ACTIVITIES
+    assert loader.version is None
+
+    fake_s3.fail = False
+    put_json(fake_s3, "activities.json", {"activities": [1]})
+    assert loader.get() == {"activities": [1]}
+
+
+def test_fallback_key_while_preferred_key_is_missing_or_unusable(fake_s3, catalog_data):
+    loader = CatalogLoader(
+        "activities",
+        "activities.snapshot",
+        EMPTY_ACTIVITIES,
+        build=load_catalog,
+        fallback_key="activities.json",
+        parse=None,
+        s3_client=fake_s3,
+    )
+    put_json(fake_s3, "activities.json", catalog_data)
+    loader.get()
+    assert loader.loaded_key == "activities.json"
+
+    # A corrupt snapshot is skipped for the fallback
+    fake_s3.put_object("activities", "activities.snapshot", b"ACTSNAP\0 damaged")
+    loader.refresh()
+    assert loader.loaded_key == "activities.json"
+
+    snapshot = build_snapshot(catalog_data["activities"], catalog_data["metadata"], catalog_data["icons"])
+    fake_s3.put_object("activities", "activities.snapshot", snapshot)
+    assert loader.refresh() is True
+    assert loader.loaded_key == "activities.snapshot"
+    store, _ = loader.get()
+    assert len(store) == len(catalog_data["activities"])
+
+
+def test_search_engine_prefers_the_snapshot(search_engine, fake_s3, catalog_data):
+    activities = catalog_data["activities"]
+    fake_s3.put_object(
+        "activities", "activities.snapshot", build_snapshot(activities, catalog_data["metadata"], catalog_data["icons"])
+    )
+    store, _ = search_engine.catalog.get()
+    assert search_engine.catalog.loaded_key == "activities.snapshot"
+    assert len(store) == len(activities)
+
+    damaged = bytearray(fake_s3.objects["activities.snapshot"])
+    damaged[-1] ^= 0xFF
+    fake_s3.put_object("activities", "activities.snapshot", bytes(damaged))
+    assert search_engine.catalog.refresh() is True
+    store, _ = search_engine.catalog.get()
+    assert search_engine.catalog.loaded_key == "activities.json"
+    assert len(store) == len(activities)
@@ -0,0 +1,68 @@
+"""
+Binary catalog snapshot: round trip and rejection of damaged files
+"""
+import struct
+
+import pytest
+
+from catalog_snapshot import FORMAT_VERSION, build_snapshot, is_snapshot, load_snapshot_file, read_snapshot
+from activity_store import ActivityStore
+from search_index import build_search_index
+from text_index import TextIndex
+
+
+@pytest.fixture(scope="module")
+def snapshot(catalog_data):
+    return build_snapshot(catalog_data["activities"], catalog_data["metadata"], catalog_data["icons"])
+
+
+def test_round_trip(catalog_data, snapshot):
+    activities = catalog_data["activities"]
+    store, search_index = read_snapshot(snapshot)
+
+    expected_store = ActivityStore.from_activities(activities, catalog_data["metadata"], catalog_data["icons"])
+    assert len(store) == len(activities)
+    assert store.metadata == catalog_data["metadata"]
+    assert list(store.ids) == [activity["id"] for activity in activities]
+    for idx in range(len(activities)):
+        assert store.fragment(idx) == expected_store.fragment(idx)
+        assert store.fragment(idx, slim=True) == expected_store.fragment(idx, slim=True)
+    assert store.icon_table(range(len(activities))) == expected_store.icon_table(range(len(activities)))
+
+    expected_index = build_search_index(activities)
+    for key in ("all", "tag_index", "tag_idf", "facet_index", "facet_labels"):
+        assert search_index[key] == expected_index[key], key
+
+
+def test_round_trip_text_index(catalog_data, snapshot):
+    _, search_index = read_snapshot(snapshot)
+    expected = TextIndex.from_activities(catalog_data["activities"])
+    for text in ("olympiáda", "soutěž pro studenty", "nic takového"):
+        assert search_index["text_index"].search(text, 20) == expected.search(text, 20)
+
+
+def test_load_snapshot_file(tmp_path, snapshot):
+    path = tmp_path / "activities.snapshot"
+    path.write_bytes(snapshot)
+    store, search_index = load_snapshot_file(str(path))
+    assert len(store) == len(read_snapshot(snapshot)[0])
+    assert search_index["tag_index"] == read_snapshot(snapshot)[1]["tag_index"]
+
+
+def test_corrupt_checksum_is_rejected(snapshot):
+    damaged = bytearray(snapshot)
+    damaged[-1] ^= 0xFF
+    with pytest.raises(ValueError, match="checksum"):
+        read_snapshot(bytes(damaged))
+
+
+def test_invalid_snapshots_are_rejected(snapshot):
+    assert is_snapshot(snapshot)
+    assert not is_snapshot(b'{"activities": []}')
+    with pytest.raises(ValueError, match="truncated"):
+        read_snapshot(snapshot[:8])
+    with pytest.raises(ValueError, match="Not a catalog snapshot"):
+        read_snapshot(b"X" + snapshot[1:])
+    other_version = snapshot[:8] + struct.pack("<I", FORMAT_VERSION + 1) + snapshot[12:]
+    with pytest.raises(ValueError, match="Unsupported snapshot version"):
+        read_snapshot(other_version)
@@ -0,0 +1,47 @@
+"""
+Chat handler input validation and error responses
+"""
+import json
+
+import pytest
+
+from conftest import load_lambda
+
+
+@pytest.fixture(scope="module")
+def chat():
+    return load_lambda("chat")
+
+
+def call(chat, body):
+    response = chat.lambda_handler({"body": body if isinstance(body, str) else json.dumps(body)}, None)
+    return response["statusCode"], json.loads(response["body"])
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        {"query": "kurzy", "max_results": -5},
+        {"query": "kurzy", "max_results": 10**9},
+        {"query": "kurzy", "max_results": "3"},
+        {"query": "kurzy", "mode": "fuzzy"},
+        {"query": "kurzy", "filters": {"price": ["0"]}},
+        {"query": "kurzy", "filters": {"location": None}},
+        {"query": ""},
+        {"query": 5},
+        "not json",
+        [],
+    ],
+)
+def test_invalid_request_is_a_400(chat, body):
+    status, response = call(chat, body)
+    assert status == 400
+    assert response["error"]
+
+
+def test_internal_errors_are_not_echoed(chat, monkeypatch):
+    def answer_chat(*arguments):
+        raise ValueError("internal detail")
+
+    monkeypatch.setattr(chat, "answer_chat", answer_chat)
+    assert call(chat, {"query": "kurzy"}) == (500, {"error": "Internal server error"})
@@ -0,0 +1,119 @@
+"""
+Paging ranked results with next_cursor
+"""
+import json
+import base64
+
+import pytest
+
+
+def search(engine, **body):
+    response = engine.lambda_handler({"body": json.dumps(body, ensure_ascii=False)}, None)
+    return response["statusCode"], json.loads(response["body"])
+
+
+def tamper(cursor, change):
+    state = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    change(state)
+    return base64.urlsafe_b64encode(json.dumps(state).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+@pytest.fixture
+def query(search_engine):
+    tags = list(search_engine.catalog.get()[1]["tag_index"])[:4]
+    return {"tags": tags, "match": "any", "mode": "ranked"}
+
+
+def test_cursor_round_trip(search_engine):
+    search = search_engine.normalize_search(["Soutěž", "praha"], ["jazyk"], "any", "ranked", {"location": "Brno"})
+    cursor = search_engine.encode_cursor(search, 20, 10, "etag")
+    assert search_engine.decode_cursor(cursor) == {"search": search, "offset": 20, "page_size": 10, "version": "etag"}
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        lambda state: state.update(offset=-1),
+        lambda state: state.update(offset="10"),
+        lambda state: state.update(offset=True),
+        lambda state: state.update(page_size=0),
+        lambda state: state.update(page_size=True),
+        lambda state: state.update(page_size=100000),
+        lambda state: state["search"].update(mode="sql"),
+        lambda state: state["search"].update(exclude_tags="jazyk"),
+        lambda state: state["search"].update(exclude_tags=[None]),
+        lambda state: state["search"].update(tags=[1, 2]),
+        lambda state: state["search"].update(tags="soutěž"),
+        lambda state: state["search"].update(filters={"location": None}),
+        lambda state: state["search"].update(filters={"price": ["0"]}),
+        lambda state: state["search"].pop("match"),
+        lambda state: state.pop("search"),
+    ],
+)
+def test_tampered_cursor_is_rejected(search_engine, change):
+    search = search_engine.normalize_search(["soutěž"], [], "all", "boolean", {})
+    cursor = search_engine.encode_cursor(search, 3, 3, "etag")
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        search_engine.decode_cursor(tamper(cursor, change))
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        search_engine.decode_cursor("not a cursor!")
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        lambda state: state.update(page_size=10**9),
+        lambda state: state.update(offset=-3),
+        lambda state: state["search"].update(exclude_tags=[None]),
+        lambda state: state["search"].update(tags=[1]),
+        lambda state: state["search"].update(filters={"location": None}),
+        lambda state: state.update(search="soutěž"),
+    ],
+)
+def test_tampered_cursor_is_a_400(search_engine, query, change):
+    _, page = search(search_engine, **query, max_results=3)
+    assert search(search_engine, cursor=tamper(page["next_cursor"], change)) == (400, {"error": "Invalid cursor"})
+
+
+def test_invalid_state_is_never_encoded(search_engine):
+    search_state = search_engine.normalize_search(["soutěž"], [], "all", "boolean", {})
+    for offset, page_size in ((0, 0), (0, 10**9), (-1, 3), (0, True)):
+        with pytest.raises(ValueError):
+            search_engine.encode_cursor(search_state, offset, page_size, "etag")
+
+
+def test_pages_follow_the_full_ranking(search_engine, query):
+    status, full = search(search_engine, **query, max_results=500)
+    assert status == 200 and full["next_cursor"] is None
+    expected = [result["id"] for result in full["results"]]
+    assert len(expected) > 20
+
+    search_engine.ranked_cache.clear()
+    status, page = search(search_engine, **query, max_results=7)
+    paged = [result["id"] for result in page["results"]]
+    while page["next_cursor"]:
+        status, page = search(search_engine, cursor=page["next_cursor"])
+        assert status == 200
+        assert page["offset"] == len(paged)
+        paged += [result["id"] for result in page["results"]]
+    assert paged == expected
+    assert page["total"] == full["total"]
+
+
+def test_cursor_from_an_older_catalog_is_rejected(search_engine, fake_s3, catalog_data, query):
+    _, page = search(search_engine, **query, max_results=3)
+    assert page["next_cursor"]
+
+    changed = {**catalog_data, "activities": catalog_data["activities"][:100]}
+    fake_s3.put_object("activities", "activities.json", json.dumps(changed, ensure_ascii=False))
+    assert search_engine.catalog.refresh()
+    status, body = search(search_engine, cursor=page["next_cursor"])
+    assert status == 400 and "catalog has changed" in body["error"]
+
+
+def test_invalid_cursor_and_page_size(search_engine, query):
+    assert search(search_engine, cursor="not a cursor!") == (400, {"error": "Invalid cursor"})
+    for max_results in (0, -1, True, "3", 2.5, search_engine.MAX_RANKED_RESULTS + 1):
+        status, body = search(search_engine, **query, max_results=max_results)
+        assert status == 400, max_results
+        assert "max_results" in body["error"]
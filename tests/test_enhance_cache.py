@@ -0,0 +1,69 @@
+"""
+Cached answers of the result enhancer
+"""
+import json
+
+import pytest
+
+from conftest import load_lambda
+
+ACTIVITY = {
+    "id": 7,
+    "title": "Letní škola programování",
+    "short_description": "Týden kódování pro studenty",
+    "location": ["Praha"],
+    "tags": ["programování"],
+}
+
+
+@pytest.fixture
+def enhancer(monkeypatch):
+    module = load_lambda("result_enhancer")
+    calls = []
+
+    def request_enhancement(query, activities):
+        calls.append(activities)
+        return f"answer {len(calls)}"
+
+    monkeypatch.setattr(module, "request_enhancement", request_enhancement)
+    module.calls = calls
+    return module
+
+
+def test_same_query_and_activities_hit_the_cache(enhancer):
+    assert enhancer.enhance_results("programování", [ACTIVITY], "v1") == "answer 1"
+    assert enhancer.enhance_results("Programování", [dict(ACTIVITY)], "v1") == "answer 1"
+    assert len(enhancer.calls) == 1
+
+
+@pytest.mark.parametrize(
+    "field, value",
+    [
+        ("title", "Podvodná nabídka"),
+        ("short_description", "Jiný popis"),
+        ("location", ["Brno"]),
+        ("tags", ["kasino"]),
+    ],
+)
+def test_same_ids_with_other_prompt_fields_miss_the_cache(enhancer, field, value):
+    enhancer.enhance_results("programování", [ACTIVITY], "v1")
+    forged = {**ACTIVITY, field: value}
+    assert enhancer.enhance_results("programování", [forged], "v1") == "answer 2"
+    assert len(enhancer.calls) == 2
+
+
+def test_catalog_version_is_part_of_the_key(enhancer):
+    enhancer.enhance_results("programování", [ACTIVITY], "v1")
+    enhancer.enhance_results("programování", [ACTIVITY], "v2")
+    assert len(enhancer.calls) == 2
+
+
+def test_lambda_answers_stream_requests_with_json(enhancer):
+    event = {
+        "body": '{"query": "programování", "results": [], "stream": true}',
+        "headers": {"Accept": "text/event-stream"},
+    }
+    response = enhancer.lambda_handler(event, None)
+    assert response["statusCode"] == 200
+    assert "text/event-stream" not in json.dumps(response["headers"])
+    assert json.loads(response["body"])["response"] == enhancer.NO_RESULTS_RESPONSE
@@ -0,0 +1,107 @@
+"""
+Buffered, sampled query log
+"""
+import gzip
+import json
+import time
+import threading
+
+import utils
+from utils import QueryLogSink
+
+
+def written_records(directory):
+    records = []
+    for path in sorted(directory.rglob("*.jsonl.gz")):
+        records += [json.loads(line) for line in gzip.decompress(path.read_bytes()).splitlines()]
+    return records
+
+
+def test_sampling_is_per_request_id():
+    sink = QueryLogSink("query-log", "/unused", sample_rate=0.3)
+    kept = [request_id for request_id in map(str, range(2000)) if sink.sampled(request_id)]
+    assert 0.25 < len(kept) / 2000 < 0.35
+    # Every function serving a request keeps or drops it the same way
+    other = QueryLogSink("query-log", "/unused", sample_rate=0.3)
+    assert all(other.sampled(request_id) for request_id in kept)
+    assert QueryLogSink("query-log", "/unused").sampled("any")
+
+
+def test_disabled_without_location():
+    sink = QueryLogSink("query-log")
+    assert sink.add({"query": "x"}) is False
+    assert sink.flush() == 0
+
+
+def test_full_buffer_is_due_and_drops_extra_records(tmp_path):
+    sink = QueryLogSink("query-log", str(tmp_path), max_records=3, max_age_seconds=3600)
+    assert [sink.add({"query": i}) for i in range(4)] == [True, True, True, False]
+    assert sink.stats["dropped"] == 1
+    assert sink.due()
+    assert sink.flush(due_only=True) == 3
+    assert written_records(tmp_path) == [{"query": 0}, {"query": 1}, {"query": 2}]
+    assert not sink.due() and sink.flush() == 0
+
+
+def test_flush_writes_gzip_jsonl_to_s3(monkeypatch, fake_s3):
+    monkeypatch.setattr(utils, "_s3_client", fake_s3)
+    sink = QueryLogSink("query-log", "s3://logs/queries")
+    sink.add({"query": "kroužek", "results_count": 2})
+    assert sink.flush() == 1
+    (key,) = fake_s3.objects
+    assert key.startswith("queries/query-log/dt=") and key.endswith(".jsonl.gz")
+    assert json.loads(gzip.decompress(fake_s3.objects[key])) == {"query": "kroužek", "results_count": 2}
+
+
+def test_flush_in_background_only_when_due(tmp_path):
+    sink = QueryLogSink("query-log", str(tmp_path), max_records=2, max_age_seconds=3600)
+    sink.add({"query": 1})
+    assert sink.flush_in_background() is None
+
+    sink.add({"query": 2})
+    flusher = sink.flush_in_background()
+    flusher.join()
+    assert sink.stats["written"] == 2
+    assert written_records(tmp_path) == [{"query": 1}, {"query": 2}]
+
+
+def test_one_background_flush_at_a_time(tmp_path):
+    sink = QueryLogSink("query-log", str(tmp_path), max_records=1, max_age_seconds=3600)
+    release = threading.Event()
+    write = sink.flush
+    sink.flush = lambda due_only=False: release.wait() and write(due_only)
+    sink.add({"query": 1})
+    flusher = sink.flush_in_background()
+    assert flusher.is_alive()
+    assert sink.flush_in_background() is None
+    release.set()
+    flusher.join()
+    assert written_records(tmp_path) == [{"query": 1}]
+
+
+def test_flush_due_waits_at_most_the_timeout(tmp_path):
+    sink = QueryLogSink("query-log", str(tmp_path), max_records=1, max_age_seconds=3600)
+    write = sink.flush
+    sink.flush = lambda due_only=False: time.sleep(0.5) or write(due_only)
+    sink.add({"query": 1})
+    started = time.perf_counter()
+    sink.flush_due(timeout=0.05)
+    assert time.perf_counter() - started < 0.4
+    assert written_records(tmp_path) == []
+    sink._flusher.join()
+    assert written_records(tmp_path) == [{"query": 1}]
+
+
+def test_handler_writes_due_records_before_returning(monkeypatch, tmp_path):
+    sink = QueryLogSink("query-log", str(tmp_path), max_age_seconds=0)
+    monkeypatch.setattr(utils, "query_log", sink)
+
+    @utils.instrument_handler("test")
+    def handler(event, context):
+        utils.log_query("kroužky v Brně", ["kroužek"], 3)
+        return {"statusCode": 200}
+
+    assert handler({"headers": {"X-Request-Id": "request-1"}}, None) == {"statusCode": 200}
+    # No join: the write finished within QUERY_LOG_FLUSH_TIMEOUT_SECONDS
+    (record,) = written_records(tmp_path)
+    assert record["request_id"] == "request-1" and record["results_count"] == 3
@@ -0,0 +1,128 @@
+"""
+Bitmap ranking against a brute-force scan of the activity dicts
+"""
+import random
+
+import pytest
+
+from utils import fold_text
+from search_index import build_search_index, iter_bits, bitmap_from_positions, tag_idf
+from synthetic_catalog import LOCATIONS, generate_catalog
+from conftest import load_lambda
+
+LOCATION_BOOST = 0.2
+
+
+@pytest.fixture(scope="module")
+def activities():
+    return generate_catalog(400, seed=7)["activities"]
+
+
+@pytest.fixture(scope="module")
+def search_index(activities):
+    return build_search_index(activities)
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return load_lambda("search_engine")
+
+
+def activity_tags(activity):
+    return {tag.lower() for tag in activity["tags"]}
+
+
+def boosted(activity, normalized_tags):
+    locations = [fold_text(location) for location in activity["location"]]
+    return any(fold_text(tag) in location for tag in normalized_tags for location in locations)
+
+
+def passes(activity, exclude_tags, filters):
+    if activity_tags(activity) & {tag.lower() for tag in exclude_tags or []}:
+        return False
+    wanted = {fold_text(value) for value in (filters or {}).get("location", [])}
+    return not wanted or bool(wanted & {fold_text(location) for location in activity["location"]})
+
+
+def brute_force_match(activities, tags, max_results, exclude_tags, match, filters):
+    normalized_tags = list(dict.fromkeys(tag.lower() for tag in tags))
+    vocabulary = set().union(*(activity_tags(activity) for activity in activities))
+    known_tags = [tag for tag in normalized_tags if tag in vocabulary]
+    if not known_tags:
+        return []
+    scored = []
+    for idx, activity in enumerate(activities):
+        matched = sum(tag in activity_tags(activity) for tag in known_tags)
+        required = len(known_tags) if match == "all" else 1
+        if matched < required or not passes(activity, exclude_tags, filters):
+            continue
+        score = matched / len(normalized_tags) + (LOCATION_BOOST if boosted(activity, normalized_tags) else 0)
+        scored.append((-round(score, 9), idx))
+    return [idx for _, idx in sorted(scored)[:max_results]]
+
+
+def brute_force_rank(activities, tags, max_results, exclude_tags, filters):
+    normalized_tags = list(dict.fromkeys(tag.lower() for tag in tags))
+    frequencies = {}
+    for activity in activities:
+        for tag in activity_tags(activity):
+            frequencies[tag] = frequencies.get(tag, 0) + 1
+    idf = {tag: tag_idf(frequency, len(activities)) for tag, frequency in frequencies.items()}
+    known_tags = [tag for tag in normalized_tags if tag in idf]
+    if not known_tags:
+        return []
+    total_idf = sum(idf[tag] for tag in known_tags)
+    scored = []
+    for idx, activity in enumerate(activities):
+        matched = [tag for tag in known_tags if tag in activity_tags(activity)]
+        boost = boosted(activity, normalized_tags)
+        if not (matched or boost) or not passes(activity, exclude_tags, filters):
+            continue
+        score = sum(idf[tag] for tag in matched) / total_idf + (LOCATION_BOOST if boost else 0)
+        scored.append((-round(score, 9), idx))
+    return [idx for _, idx in sorted(scored)[:max_results]]
+
+
+def random_queries(search_index, count, seed):
+    rng = random.Random(seed)
+    vocabulary = list(search_index["tag_index"]) + ["praha", "brno", "neznámý štítek"]
+    for _ in range(count):
+        yield {
+            "tags": rng.sample(vocabulary, rng.randint(1, 5)),
+            "max_results": rng.choice([1, 3, 10, 50, 500]),
+            "exclude_tags": rng.sample(vocabulary, rng.randint(0, 1)),
+            "filters": rng.choice([None, {"location": [rng.choice(LOCATIONS)]}]),
+        }
+
+
+@pytest.mark.parametrize("match", ["all", "any"])
+def test_match_activities_equals_brute_force(engine, activities, search_index, match):
+    for query in random_queries(search_index, 150, seed=len(match)):
+        expected = brute_force_match(activities, match=match, **query)
+        assert engine.match_activities(search_index, match=match, **query) == expected, query
+
+
+def test_rank_activities_equals_brute_force(engine, activities, search_index):
+    for query in random_queries(search_index, 150, seed=11):
+        assert engine.rank_activities(search_index, **query) == brute_force_rank(activities, **query), query
+
+
+def test_match_activities_without_known_tags(engine, search_index):
+    assert engine.match_activities(search_index, []) == []
+    assert engine.match_activities(search_index, ["neznámý štítek"]) == []
+
+
+def test_top_by_terms_keeps_catalog_order_on_ties(engine):
+    size = 10
+    candidates = bitmap_from_positions(range(size), size)
+    terms = [(0.5, bitmap_from_positions([3, 7, 8], size)), (0.5, bitmap_from_positions([1, 7], size))]
+    assert engine.top_by_terms(terms, candidates, 4) == [7, 1, 3, 8]
+    assert engine.top_by_terms(terms, candidates, 0) == []
+    # Candidates outside every term come last, still in catalog order
+    assert engine.top_by_terms(terms, candidates, 10)[4:] == [0, 2, 4, 5, 6, 9]
+
+
+def test_candidate_bitmap_matches_brute_force(engine, activities, search_index):
+    tags = list(search_index["tag_index"])[:2]
+    expected = [idx for idx, activity in enumerate(activities) if set(tags) <= activity_tags(activity)]
+    assert list(iter_bits(engine.candidate_bitmap(search_index, tags, "all"))) == expected
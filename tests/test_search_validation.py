@@ -0,0 +1,44 @@
+"""
+Malformed searches are rejected with a 400 before they reach the index
+"""
+import json
+
+import pytest
+
+
+def search(engine, body):
+    response = engine.lambda_handler({"body": json.dumps(body, ensure_ascii=False)}, None)
+    return response["statusCode"], json.loads(response["body"])
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        {"tags": "praha"},
+        {"tags": [1, 2]},
+        {"tags": ["praha", None]},
+        {"tags": ["praha"], "exclude_tags": [None]},
+        {"tags": ["praha"], "exclude_tags": "praha"},
+        {"tags": ["praha"], "text": 5},
+        {"tags": ["praha"], "filters": {"location": None}},
+        {"tags": ["praha"], "filters": {"location": []}},
+        {"tags": ["praha"], "filters": {"location": [1]}},
+        {"tags": ["praha"], "filters": {"price": "0"}},
+        {"tags": ["praha"], "filters": ["location"]},
+        {"tags": ["praha"], "match": "some"},
+        {"tags": ["praha"], "mode": "fuzzy"},
+        {"tags": []},
+    ],
+)
+def test_invalid_search_is_rejected(search_engine, body):
+    status, response = search(search_engine, body)
+    assert status == 400, body
+    assert response["error"]
+
+
+def test_valid_search_passes(search_engine):
+    status, response = search(
+        search_engine, {"tags": ["Praha"], "exclude_tags": [], "filters": {"location": "Praha"}, "match": "any"}
+    )
+    assert status == 200
+    assert response["count"] <= 3
@@ -0,0 +1,29 @@
+"""
+Speculation counters shared by the pipeline threads
+"""
+import threading
+
+import chat_pipeline
+
+
+def test_concurrent_outcomes_are_all_counted(monkeypatch):
+    monkeypatch.setattr(
+        chat_pipeline, "SPECULATION_STATS", {"started": 0, "paid_off": 0, "cancelled": 0, "saved_ms": 0.0}
+    )
+
+    def count():
+        for _ in range(2000):
+            chat_pipeline._count_speculation("started")
+            chat_pipeline._count_speculation("paid_off", 0.5)
+
+    threads = [threading.Thread(target=count) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = chat_pipeline.speculation_stats()
+    assert stats == {"started": 16000, "paid_off": 16000, "cancelled": 0, "saved_ms": 8000.0}
+    # A snapshot, not the live counters
+    stats["started"] = 0
+    assert chat_pipeline.SPECULATION_STATS["started"] == 16000
@@ -0,0 +1,45 @@
+"""
+Local tag extraction with the Aho-Corasick automaton
+"""
+import pytest
+
+from tag_extractor import TagExtractor
+
+
+@pytest.fixture(scope="module")
+def extractor():
+    return TagExtractor.from_tags_data(
+        {
+            "tags": ["Matematika", "Letní škola", "Škola", "Programování"],
+            "locations": ["Praha"],
+            "education_levels": ["Střední škola"],
+        }
+    )
+
+
+def test_exact_stemmed_and_alias_matches(extractor):
+    result = extractor.extract("letní školy v Praze")
+    assert result["tags"] == ["letní škola", "praha"]
+    assert [match["text"] for match in result["matches"]] == ["letni skoly", "praze"]
+    assert result["coverage"] == 1.0
+
+    result = extractor.extract("Střední škola a programování")
+    assert result["tags"] == ["střední škola", "programování"]
+    assert result["confidence"] == 1.0
+
+
+def test_longest_match_wins(extractor):
+    # "škola" is also a tag, the longer phrase covers it
+    assert extractor.extract("letní škola")["tags"] == ["letní škola"]
+
+
+def test_partial_phrase_falls_back(extractor):
+    # "letní" starts the "letní škola" branch, "zimní" leaves it and "škola" still matches
+    result = extractor.extract("letní zimní škola")
+    assert result["tags"] == ["škola"]
+    assert result["coverage"] < 1.0
+
+
+def test_no_match(extractor):
+    assert extractor.extract("nic takového") == {"tags": [], "matches": [], "coverage": 0.0, "confidence": 0.0}
+    assert extractor.extract("")["tags"] == []
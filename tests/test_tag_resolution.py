@@ -0,0 +1,62 @@
+"""
+Resolving near-miss query tags against the real tag vocabulary (unique_tags.json)
+"""
+import json
+
+import pytest
+
+from search_index import build_search_index
+from synthetic_catalog import UNIQUE_TAGS_PATH
+from conftest import load_lambda
+
+VOCABULARY = json.loads(UNIQUE_TAGS_PATH.read_text(encoding="utf-8"))
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return load_lambda("search_engine")
+
+
+@pytest.fixture(scope="module")
+def search_index():
+    # One activity per tag of the real vocabulary
+    return build_search_index(
+        [{"id": idx, "tags": [tag], "location": []} for idx, tag in enumerate(VOCABULARY["tags"])]
+    )
+
+
+@pytest.mark.parametrize(
+    "query, tag",
+    [
+        ("Soutěž", "soutěž"),
+        ("soutez", "soutěž"),
+        ("soutěže", "soutěž"),
+        ("kurzy", "kurz"),
+        ("stáže", "stáž"),
+        ("stipendia", "stipendium"),
+        ("dobrovolník", "dobrovolnictví"),
+        ("zahraničí", "výjezd do zahraničí"),
+        ("vyjezd do zahranici", "výjezd do zahraničí"),
+        ("rozvoj", "osobní rozvoj"),
+        ("studium", "studium v čr"),
+        ("inspirativni", "inspirativní stránky"),
+    ],
+)
+def test_near_misses_resolve(engine, search_index, query, tag):
+    assert engine.resolve_tag(search_index, query) == tag
+
+
+@pytest.mark.parametrize(
+    # Locations and education levels are facets, not tags; the rest are unrelated words
+    "query",
+    ["Praze", "praha", "student sš", "matematiky", "stavba", "stát", "kurýr", "soutok", "sou", "hudba", ""],
+)
+def test_unrelated_tags_do_not_resolve(engine, search_index, query):
+    assert engine.resolve_tag(search_index, query) is None
+
+
+def test_unresolved_tag_does_not_empty_match_all(engine, search_index):
+    top, _, resolved = engine.find_activities(search_index, ["kurzy", "stavba"], max_results=10, match="all")
+    assert resolved == {"kurzy": "kurz", "stavba": None}
+    top_kurz, _, _ = engine.find_activities(search_index, ["kurz"], max_results=10, match="all")
+    assert top == top_kurz and top
@@ -0,0 +1,76 @@
+"""
+BM25 full-text index against a brute-force scoring of the activity texts
+"""
+import json
+from collections import Counter
+
+import pytest
+
+from search_index import tag_idf
+from text_index import B, K1, TITLE_WEIGHT, TextIndex, analyze
+
+QUERIES = ["olympiáda", "soutěž pro studenty", "letní škola programování", "neexistující slovo"]
+
+
+@pytest.fixture(scope="module")
+def activities(catalog_data):
+    return catalog_data["activities"]
+
+
+@pytest.fixture(scope="module")
+def text_index(activities):
+    return TextIndex.from_activities(activities)
+
+
+def brute_force_scores(activities, text):
+    frequencies = []
+    for activity in activities:
+        counts = Counter(analyze(activity["short_description"]))
+        for term in analyze(activity["title"]):
+            counts[term] += TITLE_WEIGHT
+        frequencies.append(counts)
+    average_length = sum(sum(counts.values()) for counts in frequencies) / len(frequencies)
+    scores = {}
+    for term in dict.fromkeys(analyze(text)):
+        documents = [idx for idx, counts in enumerate(frequencies) if term in counts]
+        idf = tag_idf(len(documents), len(activities))
+        for idx in documents:
+            frequency = frequencies[idx][term]
+            norm = K1 * (1 - B + B * sum(frequencies[idx].values()) / average_length)
+            scores[idx] = scores.get(idx, 0.0) + idf * (K1 + 1) * frequency / (frequency + norm)
+    return scores
+
+
+@pytest.mark.parametrize("text", QUERIES)
+def test_scores_equal_brute_force(activities, text_index, text):
+    expected = brute_force_scores(activities, text)
+    scores = text_index.scores(analyze(text))
+    assert scores.keys() == expected.keys()
+    for idx, score in expected.items():
+        assert scores[idx] == pytest.approx(score, rel=1e-5)
+
+
+def test_search_is_best_first(activities, text_index):
+    results = text_index.search("soutěž pro studenty", 10)
+    assert results
+    assert [score for _, score in results] == sorted((score for _, score in results), reverse=True)
+    best = max(brute_force_scores(activities, "soutěž pro studenty").values())
+    assert results[0][1] == pytest.approx(best, rel=1e-5)
+
+
+def test_long_descriptions_are_indexed(activities):
+    long_descriptions = {str(activities[5]["id"]): "<p>Zcela výjimečný <b>hackathon</b></p>"}
+    index = TextIndex.from_activities(activities, long_descriptions)
+    assert [idx for idx, _ in index.search("hackathon")] == [5]
+
+
+def test_analyze_folds_stems_and_strips_markup():
+    assert analyze("<p>Olympiáda</p>") == analyze("olympiady")
+    assert analyze("&nbsp;") == []
+
+
+def test_text_search_through_the_handler(search_engine):
+    response = search_engine.lambda_handler({"body": json.dumps({"text": "soutěž", "max_results": 5})}, None)
+    body = json.loads(response["body"])
+    assert response["statusCode"] == 200
+    assert body["text"] == "soutěž" and 0 < body["count"] <= 5